@@ -1,16 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 import joblib
 import os
-import tempfile
+import hashlib
 import uuid
 from datetime import datetime
 from preprocess import CustomDataPreprocessor
 from model import CustomModel
+from model_cache import ModelCache
+from model_store import ModelStore
+from training_jobs import TrainingJobManager
+from warmup import ServiceWarmup, is_warmup_request
 import traceback
 from dotenv import load_dotenv
+from werkzeug.utils import secure_filename
 
 # Load environment variables
 load_dotenv()
@@ -18,40 +23,46 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-# In-memory storage for user models (temporary)
-# In production, you might want to use Redis or similar
-user_models = {}
-user_preprocessors = {}
+# User models and preprocessors, kept in memory up to a budget and spilled to disk beyond it
+user_model_store = ModelStore()
+
+# Trained models reused when the same file is uploaded with the same settings
+model_cache = ModelCache()
+
+# Jobs run one at a time, so a synchronous /train may queue behind other users' jobs;
+# after this many seconds it answers 202 with the job id instead of blocking further
+SYNC_TRAINING_WAIT_SECONDS = float(os.getenv('TRAINING_SYNC_WAIT_SECONDS', '600'))
 
 class UserModelManager:
-    """Manages user models in memory (temporary storage)"""
+    """Manages user models in the memory-bounded model store"""
     
     @staticmethod
-    def get_user_model(user_id):
-        """Get user's current model"""
-        return user_models.get(user_id)
+    def get_user_model(user_id, record_stats=True):
+        """Get user's current model and preprocessor, (None, None) if there is none"""
+        return user_model_store.get(user_id, record_stats=record_stats) or (None, None)
     
     @staticmethod
     def set_user_model(user_id, model, preprocessor):
         """Set user's current model (replaces any existing)"""
-        user_models[user_id] = model
-        user_preprocessors[user_id] = preprocessor
-        print(f"✅ Model set for user {user_id}. Total active users: {len(user_models)}")
+        nbytes = user_model_store.put(user_id, (model, preprocessor))
+        print(f"✅ Model set for user {user_id} ({nbytes / 2 ** 20:.1f} MB). "
+              f"Total active users: {UserModelManager.active_users()}")
     
     @staticmethod
     def delete_user_model(user_id):
         """Delete user's model"""
-        if user_id in user_models:
-            del user_models[user_id]
-        if user_id in user_preprocessors:
-            del user_preprocessors[user_id]
-        print(f"🗑️ Model deleted for user {user_id}. Total active users: {len(user_models)}")
+        user_model_store.delete(user_id)
+        print(f"🗑️ Model deleted for user {user_id}. Total active users: {UserModelManager.active_users()}")
+    
+    @staticmethod
+    def active_users():
+        """Number of users with a model, in memory or spilled to disk"""
+        return len(user_model_store)
     
     @staticmethod
     def get_user_model_info(user_id):
         """Get user's model information"""
-        model = user_models.get(user_id)
-        preprocessor = user_preprocessors.get(user_id)
+        model, preprocessor = UserModelManager.get_user_model(user_id)
         
         if model and preprocessor:
             return {
@@ -68,16 +79,51 @@ class UserModelManager:
         else:
             return {'has_model': False}
 
+def on_training_job_succeeded(job):
+    """Load the model saved by a finished training job for its user and delete the job's model files"""
+    result = job['result']
+    model = CustomModel()
+    model.load_model(result['model_path'])
+    preprocessor = CustomDataPreprocessor()
+    preprocessor.load_preprocessor(result['preprocessor_path'])
+    UserModelManager.set_user_model(result['user_id'], model, preprocessor)
+    # The model cache and the model store hold their own copies; the job's files are no longer needed
+    for path in (result['model_path'], result['preprocessor_path']):
+        if os.path.exists(path):
+            os.remove(path)
+    warmup.start(label=result['user_id'], headers={'X-User-ID': result['user_id']},
+                 sample_source=preprocessor.warmup_samples)
+
+# Training requested with async=true runs in separate processes
+training_jobs = TrainingJobManager('train_model:run_training_job', on_success=on_training_job_succeeded)
+
+# No model is shared by all users, so the service is ready at start; each newly loaded user model is warmed up
+warmup = ServiceWarmup(app, lambda n: None)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'Custom Model',
-        'active_users': len(user_models),
+        'active_users': UserModelManager.active_users(),
+        'model_store': user_model_store.stats(),
+        'ready': warmup.ready,
+        'warmup': warmup.status()['warmup'],
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness endpoint: the process is up and answering requests"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 503 until the start-up warm-up has finished"""
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/train', methods=['POST'])
 def train_model():
     """Train a custom model for a user"""
@@ -109,59 +155,106 @@ def train_model():
         print(f"📊 Model type: {model_type}")
         print(f"🎯 Target column: {target_column}")
         
-        # Save uploaded file temporarily
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-        file.save(temp_file.name)
-        
-        try:
-            # Load data based on file type
-            if file_extension == '.csv':
-                df = pd.read_csv(temp_file.name)
-            elif file_extension in ['.xlsx', '.xls']:
-                df = pd.read_excel(temp_file.name)
-            else:
-                return jsonify({'error': f'Unsupported file type: {file_extension}'}), 400
-            
-            print(f"📊 Loaded dataset: {df.shape[0]} rows, {df.shape[1]} columns")
-            
-            # Initialize and run preprocessing
-            preprocessor = CustomDataPreprocessor()
-            X, y = preprocessor.preprocess_data(df, target_column)
-            
-            # Create and train model
+        # Reuse the model of an identical earlier upload unless force=true
+        cache_key = ModelCache.make_key(hashlib.sha256(file.read()).hexdigest(), target_column, model_type, training_params)
+        file.seek(0)
+        force = request.form.get('force', 'false').lower() == 'true'
+        cached = None if force else model_cache.get(cache_key)
+        if cached:
             model = CustomModel()
-            model.create_model(model_type, training_params)
-            model.train(X, y)
-            
-            # Store model for this user (replaces any existing)
+            model.load_model(cached['files']['model.pkl'])
+            preprocessor = CustomDataPreprocessor()
+            preprocessor.load_preprocessor(cached['files']['preprocessor.pkl'])
             UserModelManager.set_user_model(user_id, model, preprocessor)
             
-            # Get model info
-            model_info = UserModelManager.get_user_model_info(user_id)
-            
             return jsonify({
                 'success': True,
-                'message': 'Custom model trained successfully',
+                'message': 'Custom model restored from training cache',
+                'cached': True,
                 'user_id': user_id,
-                'model_info': model_info,
-                'dataset_info': {
-                    'original_shape': df.shape,
-                    'training_samples': len(X),
-                    'num_features': X.shape[1],
-                    'num_classes': len(np.unique(y))
-                }
+                'model_info': UserModelManager.get_user_model_info(user_id),
+                'dataset_info': cached['summary']['dataset_info']
             })
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file.name)
+        
+        file_extension = os.path.splitext(file.filename)[1].lower()
+        if file_extension not in ['.csv', '.xlsx', '.xls']:
+            return jsonify({'error': f'Unsupported file type: {file_extension}'}), 400
+        
+        # Training runs in a resource-limited child process so a runaway upload cannot take down this server
+        job_id, job_dir = training_jobs.create_job()
+        file_path = os.path.join(job_dir, f"temp_custom_{secure_filename(file.filename)}")
+        file.save(file_path)
+        
+        training_jobs.submit(job_id, {
+            'data_file_path': file_path,
+            'user_id': user_id,
+            'target_column': target_column,
+            'model_type': model_type,
+            'training_params': training_params,
+            'cache_key': cache_key,
+            'output_dir': job_dir
+        }, cleanup=[file_path])
+        
+        queued_response = {
+            'success': True,
+            'message': 'Custom training job queued',
+            'user_id': user_id,
+            'job_id': job_id,
+            'status_url': f'/train/{job_id}',
+            'events_url': f'/train/{job_id}/events'
+        }
+        # async=true returns the job id immediately
+        if request.form.get('async', 'false').lower() == 'true':
+            return jsonify(queued_response), 202
+        
+        job = training_jobs.wait(job_id, timeout=SYNC_TRAINING_WAIT_SECONDS)
+        if job['state'] not in ('succeeded', 'failed'):
+            return jsonify({**queued_response, 'message': 'Custom training job still running'}), 202
+        if job['state'] != 'succeeded':
+            return jsonify({
+                'error': job.get('error'),
+                'failure_reason': job.get('failure_reason'),
+                'job_id': job_id,
+                'resources': job.get('resources')
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'message': 'Custom model trained successfully',
+            'user_id': user_id,
+            'job_id': job_id,
+            'model_info': UserModelManager.get_user_model_info(user_id),
+            'dataset_info': job['result']['dataset_info'],
+            'resources': job['resources']
+        })
             
     except Exception as e:
         print(f"❌ Custom model training error: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/train/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """Get state, per-stage progress and evaluation summary of a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown training job: {job_id}'}), 404
+    
+    return jsonify({'success': True, **job})
+
+@app.route('/train/<job_id>/events', methods=['GET'])
+def stream_training_job_events(job_id):
+    """Server-Sent Events stream of a custom training job's progress (resumable with Last-Event-ID)"""
+    if training_jobs.get(job_id) is None:
+        return jsonify({'error': f'Unknown training job: {job_id}'}), 404
+    
+    offset = int(request.headers.get('Last-Event-ID') or request.args.get('offset', 0) or 0)
+    return Response(
+        stream_with_context(training_jobs.stream_events(job_id, offset)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Make predictions using user's custom model"""
@@ -170,9 +263,8 @@ def predict():
         if not user_id:
             return jsonify({'error': 'User ID required'}), 400
         
-        # Get user's model and preprocessor
-        model = UserModelManager.get_user_model(user_id)
-        preprocessor = user_preprocessors.get(user_id)
+        # Get user's model and preprocessor; warm-up traffic stays out of the store's hit counters
+        model, preprocessor = UserModelManager.get_user_model(user_id, record_stats=not is_warmup_request(request))
         
         if not model or not preprocessor:
             return jsonify({'error': 'No trained model found for user. Please train a model first.'}), 400
@@ -294,7 +386,7 @@ def get_expected_features():
         if not user_id:
             return jsonify({'error': 'User ID required'}), 400
         
-        preprocessor = user_preprocessors.get(user_id)
+        _, preprocessor = UserModelManager.get_user_model(user_id)
         
         if not preprocessor:
             return jsonify({'error': 'No trained model found for user'}), 400
@@ -352,13 +444,16 @@ def get_supported_formats():
         }
     })
 
+# Warm up once every route is registered
+warmup.start()
+
 if __name__ == '__main__':
     port = int(os.getenv('CUSTOM_MODEL_PORT', 5004))  # Different port
     debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     
     print(f"🚀 Starting Custom Model Server on port {port}")
     print(f"📊 Service: User-specific temporary model training")
-    print(f"💾 Storage: In-memory (temporary)")
-    print(f"👥 Active users: {len(user_models)}")
+    print(f"💾 Storage: In-memory up to {user_model_store.max_bytes / 2 ** 20:.0f} MB, spilled to {user_model_store.spill_dir}")
+    print(f"👥 Active users: {UserModelManager.active_users()}")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
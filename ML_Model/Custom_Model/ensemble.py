@@ -0,0 +1,223 @@
+import os
+import time
+import numpy as np
+from sklearn.base import clone
+from sklearn.preprocessing import LabelEncoder
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.utils import Bunch
+from executors import executor_scope, forest_batches, merge_forests, resolve
+from progress import ProgressReporter, BoostingProgress
+
+# Relative cost of each ensemble member, used to hand out spare cores
+MEMBER_COST = {'xgb': 3, 'rf': 2, 'lr': 1}
+
+def training_core_budget():
+    """Number of cores one training run may use (TRAINING_CPU_BUDGET, default all cores)"""
+    budget = int(os.getenv('TRAINING_CPU_BUDGET', '0') or 0)
+    return budget if budget > 0 else (os.cpu_count() or 1)
+
+def balanced_sample_weight(y):
+    """Per-sample weights that give every class the same total weight (like ``class_weight='balanced'``)"""
+    classes, inverse, counts = np.unique(y, return_inverse=True, return_counts=True)
+    return (len(y) / (len(classes) * counts))[inverse]
+
+def allocate_cores(members, budget):
+    """Split a core budget between ensemble members fitted concurrently.
+
+    Every member gets one core; spare cores go to members that support
+    multi-threaded fitting (``n_jobs``), most expensive first. Returns
+    ``(n_workers, {name: n_threads})``.
+    """
+    n_workers = max(1, min(len(members), budget))
+    threads = {name: 1 for name, _ in members}
+    threaded = sorted(
+        (name for name, est in members if 'n_jobs' in est.get_params()),
+        key=lambda name: MEMBER_COST.get(name, 1),
+        reverse=True
+    )
+    spare = budget - len(members)
+    while spare > 0 and threaded:
+        for name in threaded:
+            if spare == 0:
+                break
+            threads[name] += 1
+            spare -= 1
+    return n_workers, threads
+
+def _fit_member(name, estimator, X, y, fit_params, checkpoint=None, progress=None):
+    start = time.time()
+    X, y = resolve(X), resolve(y)
+    fit_params = {key: resolve(value) for key, value in fit_params.items()}
+    progress = progress or ProgressReporter()
+    total_rounds = None
+    callbacks = []
+    if checkpoint is not None and hasattr(estimator, 'get_booster'):
+        # Save partial boosting rounds and continue from the latest ones
+        from xgboost.callback import TrainingCheckPoint
+        from checkpoints import BOOSTING_CHECKPOINT_ROUNDS
+        
+        total_rounds = estimator.n_estimators
+        callbacks.append(TrainingCheckPoint(
+            checkpoint.boosting_dir(name), name=name, iterations=BOOSTING_CHECKPOINT_ROUNDS
+        ))
+        booster = checkpoint.latest_booster(name)
+        if booster is not None:
+            done = booster.num_boosted_rounds()
+            print(f"♻️ Resuming {name} from {done} of {total_rounds} boosting rounds")
+            fit_params = dict(fit_params, xgb_model=booster)
+            estimator.set_params(n_estimators=max(1, total_rounds - done))
+    
+    if progress.callback is not None and hasattr(estimator, 'get_booster'):
+        callbacks.append(BoostingProgress(progress, name, total_rounds or estimator.n_estimators))
+    if callbacks:
+        estimator.set_params(callbacks=callbacks)
+    
+    progress.emit('member_fit_started', member=name, rows=int(len(X)))
+    estimator.fit(X, y, **fit_params)
+    progress.emit('member_fit_completed', member=name, elapsed=round(time.time() - start, 3))
+    
+    # Callbacks (and the event log they hold) are not part of the saved model
+    if callbacks:
+        estimator.set_params(callbacks=None)
+    if total_rounds is not None:
+        estimator.set_params(n_estimators=total_rounds)
+    if checkpoint is not None:
+        checkpoint.save(f'member_{name}', estimator)
+    return name, estimator, time.time() - start
+
+def assemble_voting_classifier(model, fitted, label_encoder=None):
+    """Install members fitted outside ``VotingClassifier.fit`` (``{name: estimator}``) on ``model``"""
+    if label_encoder is not None:
+        model.le_ = label_encoder
+        model.classes_ = label_encoder.classes_
+    model.estimators_ = [fitted[name] for name, est in model.estimators if est != 'drop']
+    model.named_estimators_ = Bunch()
+    for name, est in model.estimators:
+        model.named_estimators_[name] = est if est == 'drop' else fitted[name]
+    return model
+
+def fit_voting_classifier(model, X, y, sample_weight=None, budget=None, member_fit_params=None, checkpoint=None,
+                          executor=None, progress=None):
+    """Fit the members of a VotingClassifier in parallel worker processes.
+
+    Produces the same fitted attributes as ``VotingClassifier.fit`` but fits
+    the members concurrently under a shared core budget, with each member's
+    own ``n_jobs`` set to its share. ``member_fit_params`` maps a member name
+    to extra ``fit`` keyword arguments (labels in an ``eval_set`` are encoded
+    like ``y``). With a ``checkpoint`` (see checkpoints.RunCheckpoint) every
+    fitted member, and partial XGBoost rounds, are saved, and members found
+    there are reused instead of refitted. The fits run on ``executor`` (by
+    default the TRAINING_EXECUTOR backend, see executors.py); on a cluster the
+    data is shared once and RandomForest trees are built in batches across the
+    workers, then merged back into one forest. A ``progress`` reporter gets
+    per-member fit start/end and boosting round events. Returns a report with
+    per-member fit times and the overall wall time.
+    """
+    budget = budget or training_core_budget()
+    member_fit_params = member_fit_params or {}
+    members = [(name, est) for name, est in model.estimators if est != 'drop']
+    n_workers, threads = allocate_cores(members, budget)
+
+    model.le_ = LabelEncoder().fit(y)
+    model.classes_ = model.le_.classes_
+    y_encoded = model.le_.transform(y)
+
+    tasks = []
+    resumed = {}
+    with executor_scope(executor, n_workers) as executor:
+        # Ship the training data once; tasks only carry handles to it
+        X_shared, y_shared = executor.share(X), executor.share(y_encoded)
+        weight_shared = executor.share(sample_weight) if sample_weight is not None else None
+        for name, est in members:
+            if checkpoint is not None and checkpoint.has(f'member_{name}'):
+                resumed[name] = checkpoint.load(f'member_{name}')
+                continue
+            member = clone(est)
+            if 'n_jobs' in member.get_params():
+                member.set_params(n_jobs=threads[name])
+            fit_params = dict(member_fit_params.get(name, {}))
+            if 'eval_set' in fit_params:
+                fit_params['eval_set'] = [(X_eval, model.le_.transform(y_eval)) for X_eval, y_eval in fit_params['eval_set']]
+            if weight_shared is not None:
+                fit_params['sample_weight'] = weight_shared
+            if executor.distributed and isinstance(member, RandomForestClassifier):
+                # Batches of trees are checkpointed together once merged
+                for batch in forest_batches(member, executor.n_workers):
+                    tasks.append((name, batch, X_shared, y_shared, fit_params, None, progress))
+            else:
+                tasks.append((name, member, X_shared, y_shared, fit_params, checkpoint, progress))
+
+        start = time.time()
+        results = executor.starmap(_fit_member, tasks)
+        wall_time = time.time() - start
+        executor_name = type(executor).__name__
+        executor_workers = executor.n_workers
+
+    fitted, seconds, tree_batches = {}, {}, {}
+    for name, est, elapsed in results:
+        fitted.setdefault(name, []).append(est)
+        seconds[name] = seconds.get(name, 0.0) + elapsed
+    for name, parts in fitted.items():
+        fitted[name] = parts[0]
+        if len(parts) > 1:
+            fitted[name] = merge_forests(parts)
+            tree_batches[name] = len(parts)
+            if checkpoint is not None:
+                checkpoint.save(f'member_{name}', fitted[name])
+    fitted.update(resumed)
+    seconds.update({name: 0.0 for name in resumed})
+    assemble_voting_classifier(model, fitted)
+
+    return {
+        'core_budget': budget,
+        'parallel_workers': n_workers,
+        'executor': executor_name,
+        'executor_workers': executor_workers,
+        'tree_batches': tree_batches,
+        'threads': threads,
+        'member_fit_seconds': {name: round(elapsed, 3) for name, elapsed in seconds.items()},
+        'wall_seconds': round(wall_time, 3),
+        'resumed_members': sorted(resumed)
+    }
+
+def trim_to_best_iteration(model):
+    """Cut early-stopped XGBoost members down to their best iteration.
+
+    Trees after the best validation round are dropped from the booster, so
+    predictions and saved models only carry the rounds that are served.
+    Returns ``{name: {'best_iteration', 'rounds_trained'}}``.
+    """
+    report = {}
+    names = [name for name, est in model.estimators if est != 'drop']
+    for name, estimator in zip(names, model.estimators_):
+        if not hasattr(estimator, 'get_booster'):
+            continue
+        booster = estimator.get_booster()
+        best_iteration = booster.attr('best_iteration')
+        if best_iteration is None:
+            continue
+        best_iteration = int(best_iteration)
+        rounds_trained = booster.num_boosted_rounds()
+        trimmed = booster[:best_iteration + 1]
+        trimmed.set_attr(best_iteration=None, best_ntree_limit=None, best_score=None)
+        estimator._Booster = trimmed
+        estimator.n_estimators = best_iteration + 1
+        report[name] = {'best_iteration': best_iteration, 'rounds_trained': rounds_trained}
+    return report
+
+def benchmark_parallel_fit(model, X, y, budget=None):
+    """Compare the serial VotingClassifier.fit with fit_voting_classifier"""
+    serial = clone(model)
+    for name, est in serial.estimators:
+        if est != 'drop' and 'n_jobs' in est.get_params():
+            est.set_params(n_jobs=1)
+    serial.set_params(n_jobs=None)
+
+    start = time.time()
+    serial.fit(X, y)
+    serial_seconds = time.time() - start
+
+    report = fit_voting_classifier(clone(model), X, y, budget=budget)
+    report['serial_seconds'] = round(serial_seconds, 3)
+    report['speedup'] = round(serial_seconds / report['wall_seconds'], 2) if report['wall_seconds'] else None
+    return report
@@ -0,0 +1,198 @@
+import os
+import uuid
+import shutil
+import contextlib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+
+# Shared arrays loaded by the tasks running in this worker process, by path
+_LOADED = {}
+
+class SharedArray:
+    """Handle to an array written once to shared storage; workers memory-map it on first use"""
+
+    def __init__(self, path, shape):
+        self.path = path
+        self.shape = shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def load(self):
+        if self.path not in _LOADED:
+            _LOADED[self.path] = np.load(self.path, mmap_mode='r')
+        return _LOADED[self.path]
+
+def resolve(value):
+    """The array behind a SharedArray handle (other values are returned as they are)"""
+    return value.load() if isinstance(value, SharedArray) else value
+
+def _shared_paths(value):
+    """Paths of the SharedArray handles in a task argument (looking into tuples, lists and dicts)"""
+    if isinstance(value, SharedArray):
+        return [value.path]
+    if isinstance(value, (tuple, list)):
+        return [path for item in value for path in _shared_paths(item)]
+    if isinstance(value, dict):
+        return [path for item in value.values() for path in _shared_paths(item)]
+    return []
+
+def _run_task(fn, *args):
+    """Run one task on a worker, then unmap the shared arrays it used so long-lived workers do not pin them"""
+    try:
+        return fn(*args)
+    finally:
+        for path in _shared_paths(args):
+            _LOADED.pop(path, None)
+
+class LocalExecutor:
+    """Runs tasks on local joblib workers; the default backend and the one every call site used before.
+
+    Arrays are passed to the tasks directly (joblib memory-maps large ones
+    itself). Used as a context manager the worker pool stays up across
+    ``starmap`` calls.
+    """
+
+    distributed = False
+
+    def __init__(self, n_workers=1, prefer=None):
+        self.n_workers = max(1, n_workers)
+        self.prefer = prefer
+        self._parallel = None
+
+    def share(self, array):
+        return array
+
+    def starmap(self, fn, tasks):
+        """``[fn(*args) for args in tasks]``, computed on the workers, in order"""
+        jobs = [delayed(fn)(*args) for args in tasks]
+        if not jobs:
+            return []
+        if self._parallel is not None:
+            return self._parallel(jobs)
+        return Parallel(n_jobs=self.n_workers, prefer=self.prefer)(jobs)
+
+    def close(self):
+        if self._parallel is not None:
+            self._parallel.__exit__(None, None, None)
+            self._parallel = None
+
+    def __enter__(self):
+        self._parallel = Parallel(n_jobs=self.n_workers, prefer=self.prefer).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _ClusterExecutor:
+    """Shared-storage plumbing for executors whose workers may run on other machines.
+
+    ``share`` writes an array once to TRAINING_SHARED_DIR (which must be
+    visible to every worker, e.g. a network mount) and returns a handle;
+    tasks receive the handle and memory-map it once per task (the map is
+    dropped when the task finishes).
+    """
+
+    distributed = True
+
+    def __init__(self, shared_dir=None):
+        root = shared_dir or os.getenv('TRAINING_SHARED_DIR', 'training_shared')
+        self.shared_dir = os.path.join(root, uuid.uuid4().hex)
+        self._n_shared = 0
+
+    def share(self, array):
+        os.makedirs(self.shared_dir, exist_ok=True)
+        array = np.asarray(array)
+        path = os.path.abspath(os.path.join(self.shared_dir, f'{self._n_shared}.npy'))
+        self._n_shared += 1
+        np.save(path, array)
+        return SharedArray(path, array.shape)
+
+    def close(self):
+        self.shutdown()
+        shutil.rmtree(self.shared_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ProcessClusterExecutor(_ClusterExecutor):
+    """A local cluster of ``n_workers`` worker processes, for running and testing the distributed path on one machine"""
+
+    def __init__(self, n_workers=2, shared_dir=None):
+        from concurrent.futures import ProcessPoolExecutor
+
+        super().__init__(shared_dir)
+        self.n_workers = max(1, n_workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.n_workers)
+
+    def starmap(self, fn, tasks):
+        futures = [self._pool.submit(_run_task, fn, *args) for args in tasks]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+class DaskExecutor(_ClusterExecutor):
+    """Runs tasks on a ``dask.distributed`` cluster (TRAINING_CLUSTER_ADDRESS, or a local cluster when unset)"""
+
+    def __init__(self, address=None, shared_dir=None):
+        try:
+            from dask.distributed import Client
+        except ImportError:
+            raise ImportError("TRAINING_EXECUTOR=dask needs dask.distributed: pip install 'dask[distributed]'")
+
+        super().__init__(shared_dir)
+        self._client = Client(address or os.getenv('TRAINING_CLUSTER_ADDRESS') or None)
+        self.n_workers = max(1, len(self._client.scheduler_info()['workers']))
+
+    def starmap(self, fn, tasks):
+        # Fitting is not deterministic by key (estimators carry state), so every task runs
+        futures = [self._client.submit(_run_task, fn, *args, pure=False) for args in tasks]
+        return self._client.gather(futures)
+
+    def shutdown(self):
+        self._client.close()
+
+def training_executor(n_workers=1, prefer=None):
+    """The executor selected by TRAINING_EXECUTOR: ``local`` (default), ``processes`` or ``dask``.
+
+    ``n_workers`` sizes the local pool; a process cluster uses
+    TRAINING_WORKERS (default ``n_workers``) and a Dask cluster reports its
+    own size.
+    """
+    backend = os.getenv('TRAINING_EXECUTOR', 'local')
+    if backend == 'processes':
+        return ProcessClusterExecutor(int(os.getenv('TRAINING_WORKERS', '0') or 0) or n_workers)
+    if backend == 'dask':
+        return DaskExecutor()
+    if backend != 'local':
+        raise ValueError(f"Unknown TRAINING_EXECUTOR '{backend}' (expected local, processes or dask)")
+    return LocalExecutor(n_workers, prefer=prefer)
+
+@contextlib.contextmanager
+def executor_scope(executor=None, n_workers=1, prefer=None):
+    """``executor`` as given, or a new ``training_executor`` that is closed when the block ends"""
+    if executor is not None:
+        yield executor
+        return
+    with training_executor(n_workers, prefer) as executor:
+        yield executor
+
+def forest_batches(estimator, n_batches):
+    """Split an unfitted RandomForest into ``n_batches`` smaller forests with independent seeds"""
+    n_batches = max(1, min(n_batches, estimator.n_estimators))
+    sizes = np.diff(np.linspace(0, estimator.n_estimators, n_batches + 1).astype(int))
+    seeds = np.random.RandomState(estimator.random_state).randint(np.iinfo(np.int32).max, size=n_batches)
+    return [clone(estimator).set_params(n_estimators=int(size), random_state=int(seed)) for size, seed in zip(sizes, seeds)]
+
+def merge_forests(forests):
+    """One fitted forest holding the trees of fitted batches (classes must match)"""
+    merged = forests[0]
+    for forest in forests[1:]:
+        merged.estimators_ += forest.estimators_
+    merged.n_estimators = len(merged.estimators_)
+    return merged
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+from scipy import stats
+from sklearn.feature_selection import SelectKBest, f_classif
+
+def screen_features(X, y, corr_threshold=0.95, block_size=None):
+    """Constant columns, correlated columns and ANOVA F-scores of a feature matrix in one blocked pass.
+
+    Columns are standardized in blocks of ``block_size`` (FEATURE_SCREEN_BLOCK,
+    default 256) with float64 means and deviations into a float32 copy, and
+    the per-class sums for the F-scores are taken from the same blocks. The
+    correlation matrix is then produced one block of rows at a time by a
+    float32 BLAS product, so the full matrix is never held. A column counts
+    as correlated when its absolute correlation with any earlier column
+    exceeds ``corr_threshold``. Returns per-column ``constant`` and
+    ``correlated`` masks, ``scores`` and ``pvalues`` (NaN when constant).
+    """
+    X = np.asarray(X)
+    n_rows, n_features = X.shape
+    block_size = block_size or int(os.getenv('FEATURE_SCREEN_BLOCK', '256'))
+    classes, y_index = np.unique(np.asarray(y), return_inverse=True)
+    counts = np.bincount(y_index).astype(np.float64)
+    indicators = np.zeros((n_rows, len(classes)))
+    indicators[np.arange(n_rows), y_index] = 1
+
+    Z = np.empty((n_rows, n_features), dtype=np.float32)
+    constant = np.zeros(n_features, dtype=bool)
+    ss_total = np.zeros(n_features)
+    class_sum = np.zeros((len(classes), n_features))
+    for start in range(0, n_features, block_size):
+        cols = slice(start, start + block_size)
+        block = np.array(X[:, cols], dtype=np.float64)
+        constant[cols] = np.ptp(block, axis=0) == 0
+        block -= block.mean(axis=0)
+        std = np.sqrt((block ** 2).mean(axis=0))
+        block /= np.where(std > 0, std, 1)
+        Z[:, cols] = block
+        ss_total[cols] = (block ** 2).sum(axis=0)
+        class_sum[:, cols] = indicators.T @ block
+
+    correlated = np.zeros(n_features, dtype=bool)
+    for start in range(0, n_features, block_size):
+        rows = slice(start, start + block_size)
+        corr = np.abs(Z[:, rows].T @ Z[:, start:]) / n_rows
+        # Strict upper triangle: only pairs with the earlier column in this block of rows
+        correlated[start:] |= np.triu(corr > corr_threshold, k=1).any(axis=0)
+
+    # The standardized columns have zero mean, so the between-class sum of squares needs no correction
+    ss_between = (class_sum ** 2 / counts[:, None]).sum(axis=0)
+    df_between, df_within = len(classes) - 1, n_rows - len(classes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = (ss_between / df_between) / ((ss_total - ss_between) / df_within)
+    scores[constant] = np.nan
+    return {
+        'constant': constant,
+        'correlated': correlated,
+        'scores': scores,
+        'pvalues': stats.f.sf(scores, df_between, df_within)
+    }
+
+def kbest_selector(screen, k, feature_names=None):
+    """A fitted SelectKBest over all screened columns that never picks a constant or correlated one"""
+    keep = ~(screen['constant'] | screen['correlated'])
+    selector = SelectKBest(score_func=f_classif, k=min(k, int(keep.sum())))
+    selector.scores_ = np.where(keep, screen['scores'], np.nan)
+    selector.pvalues_ = np.where(keep, screen['pvalues'], np.nan)
+    selector.n_features_in_ = len(keep)
+    if feature_names is not None:
+        selector.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return selector
@@ -1,13 +1,84 @@
 import pandas as pd
 import numpy as np
+import time
 import joblib
 from xgboost import XGBClassifier
 from sklearn.ensemble import RandomForestClassifier, VotingClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
-from sklearn.model_selection import cross_val_score
+from sklearn.metrics import accuracy_score
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import LabelEncoder
+from ensemble import fit_voting_classifier, training_core_budget, assemble_voting_classifier, balanced_sample_weight
+from quantized import QuantizedFeatures, fit_booster, uses_hist
+from executors import executor_scope, resolve
+from progress import ProgressReporter
+from evaluation import summarize_predictions, save_predictions
 import traceback
 
+def _score_fold(model, X, y, train_idx, test_idx, quantized=None, n_jobs=1, balance_classes=False):
+    """Fit a clone of ``model`` on one CV fold.
+
+    Histogram XGBoost models (standalone or ensemble members) train on rows of
+    the shared ``quantized`` features instead of re-binning the data per fold.
+    With ``balance_classes`` the fold is fitted with balanced sample weights.
+    Returns ``(test accuracy, fitted model)``.
+    """
+    model = clone(model)
+    X, y = resolve(X), resolve(y)
+    label_encoder = LabelEncoder().fit(y[train_idx])
+    y_train = label_encoder.transform(y[train_idx])
+    n_classes = len(label_encoder.classes_)
+    sample_weight = balanced_sample_weight(y_train) if balance_classes else None
+
+    def fit_member(estimator):
+        if 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=n_jobs)
+        if quantized is not None and uses_hist(estimator):
+            dtrain = quantized.matrix(train_idx, label=y_train, weight=sample_weight)
+            return fit_booster(estimator, dtrain, n_classes)
+        return estimator.fit(X[train_idx], y_train, sample_weight=sample_weight)
+
+    if isinstance(model, VotingClassifier):
+        fitted = {name: fit_member(est) for name, est in model.estimators if est != 'drop'}
+        assemble_voting_classifier(model, fitted, label_encoder)
+        predictions = model.predict(X[test_idx])
+    else:
+        model = _EncodedLabels(fit_member(model), label_encoder)
+        predictions = model.predict(X[test_idx])
+    return accuracy_score(y[test_idx], predictions), model
+
+class _EncodedLabels:
+    """A classifier fitted on encoded labels, predicting the original ones"""
+
+    def __init__(self, estimator, label_encoder):
+        self.estimator = estimator
+        self.classes_ = label_encoder.classes_
+
+    def predict(self, X):
+        return self.classes_[self.estimator.predict(X)]
+
+    def predict_proba(self, X):
+        return self.estimator.predict_proba(X)
+
+class CVBaggedClassifier:
+    """Serves the average of the fold models of a cross-validation run (CV-bagging)"""
+
+    def __init__(self, models):
+        self.models = models
+        self.classes_ = np.unique(np.concatenate([model.classes_ for model in models]))
+
+    def predict_proba(self, X):
+        probabilities = np.zeros((len(X), len(self.classes_)))
+        for model in self.models:
+            # A fold may lack a rare class; line its columns up with the overall classes
+            columns = np.searchsorted(self.classes_, model.classes_)
+            probabilities[:, columns] += model.predict_proba(X)
+        return probabilities / len(self.models)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
 class CustomModel:
     def __init__(self):
         self.model = None
@@ -30,7 +101,8 @@ class CustomModel:
                 subsample=params.get('subsample', 0.8),
                 colsample_bytree=params.get('colsample_bytree', 0.8),
                 random_state=42,
-                eval_metric='mlogloss'
+                eval_metric='mlogloss',
+                tree_method='hist'
             )
             
         elif model_type == 'random_forest':
@@ -54,7 +126,8 @@ class CustomModel:
                 n_estimators=200,
                 learning_rate=0.1,
                 max_depth=6,
-                random_state=42
+                random_state=42,
+                tree_method='hist'
             )
             
             rf = RandomForestClassifier(
@@ -86,38 +159,104 @@ class CustomModel:
         
         print(f"✅ {model_type.capitalize()} model created successfully")
     
-    def train(self, X, y, validation_data=None):
-        """Train the model"""
+    def train(self, X, y, validation_data=None, cv_bagging=False, n_folds=5, balance_classes=False, progress=None):
+        """Train the model.
+
+        With ``cv_bagging`` the served model averages the cross-validation fold
+        models instead of being refitted on all rows. ``balance_classes`` fits
+        with balanced sample weights (for data that was not upsampled).
+        Member fits and CV scores are reported to an optional ``progress``.
+        """
         print("🚀 Training custom model...")
+        progress = progress or ProgressReporter()
         
         if self.model is None:
             self.create_model()  # Default to ensemble
         
-        # Train the model
-        self.model.fit(X, y)
-        self.is_trained = True
-        
         # Store training info
         self.training_history = {
             'trained_at': pd.Timestamp.now().isoformat(),
             'training_samples': len(X),
             'num_features': X.shape[1],
-            'num_classes': len(np.unique(y))
+            'num_classes': len(np.unique(y)),
+            'served_model': 'cv_bagging' if cv_bagging else 'full_fit',
+            'class_balancing': 'weights' if balance_classes else 'none'
         }
+        sample_weight = balanced_sample_weight(y) if balance_classes else None
         
-        print("✅ Custom model training completed")
+        if not cv_bagging:
+            # Train the model; ensemble members are fitted concurrently
+            if isinstance(self.model, VotingClassifier):
+                fit_report = fit_voting_classifier(self.model, X, y, sample_weight=sample_weight, progress=progress)
+                self.training_history['fit_report'] = fit_report
+                print(f"⏱️ Ensemble members fitted in {fit_report['wall_seconds']}s "
+                      f"({fit_report['executor_workers']} {fit_report['executor']} workers): {fit_report['member_fit_seconds']}")
+            else:
+                if 'n_jobs' in self.model.get_params():
+                    self.model.set_params(n_jobs=training_core_budget())
+                start = time.time()
+                progress.emit('member_fit_started', member=self.model_info.get('model_type', 'model'), rows=int(len(X)))
+                self.model.fit(X, y, sample_weight=sample_weight)
+                progress.emit('member_fit_completed', member=self.model_info.get('model_type', 'model'),
+                              elapsed=round(time.time() - start, 3))
+            self.is_trained = True
+            print("✅ Custom model training completed")
         
         # Cross-validation score
         try:
-            cv_scores = cross_val_score(self.model, X, y, cv=5, scoring='accuracy')
+            start = time.time()
+            with progress.substage('train', 'cross_validation', folds=n_folds):
+                cv_scores, fold_models = self.cross_validate(X, y, n_folds=n_folds, return_models=True,
+                                                             balance_classes=balance_classes)
             self.training_history['cv_accuracy'] = {
                 'mean': float(cv_scores.mean()),
                 'std': float(cv_scores.std()),
-                'scores': cv_scores.tolist()
+                'scores': cv_scores.tolist(),
+                'seconds': round(time.time() - start, 3)
             }
+            progress.emit('evaluation', cv_accuracy=self.training_history['cv_accuracy'])
             print(f"📊 Cross-validation accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
         except Exception as e:
+            if cv_bagging:
+                raise
             print(f"⚠️  Cross-validation failed: {e}")
+            return
+        
+        if cv_bagging:
+            self.model = CVBaggedClassifier(fold_models)
+            self.is_trained = True
+            print(f"✅ Custom model built from {len(fold_models)} fold models (CV-bagging)")
+    
+    def cross_validate(self, X, y, n_folds=5, return_models=False, balance_classes=False, executor=None):
+        """Stratified k-fold accuracy of the configured model, with folds fitted in parallel.
+
+        Locally, folds run on threads under the training core budget so they
+        can share one quantized copy of the features; each fold gets an equal
+        share of the cores for its own ``n_jobs``. On a cluster executor (see
+        executors.py) the data is shipped once and every fold runs on a worker.
+        """
+        X, y = np.asarray(X), np.asarray(y)
+        members = self.model.estimators if isinstance(self.model, VotingClassifier) else [('model', self.model)]
+        
+        budget = training_core_budget()
+        n_workers = max(1, min(n_folds, budget))
+        folds = StratifiedKFold(n_splits=n_folds).split(X, y)
+        with executor_scope(executor, n_workers, prefer='threads') as executor:
+            # Bin the features once for every fold's histogram XGBoost fit (shared by local threads)
+            quantized = None
+            if not executor.distributed and any(uses_hist(est) for _, est in members if est != 'drop'):
+                quantized = QuantizedFeatures(X)
+            X_shared, y_shared = executor.share(X), executor.share(y)
+            results = executor.starmap(_score_fold, [
+                (self.model, X_shared, y_shared, train_idx, test_idx, quantized, max(1, budget // n_workers),
+                 balance_classes)
+                for train_idx, test_idx in folds
+            ])
+        
+        scores = np.array([score for score, _ in results])
+        if return_models:
+            return scores, [model for _, model in results]
+        return scores
     
     def predict(self, X):
         """Make predictions"""
@@ -134,24 +273,22 @@ class CustomModel:
         
         return predictions, probabilities
     
-    def evaluate(self, X_test, y_test):
-        """Evaluate model performance"""
-        y_pred, probabilities = self.predict(X_test)
-        
-        accuracy = accuracy_score(y_test, y_pred)
-        class_report = classification_report(y_test, y_pred, output_dict=True)
-        conf_matrix = confusion_matrix(y_test, y_pred)
+    def evaluate(self, X_test, y_test, predictions_path=None):
+        """Evaluate model performance (compact summary, see evaluation.summarize_predictions).
         
-        evaluation = {
-            'accuracy': accuracy,
-            'classification_report': class_report,
-            'confusion_matrix': conf_matrix.tolist(),
-            'predictions': y_pred.tolist()
-        }
-        
-        if probabilities is not None:
-            evaluation['probabilities'] = probabilities.tolist()
+        Per-row outputs are only written, as an .npz file, to ``predictions_path``.
+        """
+        y_pred, probabilities = self.predict(X_test)
+        classes = getattr(self.model, 'classes_', None)
+        if classes is None:
+            classes = np.unique(np.concatenate([np.asarray(y_test), y_pred]))
+        if probabilities is None:
+            # Models without predict_proba count as fully confident
+            probabilities = (y_pred[:, None] == classes[None, :]).astype(np.float64)
         
+        evaluation = summarize_predictions(y_test, probabilities, classes)
+        if predictions_path:
+            evaluation['predictions_file'] = save_predictions(predictions_path, y_test, probabilities, classes)
         return evaluation
     
     def get_model_summary(self):
@@ -0,0 +1,235 @@
+import os
+import sys
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import joblib
+
+def booster_footprint(booster):
+    """Size of an XGBoost booster's native model buffer in bytes.
+
+    The trees live in native memory, so the raw model buffer is measured once
+    per number of boosted rounds and cached on the booster.
+    """
+    rounds = booster.num_boosted_rounds()
+    cached = getattr(booster, '_footprint', None)
+    if cached is None or cached[0] != rounds:
+        cached = (rounds, len(booster.save_raw()))
+        booster._footprint = cached
+    return cached[1]
+
+def object_footprint(obj):
+    """Approximate resident size of an object graph in bytes, without pickling it.
+
+    Walks containers, instance attributes and the state of extension objects
+    (e.g. sklearn trees), counting the buffer of every numpy array once and
+    the shallow size of every other object. XGBoost boosters are sized with
+    booster_footprint.
+    """
+    # Holds every visited object so the ids of temporary states are not reused during the walk
+    seen = {}
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen[id(item)] = item
+        if isinstance(item, np.ndarray):
+            if isinstance(item.base, np.ndarray):
+                # Views share the buffer of the array they were taken from
+                stack.append(item.base)
+                continue
+            total += item.nbytes
+            if item.dtype == object:
+                stack.extend(item.ravel())
+        elif isinstance(item, dict):
+            total += sys.getsizeof(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(item)
+            stack.extend(item)
+        elif isinstance(item, (str, bytes, bytearray, int, float, complex, bool)) or item is None:
+            total += sys.getsizeof(item)
+        elif hasattr(item, 'save_raw') and hasattr(item, 'num_boosted_rounds'):
+            # A booster's state is its serialized model; measure the native buffer instead
+            total += booster_footprint(item)
+        else:
+            total += sys.getsizeof(item)
+            try:
+                stack.append(item.__getstate__())
+            except Exception:
+                pass
+    return total
+
+class ModelStore:
+    """Memory-bounded LRU store of per-user models that spills to disk.
+
+    Values (e.g. a model and its preprocessor) are kept in memory up to
+    ``max_bytes`` (USER_MODEL_MEMORY_MB, default 1024) of measured footprint.
+    Beyond that the least recently used values are written to ``spill_dir``
+    (USER_MODEL_SPILL_DIR, default ``model_spill``) and dropped from memory;
+    ``get`` reloads them transparently. The most recently used value always
+    stays in memory, even when it alone exceeds the budget.
+    """
+
+    def __init__(self, spill_dir=None, max_bytes=None):
+        self.spill_dir = spill_dir or os.getenv('USER_MODEL_SPILL_DIR', 'model_spill')
+        self.max_bytes = max_bytes or int(float(os.getenv('USER_MODEL_MEMORY_MB', '1024')) * 1024 * 1024)
+        # key -> {'value', 'nbytes', 'spilled'}; 'spilled' means the spill file is up to date
+        self._resident = OrderedDict()
+        # key -> evicted entry whose spill file is still being written
+        self._spilling = {}
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'evictions': 0}
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, hashlib.sha256(str(key).encode()).hexdigest()[:32] + '.pkl')
+
+    def _insert(self, key, value, nbytes, spilled):
+        """Add a value as most recently used and evict down to the budget (lock held).
+
+        Returns the evicted ``(key, entry)`` pairs that still have to be written
+        with ``_spill`` once the lock is released.
+        """
+        old = self._resident.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old['nbytes']
+        self._resident[key] = {'value': value, 'nbytes': nbytes, 'spilled': spilled}
+        self._memory_bytes += nbytes
+
+        victims = []
+        while self._memory_bytes > self.max_bytes and len(self._resident) > 1:
+            evicted_key, entry = self._resident.popitem(last=False)
+            self._memory_bytes -= entry['nbytes']
+            self._stats['evictions'] += 1
+            if not entry['spilled']:
+                # Stays readable through _spilling until its spill file is published
+                self._spilling[evicted_key] = entry
+                victims.append((evicted_key, entry))
+        return victims
+
+    def _spill(self, victims):
+        """Write evicted values to the spill area (lock not held).
+
+        A value whose spill fails stays readable from memory and is spilled
+        again the next time it is evicted.
+        """
+        for key, entry in victims:
+            path = self._spill_path(key)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                joblib.dump(entry['value'], tmp_path)
+            except Exception as e:
+                print(f"❌ Could not spill model for {key} to disk: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                continue
+            with self._lock:
+                # Publish only if the value was not replaced, deleted or reloaded meanwhile
+                published = self._spilling.get(key) is entry
+                if published:
+                    os.replace(tmp_path, path)
+                    del self._spilling[key]
+            if published:
+                print(f"💾 Spilled model for {key} to disk ({entry['nbytes'] / 2 ** 20:.1f} MB)")
+            else:
+                os.remove(tmp_path)
+
+    def put(self, key, value):
+        """Store a value (replacing any previous one for ``key``)"""
+        nbytes = object_footprint(value)
+        with self._lock:
+            # A spill file of the previous value is stale now
+            self._spilling.pop(key, None)
+            if os.path.exists(self._spill_path(key)):
+                os.remove(self._spill_path(key))
+            victims = self._insert(key, value, nbytes, spilled=False)
+        self._spill(victims)
+        return nbytes
+
+    def get(self, key, record_stats=True):
+        """The value for ``key``, reloaded from the spill area if it was evicted, or None.
+
+        ``record_stats=False`` leaves the hit/miss counters alone (e.g. for warm-up traffic).
+        """
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._resident.move_to_end(key)
+                if record_stats:
+                    self._stats['hits'] += 1
+                return entry['value']
+            entry = self._spilling.pop(key, None)
+            if entry is not None:
+                # Evicted but not on disk yet: take it back into memory
+                if record_stats:
+                    self._stats['hits'] += 1
+                victims = self._insert(key, entry['value'], entry['nbytes'], spilled=False)
+            elif record_stats:
+                self._stats['misses'] += 1
+        if entry is not None:
+            self._spill(victims)
+            return entry['value']
+
+        path = self._spill_path(key)
+        try:
+            # The spill file holds the same arrays, so its size stands in for the footprint
+            nbytes = os.path.getsize(path)
+            value = joblib.load(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            # Another request may have reloaded or replaced it meanwhile
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._resident.move_to_end(key)
+                return entry['value']
+            victims = self._insert(key, value, nbytes, spilled=True)
+            if record_stats:
+                self._stats['reloads'] += 1
+        self._spill(victims)
+        print(f"📂 Reloaded model for {key} from disk")
+        return value
+
+    def delete(self, key):
+        """Remove a value from memory and from the spill area"""
+        with self._lock:
+            entry = self._resident.pop(key, None)
+            if entry is not None:
+                self._memory_bytes -= entry['nbytes']
+            self._spilling.pop(key, None)
+            if os.path.exists(self._spill_path(key)):
+                os.remove(self._spill_path(key))
+
+    def _spilled_paths(self):
+        if not os.path.isdir(self.spill_dir):
+            return set()
+        return {os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir) if name.endswith('.pkl')}
+
+    def _spilled_count(self):
+        """Values only on disk or on their way there (lock held)"""
+        resident_paths = {self._spill_path(key) for key in self._resident}
+        pending_paths = {self._spill_path(key) for key in self._spilling}
+        return len((self._spilled_paths() | pending_paths) - resident_paths)
+
+    def __len__(self):
+        """Number of stored values, in memory or spilled"""
+        with self._lock:
+            return len(self._resident) + self._spilled_count()
+
+    def stats(self):
+        """Memory use and hit/miss/reload/eviction counters"""
+        with self._lock:
+            return {
+                'resident_models': len(self._resident),
+                'spilled_models': self._spilled_count(),
+                'memory_bytes': self._memory_bytes,
+                'max_bytes': self.max_bytes,
+                **self._stats
+            }
@@ -8,6 +8,8 @@ from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import joblib
 import os
+from feature_screening import screen_features, kbest_selector
+from progress import ProgressReporter
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -78,7 +80,7 @@ class CustomDataPreprocessor:
         
         categorical_transformer = Pipeline(steps=[
             ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
-            ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
+            ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False, dtype=np.float32))
         ])
         
         # Only include transformers for features that exist
@@ -95,8 +97,14 @@ class CustomDataPreprocessor:
         
         print(f"✅ Preprocessing pipeline created with {len(transformers)} transformers")
     
-    def preprocess_data(self, df, target_column=None):
-        """Complete preprocessing for custom dataset"""
+    def preprocess_data(self, df, target_column=None, balancing='upsample', progress=None):
+        """Complete preprocessing for custom dataset.
+
+        ``balancing='weights'`` leaves the rows untouched so the model can use
+        balanced sample weights instead of upsampled minority classes. Steps
+        are reported to an optional ``progress`` reporter.
+        """
+        progress = progress or ProgressReporter()
         # Analyze dataset
         feature_columns = self.analyze_dataset(df, target_column)
         
@@ -121,9 +129,13 @@ class CustomDataPreprocessor:
             percentage = (count / len(y_encoded)) * 100
             print(f"   {class_name}: {count} samples ({percentage:.1f}%)")
         
-        # Create and fit preprocessing pipeline
+        progress.emit('rows_processed', stage='preprocess', rows=int(len(X)))
+        
+        # Create and fit preprocessing pipeline; numeric columns stay float32 throughout
         self.create_preprocessing_pipeline()
-        X_processed = self.preprocessor.fit_transform(X)
+        with progress.substage('preprocess', 'transform'):
+            X = X.astype({col: np.float32 for col in self.numeric_features})
+            X_processed = self.preprocessor.fit_transform(X)
         
         # Get feature names after preprocessing
         feature_names = []
@@ -138,18 +150,31 @@ class CustomDataPreprocessor:
         
         # Feature selection
         if len(feature_names) > 10:
-            k = min(15, len(feature_names))
-            self.feature_selector = SelectKBest(score_func=f_classif, k=k)
-            X_selected = self.feature_selector.fit_transform(X_processed, y_encoded)
-            self.selected_features = [feature_names[i] for i in self.feature_selector.get_support(indices=True)]
-            print(f"✅ Selected top {k} features from {len(feature_names)} total features")
+            with progress.substage('preprocess', 'feature_selection', features=len(feature_names)):
+                # Constant and highly correlated (e.g. complementary one-hot) columns never get selected
+                screen = screen_features(X_processed, y_encoded)
+                dropped = screen['constant'] | screen['correlated']
+                if dropped.any():
+                    print(f"   Screened out {int(dropped.sum())} constant or highly correlated features")
+                self.feature_selector = kbest_selector(screen, 15)
+                X_selected = self.feature_selector.transform(X_processed)
+                self.selected_features = [feature_names[i] for i in self.feature_selector.get_support(indices=True)]
+                print(f"✅ Selected top {self.feature_selector.k} features from {len(feature_names)} total features")
         else:
             X_selected = X_processed
             self.selected_features = feature_names
             print(f"✅ Using all {len(feature_names)} features")
         
+        # One contiguous float32 matrix for the models
+        X_selected = np.ascontiguousarray(X_selected, dtype=np.float32)
+        
+        if balancing == 'weights':
+            print("⚖️ Keeping class distribution; the model weights classes instead")
+            return X_selected, y_encoded
+        
         # Handle class imbalance
-        X_balanced, y_balanced = self.handle_class_imbalance(X_selected, y_encoded)
+        with progress.substage('preprocess', 'class_balance'):
+            X_balanced, y_balanced = self.handle_class_imbalance(X_selected, y_encoded)
         
         return X_balanced, y_balanced
     
@@ -157,20 +182,13 @@ class CustomDataPreprocessor:
         """Handle class imbalance using SMOTE-like manual resampling"""
         print("⚖️ Handling class imbalance...")
         
-        # Convert to DataFrame for easier manipulation
-        if hasattr(X, 'toarray'):
-            X_df = pd.DataFrame(X.toarray())
-        else:
-            X_df = pd.DataFrame(X)
-        X_df['target'] = y
-        
         # Find the majority class count
-        class_counts = X_df['target'].value_counts()
-        max_count = class_counts.max()
-        min_count = class_counts.min()
+        classes, counts = np.unique(y, return_counts=True)
+        max_count = counts.max()
+        min_count = counts.min()
         
         print("📈 Class distribution before resampling:")
-        for class_idx, count in class_counts.items():
+        for class_idx, count in zip(classes, counts):
             class_name = self.label_encoder.inverse_transform([class_idx])[0]
             print(f"   {class_name}: {count} samples")
         
@@ -178,28 +196,25 @@ class CustomDataPreprocessor:
         imbalance_ratio = max_count / min_count if min_count > 0 else float('inf')
         
         if imbalance_ratio > 2:  # Only resample if imbalance is significant
-            resampled_dfs = []
-            for class_idx in class_counts.index:
-                class_df = X_df[X_df['target'] == class_idx]
-                n_samples = len(class_df)
+            # Resample row indices of each minority class, then gather the rows once
+            resampled_indices = []
+            for class_idx, n_samples in sorted(zip(classes, counts), key=lambda item: -item[1]):
+                class_indices = np.flatnonzero(y == class_idx)
                 
                 if n_samples < max_count:
                     # Upsample minority class
-                    resampled_class = resample(
-                        class_df,
+                    class_indices = resample(
+                        class_indices,
                         replace=True,
                         n_samples=max_count,
                         random_state=42
                     )
-                    resampled_dfs.append(resampled_class)
                     print(f"   🔼 Upsampled {self.label_encoder.inverse_transform([class_idx])[0]} from {n_samples} to {max_count}")
-                else:
-                    resampled_dfs.append(class_df)
+                resampled_indices.append(class_indices)
             
-            # Combine all resampled data
-            X_resampled_df = pd.concat(resampled_dfs, ignore_index=True)
-            X_resampled = X_resampled_df.drop('target', axis=1).values
-            y_resampled = X_resampled_df['target'].values
+            indices = np.concatenate(resampled_indices)
+            X_resampled = X[indices]
+            y_resampled = np.asarray(y)[indices]
             
             print("📊 Class distribution after resampling:")
             unique, counts = np.unique(y_resampled, return_counts=True)
@@ -237,6 +252,25 @@ class CustomDataPreprocessor:
         
         return sample_processed
     
+    def warmup_samples(self, n_samples, seed=0):
+        """Synthetic raw samples from the training feature distribution, used to warm up the service"""
+        if self.preprocessor is None:
+            return []
+        rng = np.random.default_rng(seed)
+        samples = [{} for _ in range(n_samples)]
+        transformers = self.preprocessor.named_transformers_
+        if self.numeric_features:
+            scaler = transformers['num'].named_steps['scaler']
+            values = scaler.inverse_transform(rng.standard_normal((n_samples, len(self.numeric_features))))
+            for sample, row in zip(samples, values):
+                sample.update({feature: float(value) for feature, value in zip(self.numeric_features, row)})
+        if self.categorical_features:
+            categories = transformers['cat'].named_steps['onehot'].categories_
+            for feature, options in zip(self.categorical_features, categories):
+                for sample, index in zip(samples, rng.integers(len(options), size=n_samples)):
+                    sample[feature] = str(options[index])
+        return samples
+    
     def save_preprocessor(self, file_path):
         """Save preprocessor objects"""
         try:
@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+from xgboost.callback import TrainingCallback
+
+class ProgressReporter:
+    """Forward training progress events to an optional callback.
+
+    The callback is called as ``callback(event, **details)``. Stages are
+    numbered from the ``stages`` list so listeners can compute overall
+    progress. Reporters are picklable as long as the callback is.
+    """
+
+    def __init__(self, callback=None, stages=()):
+        self.callback = callback
+        self.stages = list(stages)
+
+    def emit(self, event, **details):
+        """Send a single event (no-op without a callback)"""
+        if self.callback is not None:
+            self.callback(event, **details)
+
+    @contextmanager
+    def stage(self, name, **details):
+        """Report the start and completion of a pipeline stage"""
+        step = self.stages.index(name) + 1 if name in self.stages else None
+        start = time.time()
+        self.emit('stage_started', stage=name, step=step, total_steps=len(self.stages), **details)
+        yield
+        self.emit('stage_completed', stage=name, step=step, total_steps=len(self.stages),
+                  elapsed=round(time.time() - start, 3))
+
+    @contextmanager
+    def substage(self, stage, name, **details):
+        """Report a step within a stage (not counted towards overall progress)"""
+        start = time.time()
+        self.emit('substage_started', stage=stage, substage=name, **details)
+        yield
+        self.emit('substage_completed', stage=stage, substage=name, elapsed=round(time.time() - start, 3))
+
+class BoostingProgress(TrainingCallback):
+    """XGBoost callback reporting every ``every``-th boosting round as a ``boosting_round`` event"""
+
+    def __init__(self, progress, member, total_rounds, every=10):
+        super().__init__()
+        self.progress = progress
+        self.member = member
+        self.total_rounds = total_rounds
+        self.every = every
+
+    def after_iteration(self, model, epoch, evals_log):
+        done = epoch + 1
+        if done % self.every == 0 or done == self.total_rounds:
+            metrics = {f'{data}-{metric}': float(values[-1]) for data, data_log in evals_log.items()
+                       for metric, values in data_log.items() if values}
+            self.progress.emit('boosting_round', member=self.member, round=done, total_rounds=self.total_rounds,
+                               metrics=metrics)
+        return False
@@ -0,0 +1,124 @@
+import os
+import time
+import resource
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+class QuantizedFeatures:
+    """Histogram quantization of a feature matrix, computed once and shared by XGBoost fits.
+
+    The quantile cuts are sketched a single time over all rows (as an
+    ``xgboost.QuantileDMatrix``); matrices for any subset of rows (CV folds,
+    tuning prefixes, new rows of an incremental update) reuse those cuts via
+    ``ref=`` instead of sketching again. Matrices can be memoized by ``key``.
+    """
+
+    def __init__(self, X, max_bin=256):
+        import xgboost
+
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.max_bin = max_bin
+        self.reference = xgboost.QuantileDMatrix(self.X, max_bin=max_bin)
+        self._matrices = {}
+
+    def bin(self, data, label=None, weight=None):
+        """QuantileDMatrix for other rows with the same features, binned with the shared cuts"""
+        import xgboost
+
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        return xgboost.QuantileDMatrix(data, label=label, weight=weight, max_bin=self.max_bin, ref=self.reference)
+
+    def matrix(self, rows=None, label=None, weight=None, key=None):
+        """QuantileDMatrix for ``rows`` (all rows when None) binned with the shared cuts"""
+        if key is not None and key in self._matrices:
+            return self._matrices[key]
+        matrix = self.bin(self.X if rows is None else self.X[rows], label=label, weight=weight)
+        if key is not None:
+            self._matrices[key] = matrix
+        return matrix
+
+def uses_hist(estimator):
+    """True for XGBoost estimators configured for histogram training"""
+    return hasattr(estimator, 'get_booster') and estimator.get_params().get('tree_method') == 'hist'
+
+def fit_booster(estimator, dtrain, n_classes, evals=(), xgb_model=None):
+    """Train an (unfitted) XGBClassifier on a prepared DMatrix.
+
+    Uses the estimator's own parameters, rounds, early stopping and callbacks,
+    and installs the resulting booster so the estimator behaves as if
+    ``fit`` had been called with the encoded labels ``0..n_classes-1``.
+    """
+    import xgboost
+
+    params = {k: v for k, v in estimator.get_xgb_params().items() if v is not None}
+    if 'n_jobs' in params:
+        params['nthread'] = params.pop('n_jobs')
+    if n_classes > 2:
+        if params.get('objective') != 'multi:softmax':
+            params['objective'] = 'multi:softprob'
+        params['num_class'] = n_classes
+
+    evals_result = {}
+    estimator._Booster = xgboost.train(
+        params,
+        dtrain,
+        num_boost_round=estimator.get_num_boosting_rounds(),
+        evals=list(evals),
+        early_stopping_rounds=estimator.early_stopping_rounds,
+        evals_result=evals_result,
+        verbose_eval=False,
+        xgb_model=xgb_model,
+        callbacks=estimator.callbacks
+    )
+    estimator.objective = params['objective']
+    estimator.classes_ = np.arange(n_classes)
+    estimator.n_classes_ = n_classes
+    estimator.evals_result_ = evals_result
+    return estimator
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _current_rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def _run_variant(variant, X, y, params, n_fits):
+    """Fit ``n_fits`` XGBoost models on overlapping 80% subsets; returns (seconds, extra peak MB)"""
+    from xgboost import XGBClassifier
+
+    start_rss = _current_rss_mb()
+    rng = np.random.RandomState(0)
+    subsets = [np.sort(rng.choice(len(X), int(len(X) * 0.8), replace=False)) for _ in range(n_fits)]
+    n_classes = len(np.unique(y))
+
+    start = time.time()
+    if variant == 'hist_shared':
+        quantized = QuantizedFeatures(X)
+        for rows in subsets:
+            fit_booster(XGBClassifier(tree_method='hist', **params), quantized.matrix(rows, label=y[rows]), n_classes)
+    else:
+        tree_method = 'hist' if variant == 'hist' else None
+        for rows in subsets:
+            XGBClassifier(tree_method=tree_method, **params).fit(np.asarray(X[rows], dtype=np.float64), y[rows])
+    return round(time.time() - start, 3), round(_peak_rss_mb() - start_rss, 1)
+
+def benchmark_quantized_training(X, y, scale=100, n_fits=3, n_estimators=50, max_depth=8):
+    """Compare XGBoost fit time and memory: default tree method vs hist vs hist with shared quantization.
+
+    The data is tiled ``scale`` times (with a little jitter). Each variant runs
+    in a fresh process so its peak memory is measured separately.
+    """
+    rng = np.random.RandomState(42)
+    X_big = np.tile(np.asarray(X, dtype=np.float32), (scale, 1))
+    X_big += rng.normal(scale=0.01, size=X_big.shape).astype(np.float32)
+    y_big = np.tile(np.asarray(y), scale)
+    params = {'n_estimators': n_estimators, 'max_depth': max_depth, 'eval_metric': 'mlogloss', 'random_state': 42}
+
+    report = {'rows': int(len(X_big)), 'features': int(X_big.shape[1]), 'fits': n_fits, 'variants': {}}
+    for variant in ['default', 'hist', 'hist_shared']:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            seconds, peak_mb = executor.submit(_run_variant, variant, X_big, y_big, params, n_fits).result()
+        report['variants'][variant] = {'seconds': seconds, 'extra_peak_mb': peak_mb}
+        print(f"   {variant}: {seconds}s, +{peak_mb} MB peak")
+    return report
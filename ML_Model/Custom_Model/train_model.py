@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from preprocess import CustomDataPreprocessor
+from model import CustomModel
+from model_cache import ModelCache
+from progress import ProgressReporter
+
+TRAINING_STAGES = ['load', 'preprocess', 'train', 'save']
+
+def load_dataset(file_path):
+    """Read an uploaded CSV or Excel file"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.csv':
+        return pd.read_csv(file_path)
+    if file_extension in ['.xlsx', '.xls']:
+        return pd.read_excel(file_path)
+    raise ValueError(f'Unsupported file type: {file_extension}')
+
+def train_custom_model(df, target_column, model_type='ensemble', training_params=None, progress=None):
+    """Preprocess a dataset and train a custom model; returns (model, preprocessor, dataset_info)"""
+    training_params = training_params or {}
+    progress = progress or ProgressReporter()
+
+    # Initialize and run preprocessing
+    # training_params {'class_balancing': 'upsample'} restores minority-class upsampling
+    class_balancing = training_params.get('class_balancing', 'weights')
+    with progress.stage('preprocess', rows=int(len(df))):
+        preprocessor = CustomDataPreprocessor()
+        X, y = preprocessor.preprocess_data(df, target_column, balancing=class_balancing, progress=progress)
+
+    # Create and train model
+    with progress.stage('train', samples=int(len(X))):
+        model = CustomModel()
+        model.create_model(model_type, training_params)
+        # training_params {'cv_bagging': True} serves the CV fold models instead of a full refit
+        model.train(X, y, cv_bagging=bool(training_params.get('cv_bagging', False)),
+                    balance_classes=class_balancing == 'weights', progress=progress)
+
+    dataset_info = {
+        'original_shape': df.shape,
+        'training_samples': len(X),
+        'num_features': X.shape[1],
+        'num_classes': len(np.unique(y))
+    }
+    return model, preprocessor, dataset_info
+
+def cache_trained_model(cache_key, model, preprocessor, dataset_info):
+    """Keep a copy of a trained model for identical re-uploads"""
+    cache_dir = tempfile.mkdtemp()
+    try:
+        model.save_model(os.path.join(cache_dir, 'model.pkl'))
+        preprocessor.save_preprocessor(os.path.join(cache_dir, 'preprocessor.pkl'))
+        ModelCache().store(cache_key, {'dataset_info': dataset_info}, {
+            'model.pkl': os.path.join(cache_dir, 'model.pkl'),
+            'preprocessor.pkl': os.path.join(cache_dir, 'preprocessor.pkl')
+        })
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def run_training_job(data_file_path, user_id, target_column, model_type, training_params, cache_key, output_dir,
+                     progress_callback=None):
+    """Entry point for training jobs: train, save the model files to ``output_dir`` and return a summary"""
+    progress = ProgressReporter(progress_callback, TRAINING_STAGES)
+    with progress.stage('load'):
+        df = load_dataset(data_file_path)
+    print(f"📊 Loaded dataset: {df.shape[0]} rows, {df.shape[1]} columns")
+
+    model, preprocessor, dataset_info = train_custom_model(df, target_column, model_type, training_params, progress)
+
+    with progress.stage('save'):
+        model.save_model(os.path.join(output_dir, 'model.pkl'))
+        preprocessor.save_preprocessor(os.path.join(output_dir, 'preprocessor.pkl'))
+        cache_trained_model(cache_key, model, preprocessor, dataset_info)
+
+    return {
+        'user_id': user_id,
+        'dataset_info': dataset_info,
+        'cv_accuracy': model.training_history.get('cv_accuracy'),
+        'model_path': os.path.join(output_dir, 'model.pkl'),
+        'preprocessor_path': os.path.join(output_dir, 'preprocessor.pkl')
+    }
@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import functools
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import Tree, NODE_DTYPE
+from attributions import EnsembleAttributor
+from ensemble import assemble_voting_classifier
+
+# File layout: magic, header length (uint64), JSON header, then arrays aligned to ALIGNMENT bytes
+MAGIC = b'ENSMBL01'
+ALIGNMENT = 64
+
+def _narrow_int(values):
+    """``values`` in the narrowest signed integer type that holds them"""
+    values = np.asarray(values)
+    low, high = (int(values.min()), int(values.max())) if values.size else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+def _json_params(estimator):
+    """The estimator's own parameters that survive a JSON round trip"""
+    params = {}
+    for key, value in estimator.get_params(deep=False).items():
+        try:
+            json.dumps(value)
+            params[key] = value
+        except TypeError:
+            continue
+    return params
+
+def is_artifact(path):
+    """Whether ``path`` holds a compact model artifact (rather than a joblib pickle)"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def write_artifact(path, arrays, meta):
+    """Write ``{name: array}`` and a JSON-serializable ``meta`` into one memory-mappable file"""
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'meta': meta, 'arrays': entries}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    return path
+
+class ArtifactFile:
+    """A compact model artifact opened as one read-only memory map; arrays are views into it"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a model artifact: {path}")
+            header_size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_size))
+        self.path = path
+        self.meta = header['meta']
+        self.entries = header['arrays']
+        self.data_start = -(-(len(MAGIC) + 8 + header_size) // ALIGNMENT) * ALIGNMENT
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r') if self.entries else None
+
+    def array(self, name):
+        entry = self.entries[name]
+        dtype = np.dtype(entry['dtype'])
+        start = self.data_start + entry['offset']
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        return self._buffer[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+
+    def arrays(self, prefix):
+        """``{name: array}`` of the entries under ``prefix/``"""
+        return {name[len(prefix) + 1:]: self.array(name) for name in self.entries if name.startswith(prefix + '/')}
+
+class CompactForest:
+    """Predictions of a fitted RandomForestClassifier from flat node arrays.
+
+    All trees share one set of node arrays (``offsets`` marks where each
+    tree starts): child indices within the tree and split features in the
+    narrowest integer type, float32 thresholds rounded down (trees compare
+    float32 inputs, so decisions are unchanged) and float32 per-node class
+    probabilities. The arrays may be memory-mapped; every tree is evaluated
+    at once, level by level.
+    """
+
+    def __init__(self, arrays, meta):
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.offsets = np.asarray(arrays['offsets'], dtype=np.int64)
+        self.depths = arrays['depths']
+        self.classes_ = np.asarray(arrays['classes'])
+        self.n_classes_ = len(self.classes_)
+        self.n_features_in_ = meta['n_features']
+        self.n_estimators = len(self.offsets) - 1
+        self.params = meta['params']
+
+    @staticmethod
+    def arrays_from_estimator(forest):
+        """``(arrays, meta)`` describing a fitted RandomForestClassifier"""
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        threshold = np.concatenate([tree.threshold for tree in trees])
+        threshold32 = threshold.astype(np.float32)
+        # Largest float32 not above each threshold: x <= t and x <= t32 agree for every float32 x
+        above = threshold32.astype(np.float64) > threshold
+        threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+        values = np.concatenate([tree.value[:, 0, :] for tree in trees])
+        values = values / np.maximum(values.sum(axis=1, keepdims=True), np.finfo(np.float64).tiny)
+        arrays = {
+            'left': _narrow_int(np.concatenate([tree.children_left for tree in trees])),
+            'right': _narrow_int(np.concatenate([tree.children_right for tree in trees])),
+            'feature': _narrow_int(np.concatenate([tree.feature for tree in trees])),
+            'threshold': threshold32,
+            'value': values.astype(np.float32),
+            'offsets': np.concatenate([[0], np.cumsum([tree.node_count for tree in trees])]).astype(np.int64),
+            'depths': _narrow_int([tree.max_depth for tree in trees]),
+            'classes': np.asarray(forest.classes_)
+        }
+        return arrays, {'n_features': int(forest.n_features_in_), 'params': _json_params(forest)}
+
+    def _descend(self, X, record=False):
+        """Leaf reached in every tree by every sample (global node ids), optionally with the visited nodes"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        roots = self.offsets[:-1]
+        node = np.repeat(roots[None, :], len(X), axis=0)
+        visited = [node] if record else None
+        for _ in range(int(self.depths.max()) if len(self.depths) else 0):
+            left = self.left[node]
+            internal = left >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            child = np.where(go_left, left, self.right[node]) + roots
+            if record:
+                visited.append(np.where(internal, child, -1))
+            node = np.where(internal, child, node)
+        return node, visited
+
+    def predict_proba(self, X):
+        leaves, _ = self._descend(X)
+        return self.value[leaves].astype(np.float64).mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def decision_path(self, X):
+        """``(indicator, n_nodes_ptr)`` like ``RandomForestClassifier.decision_path``"""
+        _, visited = self._descend(X, record=True)
+        nodes = np.stack(visited, axis=-1).reshape(len(X), -1)
+        samples = np.repeat(np.arange(len(X)), nodes.shape[1])
+        keep = nodes.ravel() >= 0
+        indicator = sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int64), (samples[keep], nodes.ravel()[keep])),
+            shape=(len(X), int(self.offsets[-1]))
+        )
+        return indicator, self.offsets
+
+    def to_estimator(self):
+        """An equivalent RandomForestClassifier (node sample counts and impurities are not kept)"""
+        forest = RandomForestClassifier(**self.params)
+        forest.estimator_ = DecisionTreeClassifier()
+        tree_params = {name: getattr(forest, name) for name in forest.estimator_params}
+        n_classes = np.array([self.n_classes_], dtype=np.intp)
+        forest.estimators_ = []
+        for index in range(self.n_estimators):
+            start, stop = self.offsets[index], self.offsets[index + 1]
+            nodes = np.zeros(stop - start, dtype=NODE_DTYPE)
+            nodes['left_child'] = self.left[start:stop]
+            nodes['right_child'] = self.right[start:stop]
+            nodes['feature'] = self.feature[start:stop]
+            nodes['threshold'] = self.threshold[start:stop]
+            tree = Tree(self.n_features_in_, n_classes, 1)
+            tree.__setstate__({
+                'max_depth': int(self.depths[index]),
+                'node_count': int(stop - start),
+                'nodes': nodes,
+                'values': np.ascontiguousarray(self.value[start:stop, None, :], dtype=np.float64)
+            })
+            estimator = DecisionTreeClassifier(**tree_params)
+            estimator.tree_ = tree
+            estimator.n_features_in_ = self.n_features_in_
+            estimator.n_outputs_ = 1
+            estimator.classes_ = self.classes_.copy()
+            estimator.n_classes_ = self.n_classes_
+            estimator.max_features_ = self.n_features_in_
+            forest.estimators_.append(estimator)
+        forest.n_features_in_ = self.n_features_in_
+        forest.n_outputs_ = 1
+        forest.classes_ = self.classes_.copy()
+        forest.n_classes_ = self.n_classes_
+        return forest
+
+def _unwrap(member):
+    return member
+
+class LazyMember:
+    """Ensemble member read from its artifact on first use; attribute access goes to the loaded member"""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._member = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._member is None:
+            with self._lock:
+                if self._member is None:
+                    self._member = self._loader()
+        return self._member
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __reduce__(self):
+        # Pickles (e.g. checkpoints) hold the member itself
+        return _unwrap, (self.load(),)
+
+def _xgboost_bytes(estimator):
+    """An XGBoost model in its native UBJSON format, with its scikit-learn attributes"""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'model.ubj')
+        estimator.save_model(path)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def _load_member(artifact, member, materialize):
+    from xgboost import XGBClassifier
+
+    arrays = artifact.arrays(f"member/{member['name']}")
+    if member['kind'] == 'xgboost':
+        estimator = XGBClassifier()
+        estimator.load_model(bytearray(arrays['booster']))
+        return estimator
+    if member['kind'] == 'forest':
+        forest = CompactForest(arrays, member)
+        return forest.to_estimator() if materialize else forest
+    estimator = LogisticRegression(**member['params'])
+    for name, array in arrays.items():
+        setattr(estimator, name, np.array(array))
+    estimator.n_features_in_ = estimator.coef_.shape[1]
+    return estimator
+
+def save_ensemble(path, model, attributor=None):
+    """Write a fitted soft-voting XGBoost/RandomForest/LogisticRegression ensemble (and its attributor) as an artifact"""
+    arrays = {'classes': np.asarray(model.le_.classes_)}
+    members = []
+    names = [name for name, est in model.estimators if est != 'drop']
+    for name, estimator in zip(names, model.estimators_):
+        if isinstance(estimator, LazyMember):
+            estimator = estimator.load()
+        prefix = f'member/{name}'
+        if hasattr(estimator, 'get_booster'):
+            arrays[f'{prefix}/booster'] = np.frombuffer(_xgboost_bytes(estimator), dtype=np.uint8)
+            members.append({'name': name, 'kind': 'xgboost'})
+        elif isinstance(estimator, (CompactForest, RandomForestClassifier)):
+            if isinstance(estimator, CompactForest):
+                forest_arrays = {key: getattr(estimator, key) for key in ('left', 'right', 'feature', 'threshold', 'value', 'offsets', 'depths', 'classes_')}
+                forest_arrays['classes'] = forest_arrays.pop('classes_')
+                forest_meta = {'n_features': estimator.n_features_in_, 'params': estimator.params}
+            else:
+                forest_arrays, forest_meta = CompactForest.arrays_from_estimator(estimator)
+            arrays.update({f'{prefix}/{key}': value for key, value in forest_arrays.items()})
+            members.append({'name': name, 'kind': 'forest', **forest_meta})
+        elif hasattr(estimator, 'coef_'):
+            for key in ('coef_', 'intercept_', 'classes_', 'n_iter_'):
+                arrays[f'{prefix}/{key}'] = np.asarray(getattr(estimator, key))
+            members.append({'name': name, 'kind': 'linear', 'params': _json_params(estimator)})
+        else:
+            raise ValueError(f"Unsupported ensemble member for the artifact format: {name}")
+
+    meta = {
+        'format': 1,
+        'voting': {key: value for key, value in _json_params(model).items() if key != 'estimators'},
+        'members': members,
+        'attributor': None
+    }
+    if attributor is not None:
+        attributor_members = []
+        for index, member in enumerate(attributor.members):
+            scalars = {}
+            for key, value in member.items():
+                if isinstance(value, np.ndarray):
+                    arrays[f'attributor/{index}/{key}'] = _narrow_int(value) if key == 'node_features' else value
+                elif key not in ('estimator', 'path_matrix'):
+                    scalars[key] = value
+            attributor_members.append(scalars)
+        meta['attributor'] = {
+            'exact_xgb_shap': attributor.exact_xgb_shap,
+            'weights': np.asarray(attributor.weights).tolist(),
+            'base_values': np.asarray(attributor.base_values).tolist(),
+            'n_features': attributor.n_features,
+            'n_classes': attributor.n_classes,
+            'members': attributor_members
+        }
+    return write_artifact(path, arrays, meta)
+
+def load_ensemble(path, lazy=True):
+    """Load ``(model, attributor)`` saved by ``save_ensemble``.
+
+    With ``lazy`` each member is read on first use and the forest stays a
+    memory-mapped CompactForest; otherwise plain scikit-learn/XGBoost
+    estimators are rebuilt (needed to continue training them).
+    """
+    artifact = ArtifactFile(path)
+    meta = artifact.meta
+    fitted = {}
+    for member in meta['members']:
+        loader = functools.partial(_load_member, artifact, member, not lazy)
+        fitted[member['name']] = LazyMember(loader) if lazy else loader()
+
+    model = VotingClassifier([(name, fitted[name]) for name in fitted], **meta['voting'])
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(artifact.array('classes'))
+    assemble_voting_classifier(model, fitted, label_encoder)
+
+    attributor = None
+    if meta['attributor'] is not None:
+        state = meta['attributor']
+        attributor = EnsembleAttributor(exact_xgb_shap=state['exact_xgb_shap'])
+        attributor.weights = np.asarray(state['weights'])
+        attributor.base_values = np.asarray(state['base_values'])
+        attributor.n_features = state['n_features']
+        attributor.n_classes = state['n_classes']
+        attributor.members = []
+        for index, scalars in enumerate(state['members']):
+            member = {**scalars, **artifact.arrays(f'attributor/{index}')}
+            if member['kind'] in ('xgboost', 'forest'):
+                member['estimator'] = fitted[member['name']]
+            attributor.members.append(member)
+    return model, attributor
+
+def benchmark_artifact_format(model, attributor, X, repeats=3):
+    """Compare joblib pickles with the compact artifact: file size, load time and first prediction"""
+    directory = tempfile.mkdtemp()
+    try:
+        pickle_path = os.path.join(directory, 'model.pkl')
+        artifact_path = os.path.join(directory, 'model.artifact')
+        joblib.dump({'model': model, 'attributor': attributor}, pickle_path)
+        save_ensemble(artifact_path, model, attributor)
+        reference = model.predict_proba(X)
+
+        def timed(load):
+            best_load, best_predict, proba = np.inf, np.inf, None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                loaded = load()
+                loaded_at = time.perf_counter()
+                proba = loaded.predict_proba(X)
+                best_load = min(best_load, loaded_at - start)
+                best_predict = min(best_predict, time.perf_counter() - loaded_at)
+            return {'load_seconds': round(best_load, 4), 'first_predict_seconds': round(best_predict, 4),
+                    'max_proba_difference': float(np.abs(proba - reference).max())}
+
+        report = {
+            'rows': int(len(X)),
+            'joblib': {'size_bytes': os.path.getsize(pickle_path), **timed(lambda: joblib.load(pickle_path)['model'])},
+            'artifact': {'size_bytes': os.path.getsize(artifact_path), **timed(lambda: load_ensemble(artifact_path)[0])},
+            'artifact_materialized': timed(lambda: load_ensemble(artifact_path, lazy=False)[0])
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"📦 joblib:   {report['joblib']['size_bytes'] / 2 ** 20:.2f} MB, load {report['joblib']['load_seconds']}s, "
+          f"first predict {report['joblib']['first_predict_seconds']}s")
+    print(f"📦 artifact: {report['artifact']['size_bytes'] / 2 ** 20:.2f} MB, load {report['artifact']['load_seconds']}s, "
+          f"first predict {report['artifact']['first_predict_seconds']}s "
+          f"(max probability difference {report['artifact']['max_proba_difference']:.2e})")
+    return report
@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import joblib
+from model_cache import code_version
+
+# Boosting rounds between partial XGBoost checkpoints
+BOOSTING_CHECKPOINT_ROUNDS = 50
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """Hex SHA-256 digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class RunCheckpoint:
+    """Checkpoints of one training run, stored as files in a run directory.
+
+    A run is identified by the training data, configuration and service code
+    version, so retrying the same job finds the stages a previous attempt
+    completed while checkpoints written by older code are never restored.
+    Only the ``max_runs`` (TRAINING_RUNS_MAX_ENTRIES, default 4) most
+    recently used run directories are kept, so failed or abandoned runs do
+    not pile up. Objects are
+    written to a temporary file and renamed, so a crash never leaves a
+    half-written checkpoint behind. Instances are picklable and can be used
+    from worker processes.
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    @classmethod
+    def for_run(cls, data_file_path, config, runs_dir=None, max_runs=None):
+        """Checkpoint directory for training ``data_file_path`` with ``config``"""
+        runs_dir = runs_dir or os.getenv('TRAINING_RUNS_DIR', 'training_runs')
+        max_runs = max_runs or int(os.getenv('TRAINING_RUNS_MAX_ENTRIES', '4'))
+        key = hashlib.sha256(
+            (file_sha256(data_file_path) + json.dumps(config, sort_keys=True, default=str) +
+             code_version(os.path.dirname(os.path.abspath(__file__)))).encode()
+        ).hexdigest()[:16]
+        checkpoint = cls(os.path.join(runs_dir, key))
+        # A resumed run is the most recently used one, however old its directory
+        os.utime(checkpoint.run_dir)
+        _prune_runs(runs_dir, max_runs)
+        return checkpoint
+
+    def _path(self, name):
+        return os.path.join(self.run_dir, f'{name}.pkl')
+
+    def has(self, name):
+        return os.path.exists(self._path(name))
+
+    def save(self, name, obj):
+        """Atomically store a checkpoint"""
+        tmp_path = self._path(name) + '.tmp'
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, self._path(name))
+
+    def load(self, name):
+        return joblib.load(self._path(name))
+
+    def completed(self):
+        """Names of the stored checkpoints"""
+        return sorted(f[:-4] for f in os.listdir(self.run_dir) if f.endswith('.pkl'))
+
+    def boosting_dir(self, member):
+        """Directory for partial boosting checkpoints of one member"""
+        path = os.path.join(self.run_dir, f'{member}_rounds')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def latest_booster(self, member):
+        """Most recent readable partial booster of a member, or None"""
+        import xgboost
+
+        path = self.boosting_dir(member)
+        pattern = re.compile(rf'^{re.escape(member)}_(\d+)\.json$')
+        rounds = sorted(
+            (int(m.group(1)), f) for f in os.listdir(path) for m in [pattern.match(f)] if m
+        )
+        for _, file_name in reversed(rounds):
+            try:
+                return xgboost.Booster(model_file=os.path.join(path, file_name))
+            except xgboost.core.XGBoostError:
+                # Interrupted while writing; fall back to the previous checkpoint
+                continue
+        return None
+
+    def clear(self):
+        """Remove the run directory once the run has finished"""
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+def _prune_runs(runs_dir, max_runs):
+    """Remove the least recently modified run directories beyond ``max_runs``"""
+    runs = []
+    for name in os.listdir(runs_dir):
+        path = os.path.join(runs_dir, name)
+        if os.path.isdir(path):
+            runs.append((os.path.getmtime(path), path))
+    for _, path in sorted(runs)[:max(0, len(runs) - max_runs)]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,182 @@
+import io
+import os
+import json
+import time
+import uuid
+import shutil
+import contextlib
+import numpy as np
+import pandas as pd
+from checkpoints import file_sha256
+
+# (path, size, mtime) -> SHA-256, so repeated reads in one process skip hashing
+_CHECKSUMS = {}
+
+def _checksum(file_path):
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _CHECKSUMS:
+        _CHECKSUMS[key] = file_sha256(file_path)
+    return _CHECKSUMS[key]
+
+class ColumnarStore:
+    """Typed columnar copies of archive CSVs, converted once and memory-mapped on every read.
+
+    Entries are keyed by the SHA-256 of the CSV. Each entry directory holds
+    one ``.npy`` file per column (numbers as float64, text as fixed-width
+    unicode with a ``.na.npy`` mask of missing values) and ``meta.json``
+    with the column order and row count. Reads memory-map only the requested
+    columns, so nothing is parsed and unused columns are never touched. The
+    least recently used entries beyond ``max_entries`` are evicted.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=None):
+        self.cache_dir = cache_dir or os.getenv('COLUMNAR_CACHE_DIR', 'columnar_cache')
+        self.max_entries = max_entries or int(os.getenv('COLUMNAR_CACHE_MAX_ENTRIES', '4'))
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def meta(self, file_path):
+        """Entry metadata for ``file_path``, converting the CSV on first use"""
+        key = _checksum(file_path)[:24]
+        meta_path = os.path.join(self._entry_dir(key), 'meta.json')
+        if not os.path.exists(meta_path):
+            self._convert(file_path, key)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        os.utime(meta_path)  # mark as recently used
+        return meta
+
+    def columns(self, file_path):
+        """Header of the CSV, without reading any column"""
+        return [column['name'] for column in self.meta(file_path)['columns']]
+
+    def read(self, file_path, columns=None, start=0, stop=None):
+        """Rows ``start:stop`` of ``columns`` (all when None; unknown names are skipped) as a DataFrame"""
+        meta = self.meta(file_path)
+        entry_dir = self._entry_dir(meta['key'])
+        wanted = None if columns is None else set(columns)
+        data = {}
+        for column in meta['columns']:
+            if wanted is not None and column['name'] not in wanted:
+                continue
+            values = np.load(os.path.join(entry_dir, column['file']), mmap_mode='r')[start:stop]
+            if column['kind'] == 'text':
+                values = values.astype(object)
+                if column['has_na']:
+                    values[np.load(os.path.join(entry_dir, column['file'][:-4] + '.na.npy'), mmap_mode='r')[start:stop]] = np.nan
+            data[column['name']] = values
+        return pd.DataFrame(data, index=pd.RangeIndex(start, start + len(next(iter(data.values()), []))))
+
+    def iter_chunks(self, file_path, columns, chunk_rows):
+        """DataFrames of ``columns`` covering the file ``chunk_rows`` rows at a time"""
+        n_rows = self.meta(file_path)['rows']
+        for start in range(0, n_rows, chunk_rows):
+            yield self.read(file_path, columns, start, min(start + chunk_rows, n_rows))
+
+    def _convert(self, file_path, key):
+        """Parse the CSV once and write its columns.
+
+        The CSV is read in chunks of PREPROCESS_CHUNK_ROWS (default 100000)
+        rows: a first pass settles each column's type and text width, a second
+        fills preallocated memory-mapped columns, so memory stays bounded by
+        one chunk. Files of a single chunk are parsed only once.
+        """
+        print(f"🗂️  Converting {os.path.basename(file_path)} to columnar cache ({key})...")
+        start = time.time()
+        chunk_rows = int(os.getenv('PREPROCESS_CHUNK_ROWS', '100000'))
+        read_chunks = lambda: pd.read_csv(file_path, comment='#', chunksize=chunk_rows, low_memory=False)
+
+        # Settle each column's kind and text width over the whole file
+        names, kinds, widths, has_na, n_rows, n_chunks = None, {}, {}, {}, 0, 0
+        for chunk in read_chunks():
+            # A file of a single chunk is written from memory instead of being parsed again
+            first_chunk = chunk if n_chunks == 0 else None
+            n_chunks += 1
+            names = names or list(chunk.columns)
+            n_rows += len(chunk)
+            for name in names:
+                values = chunk[name]
+                has_na[name] = has_na.get(name, False) or bool(values.isna().any())
+                if pd.api.types.is_numeric_dtype(values) and kinds.get(name, 'number') == 'number':
+                    kinds[name] = 'number'
+                    continue
+                # Numbers seen in earlier chunks become text of at most 32 characters
+                width = widths.get(name, 32 if kinds.get(name) == 'number' else 1)
+                text = values.dropna().astype(str)
+                widths[name] = max(width, int(text.str.len().max()) if len(text) else 1)
+                kinds[name] = 'text'
+        chunks = (lambda: [first_chunk]) if n_chunks == 1 else read_chunks
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.cache_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        try:
+            columns, arrays = [], {}
+            for i, name in enumerate(names):
+                file_name = f'{i:04d}.npy'
+                dtype = np.float64 if kinds[name] == 'number' else f'<U{widths[name]}'
+                arrays[name] = [np.lib.format.open_memmap(os.path.join(tmp_dir, file_name), mode='w+', dtype=dtype, shape=(n_rows,))]
+                if kinds[name] == 'text' and has_na[name]:
+                    arrays[name].append(np.lib.format.open_memmap(os.path.join(tmp_dir, f'{i:04d}.na.npy'), mode='w+', dtype=bool, shape=(n_rows,)))
+                columns.append({'name': name, 'file': file_name, 'kind': kinds[name], 'has_na': has_na[name]})
+
+            offset = 0
+            for chunk in chunks():
+                rows = slice(offset, offset + len(chunk))
+                for name in names:
+                    values = chunk[name]
+                    if kinds[name] == 'number':
+                        arrays[name][0][rows] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+                    else:
+                        arrays[name][0][rows] = values.fillna('').astype(str).to_numpy()
+                        if has_na[name]:
+                            arrays[name][1][rows] = values.isna().to_numpy()
+                offset += len(chunk)
+            for column_arrays in arrays.values():
+                for array in column_arrays:
+                    array.flush()
+            del arrays
+
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({
+                    'key': key,
+                    'source': os.path.basename(file_path),
+                    'created_at': time.time(),
+                    'rows': n_rows,
+                    'columns': columns
+                }, f)
+            # Publish the complete entry in one rename
+            os.rename(tmp_dir, self._entry_dir(key))
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            # Only losing the rename to another process that converted the same file is harmless
+            if not os.path.exists(os.path.join(self._entry_dir(key), 'meta.json')):
+                raise
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        print(f"✅ Columnar cache ready: {n_rows} rows, {len(names)} columns in {time.time() - start:.1f}s")
+        self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+            if not name.startswith('.') and name != keep and os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), name))
+        for _, name in sorted(entries)[:max(0, len(entries) + 1 - self.max_entries)]:
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+def catalog_columns(preprocessor, header):
+    """Feature and target columns a catalog preprocessor uses from a file with ``header``"""
+    # Resolve the target column on an empty frame with every column
+    with contextlib.redirect_stdout(io.StringIO()):
+        preprocessor.clean_data(pd.DataFrame(columns=header))
+    return [col for col in header if col in preprocessor.feature_columns or col == preprocessor.target_column]
+
+def load_catalog(preprocessor, file_path, store=None):
+    """The columns of an archive CSV that ``preprocessor`` needs, read from the columnar cache"""
+    store = store or ColumnarStore()
+    return store.read(file_path, catalog_columns(preprocessor, store.columns(file_path)))
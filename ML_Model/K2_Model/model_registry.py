@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import uuid
+import shutil
+
+class ModelRegistry:
+    """Versioned on-disk store of trained models for one catalog.
+
+    Every version lives in ``<root>/<catalog>/<version>/`` (root from
+    MODEL_REGISTRY_DIR, default ``models``) with its model files and a
+    ``metadata.json`` (dataset hash, parameters, metrics, training time,
+    size). The served version is named by the ``CURRENT`` pointer file,
+    which is replaced atomically, so activating or rolling back a version
+    never copies model files. The pointer also records the previously
+    current versions, most recent last, which ``rollback`` walks back. Beyond ``max_versions`` (MODEL_REGISTRY_MAX_VERSIONS,
+    default 20) the oldest versions that are not current are removed.
+    """
+
+    def __init__(self, catalog, root=None, max_versions=None):
+        self.catalog = catalog
+        self.catalog_dir = os.path.join(root or os.getenv('MODEL_REGISTRY_DIR', 'models'), catalog)
+        self.max_versions = max_versions or int(os.getenv('MODEL_REGISTRY_MAX_VERSIONS', '20'))
+
+    def _pointer_path(self):
+        return os.path.join(self.catalog_dir, 'CURRENT')
+
+    def _version_dir(self, version):
+        return os.path.join(self.catalog_dir, version)
+
+    def staging_dir(self):
+        """A new directory inside the registry to save model files into before ``commit``"""
+        path = os.path.join(self.catalog_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(path)
+        return path
+
+    def commit(self, staging_dir, metadata, activate=True):
+        """Turn a staging directory into a new version (made current when ``activate``) and return its name"""
+        version = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        files = sorted(name for name in os.listdir(staging_dir) if name != 'metadata.json')
+        metadata = {
+            **metadata,
+            'version': version,
+            'catalog': self.catalog,
+            'created_at': time.time(),
+            'files': files,
+            'size_bytes': sum(os.path.getsize(os.path.join(staging_dir, name)) for name in files)
+        }
+        with open(os.path.join(staging_dir, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        os.rename(staging_dir, self._version_dir(version))
+        print(f"📦 Registered {self.catalog} model version {version}")
+
+        if activate:
+            self.activate(version)
+        self._prune()
+        return version
+
+    def register(self, files, metadata, activate=True):
+        """Copy model files (``{name: path}``) into a new version and return its name"""
+        os.makedirs(self.catalog_dir, exist_ok=True)
+        staging_dir = self.staging_dir()
+        try:
+            for name, path in files.items():
+                shutil.copyfile(path, os.path.join(staging_dir, name))
+            return self.commit(staging_dir, metadata, activate=activate)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+    def _read_pointer(self):
+        try:
+            with open(self._pointer_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_pointer(self, version, history):
+        history = history[-self.max_versions:]
+        pointer = {'version': version, 'previous': history[-1] if history else None, 'history': history,
+                   'activated_at': time.time()}
+        tmp_path = f'{self._pointer_path()}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(pointer, f)
+        os.replace(tmp_path, self._pointer_path())
+        print(f"✅ {self.catalog} model version {version} is now current")
+        return version
+
+    def current(self):
+        """Name of the current version, or None"""
+        return self._read_pointer().get('version')
+
+    def history(self):
+        """Previously current versions, most recent last"""
+        pointer = self._read_pointer()
+        # Pointers written before the history was kept only know the previous version
+        return pointer.get('history', [pointer['previous']] if pointer.get('previous') else [])
+
+    def activate(self, version):
+        """Point ``CURRENT`` at an existing version; the version it replaces is pushed onto the history"""
+        if self.get(version) is None:
+            raise KeyError(f"Unknown {self.catalog} model version: {version}")
+        current, history = self.current(), self.history()
+        if current is not None and current != version:
+            history.append(current)
+        return self._write_pointer(version, history)
+
+    def rollback(self, version=None):
+        """Make ``version`` current again, by default the most recent previously current version.
+
+        Without ``version`` the history is popped, so repeated rollbacks keep
+        stepping back instead of toggling between two versions.
+        """
+        if version is not None:
+            return self.activate(version)
+        current, history = self.current(), self.history()
+        while history:
+            version = history.pop()
+            # Skip the serving version and versions removed since they were current
+            if version != current and self.get(version) is not None:
+                return self._write_pointer(version, history)
+        raise KeyError(f"No previous {self.catalog} model version to roll back to")
+
+    def get(self, version):
+        """Metadata of a version, or None"""
+        try:
+            with open(os.path.join(self._version_dir(version), 'metadata.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def find(self, **fields):
+        """Name of the newest version whose metadata has all of ``fields``, or None"""
+        for metadata in self.list_versions():
+            if all(metadata.get(name) == value for name, value in fields.items()):
+                return metadata['version']
+        return None
+
+    def files(self, version=None):
+        """``{name: path}`` of a version's model files (default: the current version), or None"""
+        version = version or self.current()
+        metadata = self.get(version) if version else None
+        if metadata is None:
+            return None
+        return {name: os.path.join(self._version_dir(version), name) for name in metadata['files']}
+
+    def list_versions(self):
+        """Metadata of every version, newest first, each flagged ``current``"""
+        if not os.path.isdir(self.catalog_dir):
+            return []
+        current = self.current()
+        versions = [self.get(name) for name in os.listdir(self.catalog_dir) if not name.startswith('.')]
+        versions = [metadata for metadata in versions if metadata is not None]
+        for metadata in versions:
+            metadata['current'] = metadata['version'] == current
+        return sorted(versions, key=lambda metadata: metadata['created_at'], reverse=True)
+
+    def _prune(self):
+        versions = self.list_versions()
+        for metadata in versions[self.max_versions:]:
+            if not metadata['current']:
+                shutil.rmtree(self._version_dir(metadata['version']), ignore_errors=True)
+                print(f"🗑️ Removed old {self.catalog} model version {metadata['version']}")
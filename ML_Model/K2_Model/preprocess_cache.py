@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import inspect
+import joblib
+import numpy as np
+from checkpoints import file_sha256
+from model_cache import code_version
+
+class PreprocessCache:
+    """Content-addressed cache of preprocessing results.
+
+    Entries are keyed by the SHA-256 of the input file, the preprocessing
+    configuration and the service's code version (every module next to the
+    preprocessor class, including the feature screening, streaming and
+    columnar helpers it delegates to), so editing the data, the settings or
+    the code all miss the cache. Each entry directory holds the fitted
+    preprocessor state (``state.pkl``), one ``.npy`` file per array and
+    ``meta.json``. The least recently used entries beyond ``max_entries``
+    are evicted.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=None):
+        self.cache_dir = cache_dir or os.getenv('PREPROCESS_CACHE_DIR', 'preprocess_cache')
+        self.max_entries = max_entries or int(os.getenv('PREPROCESS_CACHE_MAX_ENTRIES', '8'))
+
+    def key(self, file_path, preprocessor, config):
+        """Cache key for preprocessing ``file_path`` with ``preprocessor`` and ``config``"""
+        source_file = inspect.getsourcefile(type(preprocessor))
+        parts = {
+            'data': file_sha256(file_path),
+            'code': code_version(os.path.dirname(os.path.abspath(source_file))) if source_file else type(preprocessor).__name__,
+            'config': config
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """Return (state, arrays) for a cached entry, or None"""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            state = joblib.load(os.path.join(entry_dir, 'state.pkl'))
+            arrays = {name: np.load(os.path.join(entry_dir, f'{name}.npy')) for name in meta['arrays']}
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable preprocessing cache entry {key}: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        os.utime(meta_path)  # mark as recently used
+        print(f"⚡ Preprocessing cache hit ({key})")
+        return state, arrays
+
+    def store(self, key, state, arrays, meta=None):
+        """Store fitted preprocessor state and result arrays under ``key``"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.cache_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        try:
+            joblib.dump(state, os.path.join(tmp_dir, 'state.pkl'))
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), np.asarray(array))
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({
+                    'key': key,
+                    'created_at': time.time(),
+                    'arrays': {name: list(np.shape(array)) for name, array in arrays.items()},
+                    **(meta or {})
+                }, f, default=str)
+            # Publish the complete entry in one rename
+            os.rename(tmp_dir, self._entry_dir(key))
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+            if not name.startswith('.') and os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), name))
+        for _, name in sorted(entries)[:max(0, len(entries) - self.max_entries)]:
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
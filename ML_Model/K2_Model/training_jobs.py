@@ -0,0 +1,429 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import importlib
+import threading
+import signal
+import subprocess
+import traceback
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Seconds between resource checks of a running job process
+RESOURCE_POLL_SECONDS = 0.5
+
+# Process groups and wait4 are POSIX-only; elsewhere jobs are waited for and killed one process at a time
+PROCESS_GROUPS = hasattr(os, 'wait4') and hasattr(os, 'killpg')
+
+def training_limits():
+    """Resource limits of training job processes (0 or unset means unlimited).
+
+    TRAINING_MAX_RSS_MB caps the resident memory of the job and all its
+    worker processes, TRAINING_MAX_CPU_SECONDS their total CPU time and
+    TRAINING_TIMEOUT_SECONDS the wall-clock time of the job.
+    """
+    return {
+        'max_rss_mb': float(os.getenv('TRAINING_MAX_RSS_MB', '0') or 0),
+        'max_cpu_seconds': float(os.getenv('TRAINING_MAX_CPU_SECONDS', '0') or 0),
+        'timeout_seconds': float(os.getenv('TRAINING_TIMEOUT_SECONDS', '0') or 0)
+    }
+
+def training_jobs_max_kept():
+    """Finished jobs whose status and directory are kept (TRAINING_JOBS_MAX_KEPT, 0 keeps all)"""
+    return int(os.getenv('TRAINING_JOBS_MAX_KEPT', '50') or 0)
+
+def process_group_usage(pgid):
+    """``(rss_bytes, cpu_seconds)`` of the live processes in a process group, read from /proc.
+
+    CPU time includes the children each process has already reaped. Returns
+    None where /proc is unavailable or the group has no processes left.
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    page_size, ticks = os.sysconf('SC_PAGE_SIZE'), os.sysconf('SC_CLK_TCK')
+    rss, cpu, found = 0, 0.0, False
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Fields after the command name, starting with the state (field 3)
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) != pgid:
+            continue
+        found = True
+        rss += int(fields[21]) * page_size
+        cpu += sum(int(value) for value in fields[11:15]) / ticks
+    return (rss, cpu) if found else None
+
+def _kill_group(process):
+    """Kill a job process with all its workers (only the process itself without process groups)"""
+    try:
+        if PROCESS_GROUPS:
+            os.killpg(process.pid, signal.SIGKILL)
+        elif process.poll() is None:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _apply_rlimits(limits):
+    """Kernel-enforced backstop in the job process: a CPU-time limit inherited by its workers"""
+    seconds = int((limits or {}).get('max_cpu_seconds') or 0)
+    if seconds and resource is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 5))
+
+class JobEventLog:
+    """Append-only JSON-lines event log for one training job.
+
+    Instances are used as the training ``progress_callback`` inside the job
+    process and are picklable, so worker processes can append to the same log.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event, **details):
+        record = {'event': event, 'time': time.time(), **details}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def entries(self, offset=0):
+        """``(event, offset after its line)`` for complete lines written after ``offset``"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        entries = []
+        for line in data[:data.rfind(b'\n') + 1].splitlines(keepends=True):
+            offset += len(line)
+            if line.strip():
+                entries.append((json.loads(line), offset))
+        return entries
+
+    def read(self, offset=0):
+        """Return (events, new_offset) for complete lines written after ``offset``"""
+        if not os.path.exists(self.path):
+            return [], offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        events = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return events, offset + end
+
+class TrainingJobManager:
+    """FIFO queue of training jobs, each executed in its own Python process.
+
+    ``trainer`` is a ``'module:function'`` reference that is imported inside the
+    job process and called with the job parameters plus ``progress_callback``;
+    it must return a JSON-serializable summary. ``on_success`` runs in the
+    parent (e.g. to reload the freshly saved model) before a job is marked
+    succeeded. Job processes run in their own process group under ``limits``
+    (see training_limits); a job that exceeds one is killed with all its
+    workers and fails with a ``failure_reason``. Every finished job reports
+    its peak memory and CPU time in ``resources``. Only the latest
+    ``max_kept`` finished jobs (see training_jobs_max_kept) keep their status
+    and directory.
+    """
+
+    def __init__(self, trainer, jobs_dir=None, on_success=None, limits=None, max_kept=None):
+        self.trainer = trainer
+        self.jobs_dir = os.path.abspath(jobs_dir or os.getenv('TRAINING_JOBS_DIR', 'training_jobs'))
+        self.on_success = on_success
+        self.limits = limits or training_limits()
+        self.max_kept = training_jobs_max_kept() if max_kept is None else max_kept
+        self.jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def create_job(self):
+        """Reserve a job id and directory (e.g. to store the uploaded file)"""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        with self._lock:
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'state': 'created',
+                'created_at': time.time(),
+                'job_dir': job_dir
+            }
+        return job_id, job_dir
+
+    def submit(self, job_id, params, cleanup=()):
+        """Queue a created job; ``cleanup`` paths are removed once it finishes"""
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update({'state': 'queued', 'queued_at': time.time()})
+            spec = {'job_id': job_id, 'trainer': self.trainer, 'params': params, 'cleanup': list(cleanup),
+                    'limits': self.limits}
+        with open(os.path.join(job['job_dir'], 'job.json'), 'w') as f:
+            json.dump(spec, f)
+
+        self._ensure_worker()
+        self._queue.put(job_id)
+        return job_id
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, daemon=True)
+                self._worker.start()
+
+    def _run_worker(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                print(f"❌ Training job {job_id} crashed: {e}")
+                traceback.print_exc()
+                self._update(job_id, state='failed', error=str(e), failure_reason='error', finished_at=time.time())
+            self._prune_finished()
+
+    def _prune_finished(self):
+        """Forget the oldest finished jobs beyond ``max_kept`` and delete their directories"""
+        if not self.max_kept:
+            return
+        with self._lock:
+            finished = sorted((job for job in self.jobs.values() if job['state'] in ('succeeded', 'failed')),
+                              key=lambda job: job['finished_at'])
+            pruned = finished[:max(len(finished) - self.max_kept, 0)]
+            for job in pruned:
+                del self.jobs[job['job_id']]
+        for job in pruned:
+            shutil.rmtree(job['job_dir'], ignore_errors=True)
+
+    def _run_job(self, job_id):
+        job_dir = self.jobs[job_id]['job_dir']
+        self._update(job_id, state='running', started_at=time.time(), limits=self.limits)
+        print(f"🚀 Starting training job {job_id}")
+
+        with open(os.path.join(job_dir, 'output.log'), 'w') as output:
+            # A new session makes the job the leader of a process group holding all its workers
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), job_dir],
+                stdout=output,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+            self._update(job_id, pid=process.pid)
+            return_code, limit_reason, resources = self._supervise(job_id, process)
+
+        result = _read_json(os.path.join(job_dir, 'result.json'))
+        if return_code == 0 and result is not None:
+            if self.on_success:
+                self.on_success({**self.get(job_id), 'result': result})
+            self._update(job_id, state='succeeded', result=result, resources=resources, finished_at=time.time())
+            print(f"✅ Training job {job_id} succeeded (peak memory {resources['peak_rss_mb']} MB)")
+        else:
+            error = _read_json(os.path.join(job_dir, 'error.json')) or {}
+            if limit_reason is not None:
+                failure_reason, message = limit_reason
+            elif error:
+                failure_reason, message = 'error', error['error']
+            else:
+                failure_reason, message = 'exit_code', f'Training process exited with code {return_code}'
+            if limit_reason is not None or not error:
+                # The job process could not record its own failure
+                JobEventLog(os.path.join(job_dir, 'events.jsonl'))('job_failed', error=message,
+                                                                   failure_reason=failure_reason, **resources)
+            self._update(job_id, state='failed', error=message, failure_reason=failure_reason,
+                         resources=resources, finished_at=time.time())
+            print(f"❌ Training job {job_id} failed ({failure_reason}): {message}")
+
+    def _supervise(self, job_id, process):
+        """Wait for a job process, killing its process group when it exceeds a limit.
+
+        Returns ``(return_code, limit_reason, resources)`` where ``limit_reason``
+        is None or ``(failure_reason, message)``.
+        """
+        limits = self.limits
+        start = time.time()
+        peak_rss, cpu_seconds = 0, 0.0
+        limit_reason = None
+        rusage = None
+        while True:
+            if PROCESS_GROUPS:
+                pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+                if pid:
+                    process.returncode = os.waitstatus_to_exitcode(status)
+                    break
+            elif process.poll() is not None:
+                break
+            usage = process_group_usage(process.pid)
+            if usage is not None:
+                peak_rss, cpu_seconds = max(peak_rss, usage[0]), max(cpu_seconds, usage[1])
+            if limit_reason is None:
+                elapsed = time.time() - start
+                if limits['max_rss_mb'] and peak_rss > limits['max_rss_mb'] * 2 ** 20:
+                    limit_reason = ('memory_limit', f"Training exceeded the memory limit of {limits['max_rss_mb']:g} MB")
+                elif limits['max_cpu_seconds'] and cpu_seconds > limits['max_cpu_seconds']:
+                    limit_reason = ('cpu_time_limit', f"Training exceeded the CPU time limit of {limits['max_cpu_seconds']:g} s")
+                elif limits['timeout_seconds'] and elapsed > limits['timeout_seconds']:
+                    limit_reason = ('timeout', f"Training exceeded the time limit of {limits['timeout_seconds']:g} s")
+                if limit_reason is not None:
+                    print(f"⛔ Killing training job {job_id}: {limit_reason[1]}")
+                    _kill_group(process)
+            time.sleep(RESOURCE_POLL_SECONDS)
+
+        # Workers left behind by the job process go with it
+        _kill_group(process)
+
+        if rusage is not None:
+            # ru_maxrss is in kilobytes on Linux; it covers the job process and the workers it reaped
+            peak_rss = max(peak_rss, rusage.ru_maxrss * 1024)
+            cpu_seconds = max(cpu_seconds, rusage.ru_utime + rusage.ru_stime)
+        if limit_reason is None and process.returncode == -getattr(signal, 'SIGXCPU', 0):
+            limit_reason = ('cpu_time_limit', f"Training exceeded the CPU time limit of {limits['max_cpu_seconds']:g} s")
+        return process.returncode, limit_reason, {
+            'peak_rss_mb': round(peak_rss / 2 ** 20, 1),
+            'cpu_seconds': round(cpu_seconds, 2),
+            'wall_seconds': round(time.time() - start, 2)
+        }
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+
+    def events(self, job_id, offset=0):
+        """Events logged by the job process after ``offset``"""
+        return JobEventLog(os.path.join(self.jobs[job_id]['job_dir'], 'events.jsonl')).read(offset)
+
+    def stream_events(self, job_id, offset=0, poll_interval=0.5, heartbeat=15):
+        """Server-Sent Events of a job's progress events from log ``offset`` on, until the job finishes.
+
+        Each event's ``id`` is the log offset after it, so a reconnecting
+        client resumes where it stopped by sending ``Last-Event-ID``. The last
+        event is ``job_status`` with the final status; comment lines keep an
+        idle connection open. The stream also ends when the job is pruned
+        while it is being streamed.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            event_log = JobEventLog(os.path.join(job['job_dir'], 'events.jsonl'))
+        last_sent = time.time()
+        while True:
+            # Read the state first: once finished, every event is already in the log
+            with self._lock:
+                job = self.jobs.get(job_id)
+                finished = job is None or job['state'] in ('succeeded', 'failed')
+            for event, offset in event_log.entries(offset):
+                yield f"id: {offset}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+                last_sent = time.time()
+            if finished:
+                status = self.get(job_id)
+                if status is not None:
+                    yield f"event: job_status\ndata: {json.dumps(status, default=str)}\n\n"
+                return
+            if time.time() - last_sent > heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            time.sleep(poll_interval)
+
+    def wait(self, job_id, timeout=None, poll_interval=0.2):
+        """Block until a job has finished (or ``timeout`` seconds passed) and return its status, None once pruned"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None or job['state'] in ('succeeded', 'failed'):
+                    break
+            if deadline is not None and time.time() > deadline:
+                break
+            time.sleep(poll_interval)
+        return self.get(job_id)
+
+    def artifact_path(self, job_id, name):
+        """Path of a file a job wrote to its directory, or None when the job or file does not exist"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        path = os.path.join(job['job_dir'], name)
+        return path if os.path.exists(path) else None
+
+    def get(self, job_id):
+        """Job status with per-stage progress, or None for unknown jobs"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = {k: v for k, v in job.items() if k not in ('job_dir', 'pid')}
+            event_log = JobEventLog(os.path.join(job['job_dir'], 'events.jsonl'))
+
+        # A job pruned meanwhile has no log left and reports no stages
+        events, _ = event_log.read()
+        stages = {}
+        total_steps = 0
+        for event in events:
+            if event['event'] == 'stage_started':
+                stages[event['stage']] = {'status': 'running', 'started_at': event['time']}
+                total_steps = event.get('total_steps') or total_steps
+            elif event['event'] == 'stage_completed' and event['stage'] in stages:
+                stages[event['stage']].update(status='completed', elapsed=event.get('elapsed'))
+
+        completed = sum(1 for stage in stages.values() if stage['status'] == 'completed')
+        running = [name for name, stage in stages.items() if stage['status'] == 'running']
+        status['stages'] = [{'stage': name, **stage} for name, stage in stages.items()]
+        status['stage'] = running[-1] if running else None
+        if status['state'] == 'succeeded':
+            status['progress'] = 1.0
+        else:
+            status['progress'] = round(completed / total_steps, 3) if total_steps else 0.0
+        return status
+
+    def list_jobs(self):
+        with self._lock:
+            job_ids = list(self.jobs)
+        return [self.get(job_id) for job_id in job_ids]
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def run_job_process(job_dir):
+    """Entry point of the job process: run the trainer and record its summary"""
+    with open(os.path.join(job_dir, 'job.json')) as f:
+        spec = json.load(f)
+
+    event_log = JobEventLog(os.path.join(job_dir, 'events.jsonl'))
+    module_name, function_name = spec['trainer'].split(':')
+    try:
+        _apply_rlimits(spec.get('limits'))
+        trainer = getattr(importlib.import_module(module_name), function_name)
+        result = trainer(**spec['params'], progress_callback=event_log)
+        with open(os.path.join(job_dir, 'result.json'), 'w') as f:
+            json.dump(result, f, default=str)
+        event_log('job_succeeded')
+        return 0
+    except Exception as e:
+        traceback.print_exc()
+        with open(os.path.join(job_dir, 'error.json'), 'w') as f:
+            json.dump({'error': str(e)}, f)
+        event_log('job_failed', error=str(e))
+        return 1
+    finally:
+        for path in spec.get('cleanup', []):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+if __name__ == '__main__':
+    sys.exit(run_job_process(sys.argv[1]))
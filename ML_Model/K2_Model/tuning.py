@@ -0,0 +1,227 @@
+import os
+import copy
+import json
+import math
+import time
+import uuid
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold, ParameterSampler
+from sklearn.preprocessing import LabelEncoder
+from ensemble import training_core_budget, assemble_voting_classifier, balanced_sample_weight
+from executors import executor_scope, resolve
+from quantized import QuantizedFeatures, fit_booster, uses_hist
+
+# Written by the tune mode of train_model.py and picked up by create_advanced_model
+TUNED_PARAMS_FILE = 'tuned_params.json'
+
+DEFAULT_ENSEMBLE_PARAMS = {
+    'xgb': {
+        'n_estimators': 500,
+        'learning_rate': 0.1,
+        'max_depth': 8,
+        'subsample': 0.8,
+        'colsample_bytree': 0.8,
+        'reg_alpha': 0.1,
+        'reg_lambda': 0.1,
+        'eval_metric': 'mlogloss',
+        'tree_method': 'hist',
+        'random_state': 42
+    },
+    'rf': {
+        'n_estimators': 300,
+        'max_depth': 10,
+        'min_samples_split': 5,
+        'min_samples_leaf': 2,
+        'random_state': 42
+    },
+    'lr': {
+        'C': 1.0,
+        'max_iter': 1000,
+        'random_state': 42
+    },
+    # Give more weight to XGBoost
+    'weights': [3, 2, 1]
+}
+
+# Candidate values, as 'member__parameter' (or 'weights') -> choices
+SEARCH_SPACE = {
+    'xgb__n_estimators': [200, 350, 500],
+    'xgb__learning_rate': [0.03, 0.05, 0.1, 0.2],
+    'xgb__max_depth': [4, 6, 8, 10],
+    'xgb__subsample': [0.7, 0.8, 1.0],
+    'xgb__colsample_bytree': [0.6, 0.8, 1.0],
+    'rf__n_estimators': [150, 300, 500],
+    'rf__max_depth': [8, 10, 14, None],
+    'rf__min_samples_leaf': [1, 2, 4],
+    'lr__C': [0.1, 0.3, 1.0, 3.0],
+    'weights': [[3, 2, 1], [2, 2, 1], [1, 1, 1], [4, 2, 1], [3, 1, 1]]
+}
+
+def ensemble_params_from_candidate(candidate, base=None):
+    """Merge a flat 'member__parameter' candidate into nested ensemble parameters"""
+    params = copy.deepcopy(base or DEFAULT_ENSEMBLE_PARAMS)
+    for key, value in candidate.items():
+        if key == 'weights':
+            params['weights'] = list(value)
+        else:
+            member, name = key.split('__', 1)
+            params[member][name] = value
+    return params
+
+def load_ensemble_params(path=TUNED_PARAMS_FILE):
+    """Default ensemble parameters, overridden by a tuned configuration when one exists"""
+    params = copy.deepcopy(DEFAULT_ENSEMBLE_PARAMS)
+    if os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)['params']
+        for member, member_params in tuned.items():
+            if member == 'weights':
+                params['weights'] = member_params
+            else:
+                params.setdefault(member, {}).update(member_params)
+    return params
+
+def save_tuned_params(params, search_report=None, path=TUNED_PARAMS_FILE):
+    """Write the winning configuration so later training runs use it by default"""
+    with open(path, 'w') as f:
+        json.dump({'params': params, 'search': search_report}, f, indent=2, default=str)
+    print(f"✅ Tuned parameters saved to {path}")
+
+# Quantized fold data of the running search, kept per worker process across candidates
+_QUANTIZED_FOLDS = {}
+
+def _quantized_fold(fold_key, X_train):
+    search_id = fold_key[0]
+    for key in [key for key in _QUANTIZED_FOLDS if key[0] != search_id]:
+        del _QUANTIZED_FOLDS[key]
+    if fold_key not in _QUANTIZED_FOLDS:
+        _QUANTIZED_FOLDS[fold_key] = QuantizedFeatures(X_train)
+    return _QUANTIZED_FOLDS[fold_key]
+
+def _score_candidate(model, fold, n_rows, fold_key, balance_classes=False):
+    """Fit one candidate on the first ``n_rows`` training rows of a fold and score it.
+
+    Histogram XGBoost members train on the fold's quantized matrix, which is
+    built once per worker and reused by every candidate and rung. With
+    ``balance_classes`` every member is fitted with balanced sample weights.
+    """
+    X_train, y_train, X_val, y_val = (resolve(array) for array in fold)
+    label_encoder = LabelEncoder().fit(y_train[:n_rows])
+    y_encoded = label_encoder.transform(y_train[:n_rows])
+    sample_weight = balanced_sample_weight(y_encoded) if balance_classes else None
+
+    fitted = {}
+    for name, est in model.estimators:
+        if est == 'drop':
+            continue
+        if 'n_jobs' in est.get_params():
+            est.set_params(n_jobs=1)
+        if uses_hist(est):
+            quantized = _quantized_fold(fold_key, X_train)
+            dtrain = quantized.matrix(slice(0, n_rows), label=y_encoded, weight=sample_weight, key=n_rows)
+            fitted[name] = fit_booster(est, dtrain, len(label_encoder.classes_))
+        else:
+            fitted[name] = est.fit(X_train[:n_rows], y_encoded, sample_weight=sample_weight)
+
+    assemble_voting_classifier(model, fitted, label_encoder)
+    return accuracy_score(y_val, model.predict(X_val))
+
+def successive_halving_search(build_model, X, y, resample=None, balance_classes=False, n_candidates=27, factor=3,
+                              n_folds=3, min_rows=200, time_budget=None, n_jobs=None, random_state=42, executor=None):
+    """Successive-halving search over SEARCH_SPACE within a wall-clock budget.
+
+    ``build_model(params)`` returns an unfitted estimator for nested ensemble
+    parameters. The folds are split and (optionally) ``resample``-d once, and
+    every rung reuses them: candidates start on a small share of each fold's
+    training rows and the best ``1/factor`` advance to ``factor`` times more
+    rows. With ``balance_classes`` candidates are fitted with balanced sample
+    weights instead of resampled folds. Candidate fits run on the workers of
+    ``executor`` (by default the TRAINING_EXECUTOR backend), which receive
+    each fold's data once through shared storage; when ``time_budget`` seconds are used up the search stops and
+    returns the best configuration of the last rung with complete scores
+    (``None`` if there is none).
+    """
+    start = time.time()
+    deadline = start + time_budget if time_budget else None
+    n_jobs = n_jobs or training_core_budget()
+    search_id = uuid.uuid4().hex
+
+    # Preprocessed folds, shuffled once so that any prefix is a random subsample
+    rng = np.random.RandomState(random_state)
+    folds = []
+    for train_idx, val_idx in StratifiedKFold(n_folds, shuffle=True, random_state=random_state).split(X, y):
+        X_train, y_train = X[train_idx], y[train_idx]
+        if resample is not None:
+            X_train, y_train = resample(X_train, y_train)
+        order = rng.permutation(len(X_train))
+        folds.append((X_train[order], y_train[order], X[val_idx], y[val_idx]))
+    n_train = min(len(fold[0]) for fold in folds)
+
+    sampled = list(ParameterSampler(SEARCH_SPACE, n_iter=n_candidates, random_state=random_state))
+    candidates = [ensemble_params_from_candidate(candidate) for candidate in sampled]
+    n_rungs = max(1, int(math.floor(math.log(len(candidates), factor))) + 1)
+
+    alive = list(range(len(candidates)))
+    rungs = []
+    best_index, best_score = 0, None
+    timed_out = False
+
+    with executor_scope(executor, n_jobs) as executor:
+        # Every candidate and rung refers to the same shipped folds
+        folds = [tuple(executor.share(array) for array in fold) for fold in folds]
+        n_workers = executor.n_workers
+        for rung in range(n_rungs):
+            fraction = factor ** (rung - n_rungs + 1)
+            n_rows = min(n_train, max(int(n_train * fraction), min_rows))
+            tasks = [(index, fold_index) for index in alive for fold_index in range(n_folds)]
+            fold_scores = {index: [] for index in alive}
+
+            # Dispatch in small batches so the budget is checked while a rung runs
+            for batch_start in range(0, len(tasks), n_workers * 2):
+                if deadline and time.time() > deadline:
+                    timed_out = True
+                    break
+                batch = tasks[batch_start:batch_start + n_workers * 2]
+                scores = executor.starmap(_score_candidate, [
+                    (clone(build_model(candidates[index])), folds[fold_index], n_rows, (search_id, fold_index),
+                     balance_classes)
+                    for index, fold_index in batch
+                ])
+                for (index, _), score in zip(batch, scores):
+                    fold_scores[index].append(score)
+
+            complete = {index: float(np.mean(s)) for index, s in fold_scores.items() if len(s) == n_folds}
+            if not complete:
+                break
+
+            ranked = sorted(complete, key=complete.get, reverse=True)
+            best_index, best_score = ranked[0], complete[ranked[0]]
+            rungs.append({
+                'rung': rung,
+                'train_rows': n_rows,
+                'candidates': len(complete),
+                'best_score': round(best_score, 4),
+                'elapsed': round(time.time() - start, 2)
+            })
+            print(f"   Rung {rung}: {len(complete)} candidates on {n_rows} rows, best accuracy {best_score:.4f}")
+
+            if timed_out:
+                break
+            alive = ranked[:max(1, int(math.ceil(len(ranked) / factor)))]
+
+    _QUANTIZED_FOLDS.clear()
+
+    report = {
+        'best_score': best_score,
+        'best_candidate': sampled[best_index] if best_score is not None else None,
+        'rungs': rungs,
+        'candidates': len(candidates),
+        'timed_out': timed_out,
+        'elapsed': round(time.time() - start, 2)
+    }
+    if best_score is None:
+        # The budget ran out before any candidate was fully scored
+        return None, report
+    return candidates[best_index], report
@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+import numpy as np
+
+# Synthetic predictions per warm-up (0 disables warm-up) and how many of them render charts
+WARMUP_REQUESTS = int(os.getenv('WARMUP_REQUESTS', '20'))
+WARMUP_CHART_REQUESTS = int(os.getenv('WARMUP_CHART_REQUESTS', '3'))
+
+# WSGI environ key set on warm-up requests; it cannot be sent by an HTTP client
+WARMUP_ENVIRON_KEY = 'service.warmup'
+
+def is_warmup_request(request):
+    """Whether a Flask request was sent by a ServiceWarmup (e.g. to keep it out of usage stats)"""
+    return bool(request.environ.get(WARMUP_ENVIRON_KEY))
+
+class ServiceWarmup:
+    """Warm-up sequence and liveness/readiness state of a prediction service.
+
+    A warm-up sends synthetic samples (``sample_source(n)``, drawn from the
+    training distribution) through the service's own ``/predict`` route in a
+    background thread: single predictions that render charts, one batch,
+    then timed one-row predictions that give the post-warm-up baseline
+    latency. The service is live as soon as it answers; it becomes ready
+    when its first warm-up has finished (or was skipped because there is no
+    model yet). Later warm-ups, e.g. after a model reload, do not drop
+    readiness.
+    """
+
+    def __init__(self, app, sample_source, requests=None, chart_requests=None):
+        self.app = app
+        self.sample_source = sample_source
+        self.requests = WARMUP_REQUESTS if requests is None else requests
+        self.chart_requests = WARMUP_CHART_REQUESTS if chart_requests is None else chart_requests
+        self.ready = False
+        self._state = {'status': 'pending'}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+    def start(self, label=None, headers=None, sample_source=None):
+        """Run a warm-up in a background thread; ``label`` (e.g. the model version) is reported with its state"""
+        thread = threading.Thread(target=self.run, args=(label, headers, sample_source), daemon=True,
+                                  name='service-warmup')
+        thread.start()
+        return thread
+
+    def _set_state(self, **state):
+        with self._lock:
+            self._state = state
+
+    def _post(self, client, payload, headers):
+        response = client.post('/predict', json=payload, headers=headers or {},
+                               environ_overrides={WARMUP_ENVIRON_KEY: True})
+        if response.status_code != 200:
+            raise RuntimeError(f"warm-up prediction returned {response.status_code}: {response.get_json()}")
+        return response
+
+    def run(self, label=None, headers=None, sample_source=None):
+        """Run the warm-up sequence now (``sample_source`` overrides the default one) and return its status"""
+        with self._run_lock:
+            sample_source = sample_source or self.sample_source
+            samples = sample_source(self.requests) if self.requests > 0 else None
+            if not samples:
+                self._set_state(status='disabled' if self.requests <= 0 else 'skipped', label=label,
+                                finished_at=time.time())
+                self.ready = True
+                return self.status()
+
+            self._set_state(status='running', label=label, started_at=time.time())
+            print(f"🔥 Warming up{f' {label}' if label else ''} with {len(samples)} synthetic predictions...")
+            client = self.app.test_client()
+            start = time.perf_counter()
+            try:
+                # Single predictions render charts; the batch runs the vectorized path
+                for sample in samples[:self.chart_requests]:
+                    self._post(client, sample, headers)
+                self._post(client, samples, headers)
+                duration = time.perf_counter() - start
+
+                latencies = []
+                for sample in samples:
+                    request_start = time.perf_counter()
+                    self._post(client, [sample], headers)
+                    latencies.append((time.perf_counter() - request_start) * 1000)
+            except Exception as e:
+                print(f"❌ Warm-up failed: {e}")
+                self._set_state(status='failed', label=label, error=str(e),
+                                duration_seconds=round(time.perf_counter() - start, 3), finished_at=time.time())
+                self.ready = True
+                return self.status()
+
+            self._set_state(
+                status='succeeded',
+                label=label,
+                requests=len(samples),
+                duration_seconds=round(duration, 3),
+                baseline_latency_ms={
+                    'p50': round(float(np.percentile(latencies, 50)), 2),
+                    'p95': round(float(np.percentile(latencies, 95)), 2),
+                    'mean': round(float(np.mean(latencies)), 2)
+                },
+                finished_at=time.time()
+            )
+            self.ready = True
+            print(f"✅ Warm-up finished in {duration:.2f}s, baseline latency {np.percentile(latencies, 50):.1f}ms")
+            return self.status()
+
+    def status(self):
+        """Readiness plus the state of the latest warm-up"""
+        with self._lock:
+            return {'live': True, 'ready': self.ready, 'warmup': dict(self._state)}
@@ -0,0 +1,185 @@
+import numpy as np
+from scipy import sparse
+
+class EnsembleAttributor:
+    """Per-sample feature contributions for a soft-voting XGBoost/RandomForest/LogisticRegression ensemble.
+
+    Tree members are attributed along each sample's decision path (XGBoost can
+    optionally use its exact TreeSHAP), the linear member gets exact
+    ``coef * (x - background_mean)`` terms, and margin-space contributions are
+    rescaled to probability space before being combined with the voting weights.
+    For every sample ``base_values + contributions.sum(axis=1)`` equals the
+    ensemble's ``predict_proba``.
+
+    Everything that depends only on the fitted model (tree path deltas, member
+    reference probabilities, the background mean) is computed once in ``fit``,
+    so ``explain`` costs one extra pass over each member.
+    """
+
+    def __init__(self, exact_xgb_shap=False):
+        self.exact_xgb_shap = exact_xgb_shap
+        self.members = []
+        self.weights = None
+        self.base_values = None
+        self.n_features = None
+        self.n_classes = None
+
+    def fit(self, model, X_background):
+        """Precompute background expectations for a fitted VotingClassifier"""
+        X_background = np.asarray(X_background, dtype=np.float64)
+        self.n_features = X_background.shape[1]
+        self.n_classes = len(model.classes_)
+        background_mean = X_background.mean(axis=0)
+
+        names = [name for name, est in model.estimators if est != 'drop']
+        weights = np.ones(len(names)) if model.weights is None else np.asarray(
+            [w for (name, est), w in zip(model.estimators, model.weights) if est != 'drop'], dtype=np.float64
+        )
+        self.weights = weights / weights.sum()
+
+        self.members = []
+        for name, estimator in zip(names, model.estimators_):
+            if hasattr(estimator, 'get_booster'):
+                member = self._fit_xgboost(estimator)
+            elif hasattr(estimator, 'estimators_') and hasattr(estimator.estimators_[0], 'tree_'):
+                member = self._fit_forest(estimator)
+            elif hasattr(estimator, 'coef_'):
+                member = self._fit_linear(estimator, background_mean)
+            else:
+                raise ValueError(f"Unsupported ensemble member for attribution: {name}")
+            member['name'] = name
+            self.members.append(member)
+
+        self.base_values = sum(w * m['reference_proba'] for w, m in zip(self.weights, self.members))
+        return self
+
+    def _fit_xgboost(self, estimator):
+        contribs = self._xgboost_margin_contribs(estimator, np.zeros((1, self.n_features)))
+        reference_margin = contribs[0, :, -1]
+        return {
+            'kind': 'xgboost',
+            'estimator': estimator,
+            'reference_margin': reference_margin,
+            'reference_proba': _softmax(reference_margin[None, :])[0]
+        }
+
+    def _fit_forest(self, estimator):
+        # For each node: the change in class distribution relative to its parent,
+        # credited to the feature the parent split on
+        deltas, features, root_values = [], [], []
+        for tree in estimator.estimators_:
+            t = tree.tree_
+            values = t.value[:, 0, :]
+            values = values / values.sum(axis=1, keepdims=True)
+            parents = np.zeros(t.node_count, dtype=np.intp)
+            internal = np.flatnonzero(t.children_left >= 0)
+            parents[t.children_left[internal]] = internal
+            parents[t.children_right[internal]] = internal
+
+            delta = values - values[parents]
+            delta[0] = 0.0
+            split_feature = t.feature[parents].astype(np.int32)
+            split_feature[0] = 0
+            deltas.append(delta.astype(np.float32))
+            features.append(split_feature)
+            root_values.append(values[0])
+
+        return {
+            'kind': 'forest',
+            'estimator': estimator,
+            'node_deltas': np.vstack(deltas),
+            'node_features': np.concatenate(features),
+            'n_trees': len(estimator.estimators_),
+            'reference_proba': np.mean(root_values, axis=0)
+        }
+
+    def _fit_linear(self, estimator, background_mean):
+        coef = np.asarray(estimator.coef_, dtype=np.float64)
+        intercept = np.asarray(estimator.intercept_, dtype=np.float64)
+        if coef.shape[0] == 1:
+            # Binary model: express as two-class logits [0, z]
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercept = np.concatenate([[0.0], intercept])
+        reference_margin = coef @ background_mean + intercept
+        return {
+            'kind': 'linear',
+            'coef': coef,
+            'background_mean': background_mean,
+            'reference_margin': reference_margin,
+            'reference_proba': _softmax(reference_margin[None, :])[0]
+        }
+
+    def _xgboost_margin_contribs(self, estimator, X):
+        """Margin contributions with shape (n_samples, n_classes, n_features + 1)"""
+        import xgboost
+
+        booster = estimator.get_booster()
+        best_iteration = getattr(estimator, 'best_iteration', None)
+        iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+        contribs = booster.predict(
+            xgboost.DMatrix(X),
+            pred_contribs=True,
+            approx_contribs=not self.exact_xgb_shap,
+            iteration_range=iteration_range
+        )
+        if contribs.ndim == 2:
+            # Binary model: express as two-class logits [0, z]
+            contribs = np.stack([np.zeros_like(contribs), contribs], axis=1)
+        return contribs
+
+    def _forest_path_matrix(self, member):
+        """Sparse (n_nodes x n_features*n_classes) matrix, built lazily and not pickled"""
+        if member.get('path_matrix') is None:
+            n_nodes = len(member['node_features'])
+            rows = np.repeat(np.arange(n_nodes), self.n_classes)
+            cols = (member['node_features'][:, None] * self.n_classes + np.arange(self.n_classes)).ravel()
+            member['path_matrix'] = sparse.csr_matrix(
+                (member['node_deltas'].ravel().astype(np.float64), (rows, cols)),
+                shape=(n_nodes, self.n_features * self.n_classes)
+            )
+        return member['path_matrix']
+
+    def _member_contributions(self, member, X):
+        """Probability-space contributions (n_samples, n_features, n_classes) for one member"""
+        if member['kind'] == 'forest':
+            indicator, _ = member['estimator'].decision_path(X)
+            flat = (indicator @ self._forest_path_matrix(member)).toarray() / member['n_trees']
+            return flat.reshape(len(X), self.n_features, self.n_classes)
+
+        if member['kind'] == 'xgboost':
+            margin_contribs = self._xgboost_margin_contribs(member['estimator'], X)
+            margin_contribs = np.transpose(margin_contribs[:, :, :-1], (0, 2, 1))
+        else:
+            margin_contribs = (X - member['background_mean'])[:, :, None] * member['coef'].T[None, :, :]
+
+        # Rescale margin contributions so that they sum to the probability change
+        margin_change = margin_contribs.sum(axis=1)
+        proba = _softmax(member['reference_margin'] + margin_change)
+        proba_change = proba - member['reference_proba']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(np.abs(margin_change) > 1e-12, proba_change / margin_change, 0.0)
+        return margin_contribs * scale[:, None, :]
+
+    def explain(self, X):
+        """Return (contributions, base_values) for a batch of preprocessed samples.
+
+        ``contributions`` has shape (n_samples, n_features, n_classes) and
+        ``base_values`` shape (n_classes,).
+        """
+        if not self.members:
+            raise ValueError("EnsembleAttributor not fitted")
+        X = np.asarray(X, dtype=np.float64)
+        contributions = np.zeros((len(X), self.n_features, self.n_classes))
+        for weight, member in zip(self.weights, self.members):
+            contributions += weight * self._member_contributions(member, X)
+        return contributions, self.base_values
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['members'] = [{k: v for k, v in m.items() if k != 'path_matrix'} for m in self.members]
+        return state
+
+def _softmax(margins):
+    shifted = margins - margins.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
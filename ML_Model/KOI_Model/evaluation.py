@@ -0,0 +1,75 @@
+import os
+import numpy as np
+
+# Equal-width confidence bins of the calibration summary
+CALIBRATION_BINS = 10
+
+def _ratio(numerator, denominator):
+    """Elementwise ``numerator / denominator``, 0 where the denominator is 0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=np.asarray(denominator) > 0)
+
+def summarize_predictions(y_true, probabilities, classes, n_bins=CALIBRATION_BINS):
+    """Compact evaluation of one ``predict_proba`` matrix, computed in a single vectorized pass.
+
+    Predictions are the most probable class (what soft voting predicts).
+    Returns the accuracy, a ``classification_report``-shaped dict (per-class
+    precision/recall/F1/support plus macro and weighted averages), the
+    confusion matrix and calibration bins of the top-class confidence with
+    the expected calibration error.
+    """
+    probabilities = np.asarray(probabilities)
+    classes = np.asarray(classes)
+    n_rows, n_classes = probabilities.shape
+    true_index = np.searchsorted(classes, np.asarray(y_true))
+    pred_index = probabilities.argmax(axis=1)
+
+    confusion = np.bincount(true_index * n_classes + pred_index, minlength=n_classes ** 2).reshape(n_classes, n_classes)
+    hits = np.diag(confusion)
+    support = confusion.sum(axis=1)
+    precision = _ratio(hits, confusion.sum(axis=0))
+    recall = _ratio(hits, support)
+    f1 = _ratio(2 * precision * recall, precision + recall)
+    accuracy = hits.sum() / n_rows if n_rows else 0.0
+
+    report = {
+        str(label): {'precision': float(p), 'recall': float(r), 'f1-score': float(f), 'support': int(s)}
+        for label, p, r, f, s in zip(classes, precision, recall, f1, support)
+    }
+    report['accuracy'] = float(accuracy)
+    weights = support / max(n_rows, 1)
+    report['macro avg'] = {'precision': float(precision.mean()), 'recall': float(recall.mean()),
+                           'f1-score': float(f1.mean()), 'support': int(n_rows)}
+    report['weighted avg'] = {'precision': float(precision @ weights), 'recall': float(recall @ weights),
+                              'f1-score': float(f1 @ weights), 'support': int(n_rows)}
+
+    confidence = probabilities[np.arange(n_rows), pred_index]
+    correct = (pred_index == true_index).astype(np.float64)
+    bin_index = np.minimum((confidence * n_bins).astype(int), n_bins - 1)
+    counts = np.bincount(bin_index, minlength=n_bins)
+    mean_confidence = _ratio(np.bincount(bin_index, weights=confidence, minlength=n_bins), counts)
+    bin_accuracy = _ratio(np.bincount(bin_index, weights=correct, minlength=n_bins), counts)
+    edges = np.linspace(0, 1, n_bins + 1)
+
+    return {
+        'accuracy': float(accuracy),
+        'classification_report': report,
+        'confusion_matrix': confusion.tolist(),
+        'calibration': {
+            'bins': [
+                {'lower': float(edges[i]), 'upper': float(edges[i + 1]), 'count': int(counts[i]),
+                 'mean_confidence': float(mean_confidence[i]), 'accuracy': float(bin_accuracy[i])}
+                for i in range(n_bins) if counts[i]
+            ],
+            'expected_calibration_error': float(np.abs(bin_accuracy - mean_confidence) @ counts / max(n_rows, 1))
+        }
+    }
+
+def save_predictions(path, y_true, probabilities, classes):
+    """Write per-row outputs (true label, prediction, class probabilities) to a compressed .npz file"""
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    classes = np.asarray(classes)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(path, y_true=np.asarray(y_true), y_pred=classes[probabilities.argmax(axis=1)],
+                        probabilities=probabilities, classes=classes)
+    return path
@@ -0,0 +1,97 @@
+import os
+import json
+import glob
+import time
+import uuid
+import shutil
+import hashlib
+
+def code_version(directory=None):
+    """Hash of the service's Python sources; any code change invalidates cached models"""
+    directory = directory or os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+class ModelCache:
+    """Size-bounded on-disk cache of trained models and their evaluation summaries.
+
+    Entries are keyed on the dataset content hash, target column, model type,
+    training parameters and code version, and hold copies of the saved model
+    files plus a JSON summary. When the cache grows beyond ``max_bytes`` the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.getenv('MODEL_CACHE_DIR', 'model_cache')
+        self.max_bytes = max_bytes or int(float(os.getenv('MODEL_CACHE_MAX_MB', '512')) * 1024 * 1024)
+
+    @staticmethod
+    def make_key(data_hash, target_column, model_type, params, version=None):
+        """Cache key for one training configuration"""
+        parts = {
+            'data': data_hash,
+            'target_column': target_column,
+            'model_type': model_type,
+            'params': params,
+            'code_version': version or code_version()
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Return ``{'summary', 'files'}`` for a cached entry (file paths inside the cache), or None"""
+        entry_path = os.path.join(self._entry_dir(key), 'entry.json')
+        if not os.path.exists(entry_path):
+            return None
+        with open(entry_path) as f:
+            entry = json.load(f)
+        files = {name: os.path.join(self._entry_dir(key), name) for name in entry['files']}
+        if not all(os.path.exists(path) for path in files.values()):
+            return None
+
+        os.utime(entry_path)  # mark as recently used
+        print(f"⚡ Model cache hit ({key})")
+        return {'summary': entry['summary'], 'files': files}
+
+    def store(self, key, summary, files):
+        """Copy model files (``{name: path}``) and a JSON-serializable summary into the cache"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.cache_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        try:
+            for name, path in files.items():
+                shutil.copyfile(path, os.path.join(tmp_dir, name))
+            with open(os.path.join(tmp_dir, 'entry.json'), 'w') as f:
+                json.dump({'key': key, 'created_at': time.time(), 'files': list(files), 'summary': summary},
+                          f, default=str)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            os.rename(tmp_dir, self._entry_dir(key))
+            print(f"💾 Model cached ({key})")
+        except OSError as e:
+            print(f"⚠️  Could not cache model: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            entry_path = os.path.join(entry_dir, 'entry.json')
+            if name.startswith('.') or not os.path.exists(entry_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_path), size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            print(f"🗑️ Evicted cached model {os.path.basename(entry_dir)}")
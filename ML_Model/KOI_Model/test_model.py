@@ -74,6 +74,12 @@ def test_koi_api():
                 print(f"   - Confidence: {pred.get('confidence', 'N/A'):.4f}")
                 print(f"   - Explanation: {pred.get('explanation', 'N/A')}")
                 
+                # Show the strongest feature contributions
+                print("   - Top feature contributions:")
+                contributions = pred.get('feature_contributions') or {}
+                for feature, value in sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:3]:
+                    print(f"     {feature}: {value:+.4f}")
+                
                 # Show probabilities
                 print("   - Probabilities:")
                 probs = pred.get('probabilities', {})
@@ -1,9 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 import joblib
 import os
+import hashlib
 import base64
 import io
 import matplotlib
@@ -11,8 +12,16 @@ matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import seaborn as sns
 from preprocess import TOIDataPreprocessor
+from insight_rules import InsightRuleEngine
+from train_model import TOIModel, training_cache_key, MODEL_CATALOG
+from model_cache import ModelCache
+from model_registry import ModelRegistry
+from training_jobs import TrainingJobManager
+from warmup import ServiceWarmup
+import threading
 import traceback
 from dotenv import load_dotenv
+from werkzeug.utils import secure_filename
 
 # Load environment variables
 load_dotenv()
@@ -24,189 +33,143 @@ CORS(app)
 model = None
 preprocessor = None
 label_encoder = None
+model_version = None
+# Serializes model reloads so concurrent requests load and warm up a new version once
+model_reload_lock = threading.Lock()
 
-class TOIModel:
-    def __init__(self):
-        self.model = None
-        self.is_trained = False
-        
-    def create_advanced_model(self):
-        """Create an advanced ensemble model"""
-        from xgboost import XGBClassifier
-        from sklearn.ensemble import RandomForestClassifier, VotingClassifier
-        from sklearn.linear_model import LogisticRegression
-        
-        # Create multiple models for ensemble
-        xgb = XGBClassifier(
-            n_estimators=500,
-            learning_rate=0.1,
-            max_depth=8,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            reg_alpha=0.1,
-            reg_lambda=0.1,
-            eval_metric='mlogloss',
-            random_state=42
-        )
-        
-        rf = RandomForestClassifier(
-            n_estimators=300,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
-        
-        lr = LogisticRegression(
-            C=1.0,
-            max_iter=1000,
-            random_state=42
-        )
-        
-        # Create voting classifier
-        self.model = VotingClassifier(
-            estimators=[
-                ('xgb', xgb),
-                ('rf', rf),
-                ('lr', lr)
-            ],
-            voting='soft',
-            weights=[3, 2, 1]
-        )
-        
-    def train(self, X, y):
-        """Train the model"""
-        print("🚀 Training advanced ensemble model...")
-        self.create_advanced_model()
-        self.model.fit(X, y)
-        self.is_trained = True
-        print("✅ Model training completed")
-        
-    def predict(self, X):
-        """Make predictions"""
-        if not self.is_trained:
-            raise ValueError("Model not trained yet")
-        
-        predictions = self.model.predict(X)
-        probabilities = self.model.predict_proba(X)
-        
-        return predictions, probabilities
-    
-    def evaluate(self, X_test, y_test):
-        """Evaluate model performance"""
-        from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
-        
-        y_pred, probabilities = self.predict(X_test)
-        
-        accuracy = accuracy_score(y_test, y_pred)
-        class_report = classification_report(y_test, y_pred, output_dict=True)
-        conf_matrix = confusion_matrix(y_test, y_pred)
-        
-        return {
-            'accuracy': accuracy,
-            'classification_report': class_report,
-            'confusion_matrix': conf_matrix.tolist(),
-            'predictions': y_pred.tolist(),
-            'probabilities': probabilities.tolist()
-        }
-    
-    def save_model(self, file_path):
-        """Save the trained model"""
-        joblib.dump(self.model, file_path)
-        print(f"✅ Model saved to {file_path}")
-    
-    def load_model(self, file_path):
-        """Load a trained model"""
-        self.model = joblib.load(file_path)
-        self.is_trained = True
-        print(f"✅ Model loaded from {file_path}")
+# Trained models are versioned in models/<catalog>/; the current version is served
+model_registry = ModelRegistry(MODEL_CATALOG)
+
+def import_legacy_model():
+    """Register model.pkl/preprocessor.pkl left in the working directory by earlier releases"""
+    if model_registry.current() is None and os.path.exists('model.pkl') and os.path.exists('preprocessor.pkl'):
+        print("📦 Importing model.pkl into the model registry")
+        model_registry.register({'model.pkl': 'model.pkl', 'preprocessor.pkl': 'preprocessor.pkl'}, {'source': 'legacy'})
 
 def initialize_model():
-    """Initialize or load the model"""
-    global model, preprocessor, label_encoder
+    """Load the current model version from the model registry"""
+    global model, preprocessor, label_encoder, model_version
     
-    model_path = 'model.pkl'
-    preprocessor_path = 'preprocessor.pkl'
+    version = model_registry.current()
+    files = model_registry.files(version) if version else None
     
     try:
-        # Initialize preprocessor
-        preprocessor = TOIDataPreprocessor()
+        # Load into locals first so predictions never see a half-swapped model
+        new_preprocessor = TOIDataPreprocessor()
+        new_model = TOIModel()
         
         # Try to load existing model and preprocessor
-        if os.path.exists(model_path) and os.path.exists(preprocessor_path):
-            model = TOIModel()
-            model.load_model(model_path)
-            preprocessor.load_preprocessor(preprocessor_path)
-            label_encoder = preprocessor.label_encoder
-            print("✅ Pre-trained model loaded successfully")
+        if files:
+            new_model.load_model(files['model.pkl'])
+            new_preprocessor.load_preprocessor(files['preprocessor.pkl'])
+            print(f"✅ model version {version} loaded successfully")
         else:
-            model = TOIModel()
             print("ℹ️ No pre-trained model found. Train the model first.")
+        
+        model, preprocessor, label_encoder = new_model, new_preprocessor, new_preprocessor.label_encoder
+        model_version = version
             
     except Exception as e:
         print(f"❌ Error initializing model: {e}")
         model = TOIModel()
         preprocessor = TOIDataPreprocessor()
+        # Not retried on every request; the next activation loads again
+        model_version = version
+
+def on_training_job_succeeded(job):
+    """Reload the model saved by a finished training job"""
+    print(f"🔄 Reloading model trained by job {job['job_id']}")
+    reload_model()
+
+def reload_model(force=False):
+    """Load the current registry version and start its warm-up, unless it is loaded already.
+
+    ``force`` reloads (and warms up) the current version even when it is loaded.
+    """
+    with model_reload_lock:
+        # Another request may have loaded the current version while this one waited
+        if not force and model_registry.current() == model_version:
+            return
+        initialize_model()
+        warmup.start(label=model_version)
+
+def ensure_current_model():
+    """Reload the model when another process made a different registry version current"""
+    if model_registry.current() != model_version:
+        reload_model()
 
 # Initialize model when app starts
+import_legacy_model()
 initialize_model()
 
-def generate_prediction_charts(predicted_class, confidence, probabilities, input_features):
+# Training runs in separate processes so prediction workers are never blocked
+training_jobs = TrainingJobManager('train_model:run_training_job', on_success=on_training_job_succeeded)
+model_cache = ModelCache()
+
+# Synthetic predictions warm up each loaded model in the background; /health/ready is 503 until the first finishes
+warmup = ServiceWarmup(app, lambda n: preprocessor.warmup_samples(n) if model and model.is_trained else None)
+
+# Serializes chart rendering on pyplot's global figure state
+chart_lock = threading.Lock()
+
+def generate_prediction_charts(predicted_class, confidence, probabilities, input_features, feature_contributions=None):
     """Generate charts and return as base64 images"""
     charts = {}
     
-    try:
-        # 1. Confidence Gauge Chart
-        plt.figure(figsize=(8, 4))
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
-        
-        # Confidence gauge
-        ax1.barh([0], [confidence], color='skyblue', edgecolor='navy')
-        ax1.set_xlim(0, 1)
-        ax1.set_xlabel('Confidence')
-        ax1.set_title(f'Confidence: {confidence:.1%}')
-        ax1.grid(True, alpha=0.3)
-        
-        # Probability distribution
-        classes = list(probabilities.keys())
-        probs = list(probabilities.values())
-        colors = ['lightcoral' if cls != predicted_class else 'lightgreen' for cls in classes]
-        
-        ax2.bar(classes, probs, color=colors, edgecolor='black')
-        ax2.set_ylabel('Probability')
-        ax2.set_title('Class Probabilities')
-        ax2.tick_params(axis='x', rotation=45)
-        plt.tight_layout()
-        
-        # Convert to base64
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-        buf.seek(0)
-        charts['confidence_chart'] = base64.b64encode(buf.getvalue()).decode('utf-8')
-        plt.close()
-        
-        # 2. Feature Importance (simulated)
-        plt.figure(figsize=(10, 6))
-        if input_features:
-            features = list(input_features.keys())[:8]  # Top 8 features
-            values = list(input_features.values())[:8]
+    with chart_lock:
+        try:
+            # 1. Confidence Gauge Chart
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
             
-            # Normalize values for better visualization
-            values_normalized = [abs(v) / max(abs(max(values)), 1) for v in values]
+            # Confidence gauge
+            ax1.barh([0], [confidence], color='skyblue', edgecolor='navy')
+            ax1.set_xlim(0, 1)
+            ax1.set_xlabel('Confidence')
+            ax1.set_title(f'Confidence: {confidence:.1%}')
+            ax1.grid(True, alpha=0.3)
             
-            plt.barh(features, values_normalized, color='lightseagreen', edgecolor='black')
-            plt.xlabel('Normalized Value')
-            plt.title('Input Feature Values')
+            # Probability distribution
+            classes = list(probabilities.keys())
+            probs = list(probabilities.values())
+            colors = ['lightcoral' if cls != predicted_class else 'lightgreen' for cls in classes]
+            
+            ax2.bar(classes, probs, color=colors, edgecolor='black')
+            ax2.set_ylabel('Probability')
+            ax2.set_title('Class Probabilities')
+            ax2.tick_params(axis='x', rotation=45)
             plt.tight_layout()
             
+            # Convert to base64
             buf = io.BytesIO()
             plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
             buf.seek(0)
-            charts['feature_chart'] = base64.b64encode(buf.getvalue()).decode('utf-8')
+            charts['confidence_chart'] = base64.b64encode(buf.getvalue()).decode('utf-8')
             plt.close()
-        
-    except Exception as e:
-        print(f"Chart generation error: {e}")
+            
+            # 2. Feature contributions to the predicted class
+            if feature_contributions:
+                ranked = sorted(feature_contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:8]
+                features = [name for name, _ in ranked][::-1]
+                values = [value for _, value in ranked][::-1]
+                colors = ['lightseagreen' if value >= 0 else 'lightcoral' for value in values]
+                
+                plt.figure(figsize=(10, 6))
+                plt.barh(features, values, color=colors, edgecolor='black')
+                plt.axvline(0, color='black', linewidth=0.8)
+                plt.xlabel(f'Contribution to {predicted_class} probability')
+                plt.title('Feature Contributions')
+                plt.tight_layout()
+                
+                buf = io.BytesIO()
+                plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+                buf.seek(0)
+                charts['feature_chart'] = base64.b64encode(buf.getvalue()).decode('utf-8')
+                plt.close()
+            
+        except Exception as e:
+            print(f"Chart generation error: {e}")
+        finally:
+            plt.close('all')
     
     return charts
 
@@ -216,14 +179,26 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'model_loaded': model.is_trained if model else False,
-        'preprocessor_loaded': preprocessor is not None
+        'preprocessor_loaded': preprocessor is not None,
+        'model_version': model_version,
+        'ready': warmup.ready,
+        'warmup': warmup.status()['warmup']
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness endpoint: the process is up and answering requests"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 503 until the loaded model has been warmed up"""
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/train', methods=['POST'])
 def train_model():
-    """Train the TOI model"""
-    global model, preprocessor, label_encoder
-    
+    """Queue a training job and return its id immediately"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -232,55 +207,176 @@ def train_model():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded file temporarily
-        file_path = f"temp_{file.filename}"
-        file.save(file_path)
-        
-        # Initialize preprocessor
-        preprocessor = TOIDataPreprocessor()
-        
-        # Preprocess data
-        X, y = preprocessor.preprocess_pipeline(file_path)
-        
-        # Split data
-        from sklearn.model_selection import train_test_split
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
-        
-        # Train model
-        model = TOIModel()
-        model.train(X_train, y_train)
+        # 'incremental' updates the current model with rows it has not seen yet
+        mode = request.form.get('mode', 'full')
+        if mode not in ('full', 'incremental'):
+            return jsonify({'error': f"Invalid training mode: {mode}"}), 400
         
-        # Evaluate model
-        evaluation = model.evaluate(X_test, y_test)
+        params = {'mode': mode}
+        if mode == 'incremental':
+            params['full_retrain_on_drift'] = request.form.get('full_retrain_on_drift', 'true').lower() == 'true'
+        else:
+            # Reuse the model of an identical earlier run unless force=true
+            params['cache_key'] = training_cache_key(hashlib.sha256(file.read()).hexdigest())
+            file.seek(0)
+            force = request.form.get('force', 'false').lower() == 'true'
+            cached = None if force else model_cache.get(params['cache_key'])
+            if cached:
+                summary = cached['summary']
+                # Serve the version this model is already registered as instead of adding a duplicate
+                version = summary.get('model_version')
+                if not version or model_registry.get(version) is None:
+                    version = model_registry.find(cache_key=params['cache_key'])
+                if version is None:
+                    version = model_registry.register(cached['files'], {
+                        'source': 'model_cache',
+                        'cache_key': params['cache_key'],
+                        'metrics': {'accuracy': summary['accuracy']}
+                    })
+                elif version != model_registry.current():
+                    model_registry.activate(version)
+                reload_model()
+                return jsonify({
+                    'success': True,
+                    'message': 'Model restored from training cache',
+                    'cached': True,
+                    'model_version': version,
+                    'result': summary
+                })
         
-        # Save model and preprocessor
-        model.save_model('model.pkl')
-        preprocessor.save_preprocessor('preprocessor.pkl')
-        label_encoder = preprocessor.label_encoder
+        # Save uploaded file in the job directory; the job removes it when done
+        job_id, job_dir = training_jobs.create_job()
+        file_path = os.path.join(job_dir, f"temp_{secure_filename(file.filename)}")
+        file.save(file_path)
         
-        # Clean up
-        os.remove(file_path)
+        params['data_file_path'] = file_path
+        # save_predictions=true keeps the per-row test outputs as a downloadable .npz file
+        if request.form.get('save_predictions', 'false').lower() == 'true':
+            params['predictions_path'] = os.path.join(job_dir, 'predictions.npz')
+        training_jobs.submit(job_id, params, cleanup=[file_path])
         
         return jsonify({
             'success': True,
-            'message': 'Model trained successfully',
-            'evaluation': evaluation,
-            'class_names': label_encoder.classes_.tolist()
-        })
+            'message': 'Training job queued',
+            'job_id': job_id,
+            'mode': mode,
+            'status_url': f'/train/{job_id}',
+            'events_url': f'/train/{job_id}/events'
+        }), 202
         
     except Exception as e:
         print(f"❌ Training error: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/train/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """Get state, per-stage progress and evaluation summary of a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown training job: {job_id}'}), 404
+    
+    if training_jobs.artifact_path(job_id, 'predictions.npz'):
+        job['predictions_url'] = f'/train/{job_id}/predictions'
+    return jsonify({'success': True, **job})
+
+@app.route('/train/<job_id>/predictions', methods=['GET'])
+def download_training_predictions(job_id):
+    """Download the per-row test predictions of a training job run with save_predictions=true"""
+    path = training_jobs.artifact_path(job_id, 'predictions.npz')
+    if path is None:
+        return jsonify({'error': f'No saved predictions for training job: {job_id}'}), 404
+    
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{job_id}_predictions.npz')
+
+@app.route('/train/<job_id>/events', methods=['GET'])
+def stream_training_job_events(job_id):
+    """Server-Sent Events stream of a training job's progress (resumable with Last-Event-ID)"""
+    if training_jobs.get(job_id) is None:
+        return jsonify({'error': f'Unknown training job: {job_id}'}), 404
+    
+    offset = int(request.headers.get('Last-Event-ID') or request.args.get('offset', 0) or 0)
+    return Response(
+        stream_with_context(training_jobs.stream_events(job_id, offset)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/models', methods=['GET'])
+def list_model_versions():
+    """List the registered model versions, newest first"""
+    try:
+        return jsonify({
+            'success': True,
+            'current': model_registry.current(),
+            'versions': model_registry.list_versions()
+        })
+    except Exception as e:
+        print(f"❌ Model registry error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/models/<version>', methods=['GET'])
+def get_model_version(version):
+    """Metadata of one registered model version"""
+    metadata = model_registry.get(version)
+    if metadata is None:
+        return jsonify({'error': f'Unknown model version: {version}'}), 404
+    
+    return jsonify({'success': True, **metadata, 'current': version == model_registry.current()})
+
+@app.route('/models/<version>/activate', methods=['POST'])
+def activate_model_version(version):
+    """Serve a registered model version (deploy or roll back without retraining)"""
+    try:
+        model_registry.activate(version)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    
+    reload_model(force=True)
+    return jsonify({'success': True, 'current': model_version})
+
+@app.route('/models/rollback', methods=['POST'])
+def rollback_model_version():
+    """Serve the model version that was current before this one; repeated rollbacks step further back"""
+    try:
+        model_registry.rollback()
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 409
+    
+    reload_model()
+    return jsonify({'success': True, 'current': model_version})
+
+def predict_rows(X_batch):
+    """Predict a batch in one call, falling back to row by row when the batch call fails.
+    
+    Returns (classes, probabilities, {row: error}) with classes and probabilities for the rows without an error.
+    """
+    try:
+        pred_classes, probabilities = model.predict(X_batch)
+        return pred_classes, probabilities, {}
+    except Exception as e:
+        print(f"⚠️  Batch prediction failed, predicting row by row: {e}")
+    
+    pred_classes, probabilities, row_errors = [], [], {}
+    for row in range(len(X_batch)):
+        try:
+            row_classes, row_probabilities = model.predict(X_batch[row:row + 1])
+            pred_classes.append(row_classes[0])
+            probabilities.append(row_probabilities[0])
+        except Exception as e:
+            row_errors[row] = str(e)
+    n_classes = len(label_encoder.classes_)
+    return (np.array(pred_classes, dtype=np.intp),
+            np.array(probabilities).reshape(len(pred_classes), n_classes), row_errors)
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Make predictions on single or multiple samples"""
     global model, preprocessor, label_encoder
     
     try:
+        ensure_current_model()
         if not model or not model.is_trained:
             return jsonify({'error': 'Model not trained. Please train the model first.'}), 400
         
@@ -299,52 +395,86 @@ def predict():
         else:
             return jsonify({'error': 'Invalid data format. Expected object or array.'}), 400
         
-        predictions = []
+        predictions = [None] * len(samples)
         charts = None
         
-        for sample in samples:
+        # Preprocess each sample, keeping per-sample errors
+        processed_rows = []
+        valid_indices = []
+        for i, sample in enumerate(samples):
             try:
-                # Preprocess sample
-                processed_sample = preprocessor.preprocess_single_sample(sample)
-                
-                # Make prediction
-                pred_class, probabilities = model.predict(processed_sample)
-                
-                # Get class name and confidence
-                class_idx = pred_class[0]
-                class_name = label_encoder.inverse_transform([class_idx])[0]
-                confidence = float(np.max(probabilities[0]))
+                processed_rows.append(preprocessor.preprocess_single_sample(sample))
+                valid_indices.append(i)
+            except Exception as e:
+                predictions[i] = {
+                    'error': str(e),
+                    'input_features': sample,
+                    'timestamp': pd.Timestamp.now().isoformat()
+                }
+        
+        if valid_indices:
+            # Predict the whole batch at once; rows the model rejects get their own error entry
+            X_batch = np.vstack(processed_rows)
+            pred_classes, probabilities, row_errors = predict_rows(X_batch)
+            for row, error in row_errors.items():
+                predictions[valid_indices[row]] = {
+                    'error': error,
+                    'input_features': samples[valid_indices[row]],
+                    'timestamp': pd.Timestamp.now().isoformat()
+                }
+            kept_rows = [row for row in range(len(valid_indices)) if row not in row_errors]
+            X_batch = X_batch[kept_rows]
+            valid_indices = [valid_indices[row] for row in kept_rows]
+        
+        if valid_indices:
+            # Explain the whole batch at once
+            valid_samples = [samples[i] for i in valid_indices]
+            class_names = label_encoder.inverse_transform(pred_classes)
+            confidences = probabilities.max(axis=1)
+            
+            contributions = None
+            try:
+                contributions, _ = model.explain(X_batch)
+            except Exception as e:
+                print(f"⚠️  Feature attribution failed: {e}")
+            
+            explanations = get_prediction_explanations(class_names, valid_samples)
+            
+            for row, i in enumerate(valid_indices):
+                class_name = class_names[row]
+                confidence = float(confidences[row])
                 
                 # Get all class probabilities
                 class_probabilities = {}
-                for i, class_label in enumerate(label_encoder.classes_):
-                    class_probabilities[class_label] = float(probabilities[0][i])
+                for j, class_label in enumerate(label_encoder.classes_):
+                    class_probabilities[class_label] = float(probabilities[row][j])
                 
-                # Create explanation
-                explanation = get_prediction_explanation(class_name, confidence, sample)
+                # Contribution of each model feature to the predicted class probability
+                feature_contributions = None
+                if contributions is not None:
+                    feature_contributions = {
+                        feature: float(value)
+                        for feature, value in zip(preprocessor.selected_features, contributions[row, :, pred_classes[row]])
+                    }
                 
                 prediction_data = {
                     'predicted_class': class_name,
                     'confidence': confidence,
                     'probabilities': class_probabilities,
-                    'explanation': explanation,
-                    'input_features': sample,
+                    'explanation': explanations[row],
+                    'feature_contributions': feature_contributions,
+                    'input_features': samples[i],
                     'timestamp': pd.Timestamp.now().isoformat()
                 }
                 
                 # Generate charts only for single prediction
                 if not is_batch:
-                    charts = generate_prediction_charts(class_name, confidence, class_probabilities, sample)
+                    charts = generate_prediction_charts(
+                        class_name, confidence, class_probabilities, samples[i], feature_contributions
+                    )
                     prediction_data['charts'] = charts
                 
-                predictions.append(prediction_data)
-                
-            except Exception as e:
-                predictions.append({
-                    'error': str(e),
-                    'input_features': sample,
-                    'timestamp': pd.Timestamp.now().isoformat()
-                })
+                predictions[i] = prediction_data
         
         response_data = {
             'success': True,
@@ -369,6 +499,7 @@ def get_model_info():
     """Get information about the trained model"""
     global model, preprocessor, label_encoder
     
+    ensure_current_model()
     if not model or not model.is_trained:
         return jsonify({'error': 'Model not trained'}), 400
     
@@ -383,48 +514,41 @@ def get_model_info():
     
     return jsonify(info)
 
+CLASS_EXPLANATIONS = {
+    'FP': 'False Positive - The signal is likely caused by instrumental noise, stellar variability, or other astrophysical false positives rather than a planetary transit.',
+    'PC': 'Planetary Candidate - This shows strong signatures of a planetary transit. Further observations and validation are recommended to confirm planetary nature.',
+    'KP': 'Known Planet - This object has been previously confirmed as an exoplanet through multiple validation methods.',
+    'CP': 'Confirmed Planet - Independently validated and confirmed as a bona fide exoplanet.',
+    'APC': 'Ambiguous Planetary Candidate - The signal shows some planetary characteristics but requires additional data for confirmation.',
+    'FA': 'False Alarm - The signal is likely an instrumental artifact or data processing error.'
+}
+
+# Feature-based insights: (feature, comparison, threshold, insight)
+INSIGHT_RULES = [
+    ('pl_trandep', '>', 10000, "Very deep transit suggests large planetary radius or small host star."),
+    ('pl_trandep', '<', 100, "Shallow transit may indicate small planet or requires high precision detection."),
+    ('pl_orbper', '<', 1, "Ultra-short orbital period typical of hot planets close to their host stars."),
+    ('pl_orbper', '>', 100, "Long orbital period suggests distant orbit from host star."),
+    ('pl_rade', '>', 20, "Large planetary radius, potentially a gas giant."),
+    ('pl_rade', '<', 2, "Small planetary radius, potentially rocky planet."),
+]
+
+insight_engine = InsightRuleEngine(
+    INSIGHT_RULES,
+    CLASS_EXPLANATIONS,
+    'Classification completed based on transit characteristics.'
+)
+
+def get_prediction_explanations(predicted_classes, samples):
+    """Generate human-readable explanations for a batch of predictions"""
+    return insight_engine.explain(predicted_classes, samples)
+
 def get_prediction_explanation(predicted_class, confidence, input_features):
     """Generate human-readable explanation for prediction"""
-    explanations = {
-        'FP': 'False Positive - The signal is likely caused by instrumental noise, stellar variability, or other astrophysical false positives rather than a planetary transit.',
-        'PC': 'Planetary Candidate - This shows strong signatures of a planetary transit. Further observations and validation are recommended to confirm planetary nature.',
-        'KP': 'Known Planet - This object has been previously confirmed as an exoplanet through multiple validation methods.',
-        'CP': 'Confirmed Planet - Independently validated and confirmed as a bona fide exoplanet.',
-        'APC': 'Ambiguous Planetary Candidate - The signal shows some planetary characteristics but requires additional data for confirmation.',
-        'FA': 'False Alarm - The signal is likely an instrumental artifact or data processing error.'
-    }
-    
-    base_explanation = explanations.get(predicted_class, 'Classification completed based on transit characteristics.')
-    
-    # Add feature-based insights
-    insights = []
-    
-    if 'pl_trandep' in input_features:
-        depth = input_features['pl_trandep']
-        if depth > 10000:
-            insights.append("Very deep transit suggests large planetary radius or small host star.")
-        elif depth < 100:
-            insights.append("Shallow transit may indicate small planet or requires high precision detection.")
-    
-    if 'pl_orbper' in input_features:
-        period = input_features['pl_orbper']
-        if period < 1:
-            insights.append("Ultra-short orbital period typical of hot planets close to their host stars.")
-        elif period > 100:
-            insights.append("Long orbital period suggests distant orbit from host star.")
-    
-    if 'pl_rade' in input_features:
-        radius = input_features['pl_rade']
-        if radius > 20:
-            insights.append("Large planetary radius, potentially a gas giant.")
-        elif radius < 2:
-            insights.append("Small planetary radius, potentially rocky planet.")
-    
-    if insights:
-        feature_insight = " Feature insights: " + " ".join(insights)
-        return base_explanation + feature_insight
-    else:
-        return base_explanation
+    return get_prediction_explanations([predicted_class], [input_features])[0]
+
+# Warm up once every route is registered
+warmup.start(label=model_version)
 
 if __name__ == '__main__':
     port = int(os.getenv('TOI_MODEL_PORT', 5001))
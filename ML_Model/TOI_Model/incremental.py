@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+def row_fingerprints(df, columns):
+    """Stable 64-bit hash of each row over ``columns``"""
+    columns = [col for col in columns if col in df.columns]
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy(dtype=np.uint64)
+
+def detect_drift(feature_stats, X_new, feature_names=None, threshold=0.5, min_rows=30):
+    """Compare new rows against the running statistics of the training data.
+
+    A feature drifts when its mean moved by more than ``threshold`` reference
+    standard deviations or its standard deviation changed by more than 2x.
+    Batches smaller than ``min_rows`` are too noisy to judge and never drift.
+    """
+    X_new = np.asarray(X_new, dtype=np.float64)
+    names = feature_names or [f'feature_{i}' for i in range(X_new.shape[1])]
+    report = {'rows': int(len(X_new)), 'threshold': threshold, 'drifted': False, 'features': {}}
+    if feature_stats is None or len(X_new) < min_rows:
+        report['skipped'] = True
+        return report
+
+    ref_std = np.sqrt(feature_stats.var_)
+    ref_std = np.where(ref_std > 0, ref_std, 1.0)
+    mean_shift = np.abs(X_new.mean(axis=0) - feature_stats.mean_) / ref_std
+    std_ratio = X_new.std(axis=0) / ref_std
+
+    drifted = (mean_shift > threshold) | (std_ratio > 2.0) | (std_ratio < 0.5)
+    for name, shift, ratio, flag in zip(names, mean_shift, std_ratio, drifted):
+        report['features'][name] = {
+            'mean_shift': round(float(shift), 4),
+            'std_ratio': round(float(ratio), 4),
+            'drifted': bool(flag)
+        }
+    report['drifted'] = bool(drifted.any())
+    report['max_mean_shift'] = round(float(mean_shift.max()), 4)
+    return report
+
+def continue_voting_classifier(model, X_new, y_new, X_all, y_all, boost_rounds=50, forest_trees=50,
+                               sample_weight_new=None, sample_weight_all=None):
+    """Update a fitted XGBoost/RandomForest/LogisticRegression VotingClassifier in place.
+
+    XGBoost continues boosting from its current booster on the new rows
+    (histogram-binned with cuts sketched over all rows), RandomForest grows ``forest_trees`` extra trees on the new rows via warm
+    start, and LogisticRegression (cheap) is warm-start refitted on all rows.
+    Members that cannot be updated safely are left untouched and reported.
+    ``sample_weight_new``/``sample_weight_all`` are the class-balancing
+    weights of the new and of all rows, as used by the full fit.
+    """
+    import xgboost
+    from quantized import QuantizedFeatures
+
+    n_classes = len(model.classes_)
+    y_new = model.le_.transform(y_new)
+    y_all = model.le_.transform(y_all)
+    all_classes_new = len(np.unique(y_new)) == n_classes
+    report = {}
+
+    names = [name for name, est in model.estimators if est != 'drop']
+    for name, estimator in zip(names, model.estimators_):
+        if hasattr(estimator, 'get_booster'):
+            params = {k: v for k, v in estimator.get_xgb_params().items() if v is not None}
+            if 'n_jobs' in params:
+                params['nthread'] = params.pop('n_jobs')
+            if n_classes > 2:
+                params['num_class'] = n_classes
+            booster = xgboost.train(
+                params,
+                QuantizedFeatures(X_all).bin(X_new, label=y_new, weight=sample_weight_new),
+                num_boost_round=boost_rounds,
+                xgb_model=estimator.get_booster()
+            )
+            # Early-stopping marks of the previous fit would truncate the new rounds
+            booster.set_attr(best_iteration=None, best_ntree_limit=None, best_score=None)
+            estimator._Booster = booster
+            estimator.n_estimators = booster.num_boosted_rounds()
+            report[name] = {'action': 'continued_boosting', 'added_rounds': boost_rounds,
+                            'total_rounds': booster.num_boosted_rounds()}
+
+        elif hasattr(estimator, 'estimators_') and hasattr(estimator, 'warm_start'):
+            if not all_classes_new:
+                # Trees grown without every class would disagree on classes_
+                report[name] = {'action': 'skipped', 'reason': 'new rows do not cover every class'}
+                continue
+            estimator.set_params(warm_start=True, n_estimators=len(estimator.estimators_) + forest_trees)
+            estimator.fit(X_new, y_new, sample_weight=sample_weight_new)
+            estimator.set_params(warm_start=False)
+            report[name] = {'action': 'added_trees', 'added_trees': forest_trees,
+                            'total_trees': len(estimator.estimators_)}
+
+        elif hasattr(estimator, 'coef_'):
+            if len(np.unique(y_all)) != n_classes:
+                report[name] = {'action': 'skipped', 'reason': 'data does not cover every class'}
+                continue
+            estimator.set_params(warm_start=True)
+            estimator.fit(X_all, y_all, sample_weight=sample_weight_all)
+            estimator.set_params(warm_start=False)
+            report[name] = {'action': 'refitted', 'samples': int(len(X_all))}
+
+        else:
+            report[name] = {'action': 'skipped', 'reason': 'unsupported estimator'}
+
+    return report
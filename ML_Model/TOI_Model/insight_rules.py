@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+class InsightRuleEngine:
+    """Evaluate declarative threshold rules over a whole batch of samples.
+
+    Rules are ``(feature, comparison, threshold, insight)`` tuples where the
+    comparison is ``'>'`` or ``'<'``. All rules are evaluated column-wise with
+    NumPy; each row's hit pattern is packed into an integer code so the
+    explanation text is built once per distinct (class, pattern) pair and then
+    gathered for every row.
+    """
+
+    def __init__(self, rules, class_explanations, default_explanation, ignore_zero_features=()):
+        self.rules = list(rules)
+        if len(self.rules) > 62:
+            raise ValueError("InsightRuleEngine supports at most 62 rules")
+
+        self.class_explanations = dict(class_explanations)
+        self.default_explanation = default_explanation
+
+        # Unique features in rule order, and the column each rule reads
+        self.features = list(dict.fromkeys(rule[0] for rule in self.rules))
+        self._rule_columns = np.array([self.features.index(rule[0]) for rule in self.rules], dtype=np.intp)
+        self._thresholds = np.array([rule[2] for rule in self.rules], dtype=np.float64)
+        self._is_upper = np.array([rule[1] == '>' for rule in self.rules], dtype=bool)
+        self._insights = [rule[3] for rule in self.rules]
+        self._bit_weights = np.left_shift(1, np.arange(len(self.rules), dtype=np.int64))
+
+        # Features where a falsy value (0) means "not provided"
+        self._zero_as_missing = np.array([f in set(ignore_zero_features) for f in self.features], dtype=bool)
+
+        self._templates = {}
+
+    def feature_matrix(self, samples):
+        """Build a float matrix (n_samples x n_features); non-numeric or absent values become NaN"""
+        records = [sample if isinstance(sample, dict) else {} for sample in samples]
+        frame = pd.DataFrame(records, columns=self.features)
+        values = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        if self._zero_as_missing.any():
+            values[:, self._zero_as_missing] = np.where(
+                values[:, self._zero_as_missing] == 0, np.nan, values[:, self._zero_as_missing]
+            )
+        return values
+
+    def evaluate(self, samples):
+        """Return a boolean hit matrix (n_samples x n_rules)"""
+        values = self.feature_matrix(samples)[:, self._rule_columns]
+        with np.errstate(invalid='ignore'):
+            return np.where(self._is_upper, values > self._thresholds, values < self._thresholds)
+
+    def _template(self, predicted_class, code):
+        """Build (and memoize) the explanation for one class and hit pattern"""
+        key = (predicted_class, code)
+        if key not in self._templates:
+            base_explanation = self.class_explanations.get(predicted_class, self.default_explanation)
+            insights = [text for bit, text in enumerate(self._insights) if code >> bit & 1]
+            if insights:
+                self._templates[key] = base_explanation + " Feature insights: " + " ".join(insights)
+            else:
+                self._templates[key] = base_explanation
+        return self._templates[key]
+
+    def explain(self, predicted_classes, samples):
+        """Generate explanations for a batch of predictions"""
+        samples = list(samples)
+        if not samples:
+            return []
+
+        codes = self.evaluate(samples).astype(np.int64) @ self._bit_weights
+        class_codes, class_names = pd.factorize(np.asarray(predicted_classes, dtype=object))
+
+        # Group rows by (class, hit pattern) pairs, then build each distinct text once
+        keys = np.column_stack([class_codes.astype(np.int64), codes])
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        texts = np.array(
+            [self._template(class_names[class_code], int(code)) for class_code, code in unique_keys],
+            dtype=object
+        )
+        return texts[inverse.ravel()].tolist()
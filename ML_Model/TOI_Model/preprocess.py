@@ -5,7 +5,15 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.feature_selection import SelectKBest, f_classif
 from sklearn.utils import resample
 import joblib
+import copy
 import os
+from ensemble import balanced_sample_weight
+from incremental import row_fingerprints
+from preprocess_cache import PreprocessCache
+from feature_screening import screen_features, kbest_selector
+from streaming import use_streaming, stream_fit_features
+from columnar import load_catalog
+from progress import ProgressReporter
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -16,6 +24,8 @@ class TOIDataPreprocessor:
         self.label_encoder = None
         self.feature_selector = None
         self.selected_features = None
+        self.trained_fingerprints = None
+        self.feature_stats = None
         
         # Define feature columns based on your data structure
         self.feature_columns = [
@@ -30,85 +40,91 @@ class TOIDataPreprocessor:
         """Load and clean the TOI dataset"""
         try:
             print(f"📖 Loading dataset from {file_path}...")
-            # Read CSV with comment character and low_memory=False to handle mixed types
-            df = pd.read_csv(file_path, comment='#', low_memory=False)
+            # Only the needed columns, from the typed columnar copy of the CSV
+            df = load_catalog(self, file_path)
             print(f"✅ Loaded dataset with {len(df)} rows and {len(df.columns)} columns")
             
-            # Display available columns for debugging
-            print(f"📊 Available columns: {len(df.columns)}")
-            print(f"🔍 First few columns: {list(df.columns)[:15]}...")
-            
-            # Select only relevant columns that exist in the dataset
-            available_features = [col for col in self.feature_columns if col in df.columns]
-            missing_features = [col for col in self.feature_columns if col not in df.columns]
-            
-            if missing_features:
-                print(f"⚠️  Missing features: {missing_features}")
-            
-            if self.target_column not in df.columns:
-                # Try to find target column with different names
-                possible_targets = [col for col in df.columns if 'disp' in col.lower() or 'tfopwg' in col.lower()]
-                if possible_targets:
-                    self.target_column = possible_targets[0]
-                    print(f"🔍 Using alternative target column: {self.target_column}")
-                else:
-                    raise ValueError(f"Target column not found. Available columns: {list(df.columns)}")
-            
-            df = df[available_features + [self.target_column]]
-            print(f"✅ Selected {len(available_features)} features and target column '{self.target_column}'")
-            
-            # Clean target column - handle different formats
-            df[self.target_column] = df[self.target_column].astype(str).str.strip().str.upper()
-            
-            # Remove rows with missing target or invalid target values
-            initial_count = len(df)
-            df = df[df[self.target_column].notna()]
-            df = df[df[self.target_column] != 'NAN']
-            df = df[df[self.target_column] != '']
-            
-            removed_count = initial_count - len(df)
-            if removed_count > 0:
-                print(f"🗑️  Removed {removed_count} rows with missing/invalid target values")
-            
-            # Handle infinite values
-            df = df.replace([np.inf, -np.inf], np.nan)
-            
-            print(f"📊 Final dataset size: {len(df)} rows")
-            print(f"🎯 Target value counts:")
-            target_counts = df[self.target_column].value_counts()
-            for value, count in target_counts.items():
-                print(f"   {value}: {count} samples ({count/len(df)*100:.1f}%)")
-            
-            return df
+            return self.clean_data(df)
             
         except Exception as e:
             print(f"❌ Error loading data: {e}")
             raise
     
+    def clean_data(self, df):
+        """Select the feature and target columns of a loaded frame and drop unusable rows"""
+        # Display available columns for debugging
+        print(f"📊 Available columns: {len(df.columns)}")
+        print(f"🔍 First few columns: {list(df.columns)[:15]}...")
+        
+        # Select only relevant columns that exist in the dataset
+        available_features = [col for col in self.feature_columns if col in df.columns]
+        missing_features = [col for col in self.feature_columns if col not in df.columns]
+        
+        if missing_features:
+            print(f"⚠️  Missing features: {missing_features}")
+        
+        if self.target_column not in df.columns:
+            # Try to find target column with different names
+            possible_targets = [col for col in df.columns if 'disp' in col.lower() or 'tfopwg' in col.lower()]
+            if possible_targets:
+                self.target_column = possible_targets[0]
+                print(f"🔍 Using alternative target column: {self.target_column}")
+            else:
+                raise ValueError(f"Target column not found. Available columns: {list(df.columns)}")
+        
+        df = df[available_features + [self.target_column]]
+        print(f"✅ Selected {len(available_features)} features and target column '{self.target_column}'")
+        
+        # Clean target column - handle different formats
+        df[self.target_column] = df[self.target_column].astype(str).str.strip().str.upper()
+        
+        # Remove rows with missing target or invalid target values
+        initial_count = len(df)
+        df = df[df[self.target_column].notna()]
+        df = df[df[self.target_column] != 'NAN']
+        df = df[df[self.target_column] != '']
+        
+        removed_count = initial_count - len(df)
+        if removed_count > 0:
+            print(f"🗑️  Removed {removed_count} rows with missing/invalid target values")
+        
+        # Handle infinite values
+        df = df.replace([np.inf, -np.inf], np.nan)
+        
+        print(f"📊 Final dataset size: {len(df)} rows")
+        print(f"🎯 Target value counts:")
+        target_counts = df[self.target_column].value_counts()
+        for value, count in target_counts.items():
+            print(f"   {value}: {count} samples ({count/len(df)*100:.1f}%)")
+        
+        return df
+    
     def handle_missing_values(self, df):
         """Handle missing values in the dataset"""
         print("🔧 Handling missing values...")
         
-        # Separate features and target
-        X = df[self.feature_columns].copy()
+        # Separate features and target; features go into one contiguous float32 matrix
+        X = df[self.feature_columns].to_numpy(dtype=np.float32)
         y = df[self.target_column].copy()
         
         # Print missing values summary
-        missing_summary = X.isnull().sum()
+        missing_summary = np.isnan(X).sum(axis=0)
         total_missing = missing_summary.sum()
         print(f"📊 Total missing values: {total_missing}")
         
         if total_missing > 0:
             print("📋 Missing values per column:")
-            for col, missing_count in missing_summary.items():
+            for col, missing_count in zip(self.feature_columns, missing_summary):
                 if missing_count > 0:
                     percentage = (missing_count / len(X)) * 100
                     print(f"   {col}: {missing_count} ({percentage:.1f}%)")
         
-        # Impute missing values - use median for numerical features
-        self.imputer = SimpleImputer(strategy='median')
-        X_imputed = self.imputer.fit_transform(X)
-        X_imputed = pd.DataFrame(X_imputed, columns=X.columns, index=X.index)
+        # Impute missing values in place - use median for numerical features
+        self.imputer = SimpleImputer(strategy='median', copy=False)
+        X_imputed = self.imputer.fit_transform(pd.DataFrame(X, columns=self.feature_columns, copy=False))
+        # Later transforms run on caller data and must not modify it
+        self.imputer.set_params(copy=True)
+        X_imputed = pd.DataFrame(X_imputed, columns=self.feature_columns, index=df.index, copy=False)
         
         return X_imputed, y
     
@@ -131,25 +147,20 @@ class TOIDataPreprocessor:
         """Perform feature selection"""
         print("🔍 Performing feature selection...")
         
-        # Remove constant features
-        constant_features = X.columns[X.nunique() <= 1]
+        # Constant and highly correlated features plus F-scores, screened in one blocked pass
+        values = X.to_numpy()
+        screen = screen_features(values, y)
+        constant_features = X.columns[screen['constant']]
         if len(constant_features) > 0:
             print(f"   Removing constant features: {list(constant_features)}")
-            X = X.drop(columns=constant_features)
-        
-        # Remove highly correlated features
-        corr_matrix = X.corr().abs()
-        upper_triangle = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
-        high_corr_features = [column for column in upper_triangle.columns if any(upper_triangle[column] > 0.95)]
         
+        high_corr_features = X.columns[screen['correlated'] & ~screen['constant']].tolist()
         if high_corr_features:
             print(f"   Removing highly correlated features: {high_corr_features}")
-            X = X.drop(columns=high_corr_features)
         
-        # Use SelectKBest for feature selection
-        k = min(10, len(X.columns))  # Select top 10 features or all if less than 10
-        self.feature_selector = SelectKBest(score_func=f_classif, k=k)
-        X_selected = self.feature_selector.fit_transform(X, y)
+        # Select the top 10 remaining features (or all if fewer); the selector spans every input column
+        self.feature_selector = kbest_selector(screen, 10, X.columns)
+        X_selected = values[:, self.feature_selector.get_support()]
         
         # Get selected feature names and scores
         selected_mask = self.feature_selector.get_support()
@@ -160,54 +171,46 @@ class TOIDataPreprocessor:
         for feature, score in zip(self.selected_features, feature_scores):
             print(f"   - {feature}: {score:.2f}")
             
-        return X_selected
+        return np.ascontiguousarray(X_selected, dtype=np.float32)
     
     def scale_features(self, X):
-        """Scale features using StandardScaler"""
+        """Scale features using StandardScaler (in place on the selected float32 matrix)"""
         self.scaler = StandardScaler()
-        X_scaled = self.scaler.fit_transform(X)
+        X_scaled = self.scaler.fit(X).transform(X, copy=False)
         return X_scaled
     
     def handle_class_imbalance(self, X, y):
         """Handle class imbalance using manual resampling (no SMOTE dependency)"""
         print("⚖️ Handling class imbalance...")
         
-        # Convert to DataFrame for easier manipulation
-        X_df = pd.DataFrame(X)
-        X_df['target'] = y
-        
         # Find the majority class count
-        class_counts = X_df['target'].value_counts()
-        max_count = class_counts.max()
+        classes, counts = np.unique(y, return_counts=True)
+        max_count = counts.max()
         
         print("📈 Class distribution before resampling:")
-        for class_idx, count in class_counts.items():
+        for class_idx, count in zip(classes, counts):
             class_name = self.label_encoder.inverse_transform([class_idx])[0]
             print(f"   {class_name}: {count} samples")
         
-        # Resample each minority class
-        resampled_dfs = []
-        for class_idx in class_counts.index:
-            class_df = X_df[X_df['target'] == class_idx]
-            n_samples = len(class_df)
+        # Resample row indices of each minority class, then gather the rows once
+        resampled_indices = []
+        for class_idx, n_samples in sorted(zip(classes, counts), key=lambda item: -item[1]):
+            class_indices = np.flatnonzero(y == class_idx)
             
             if n_samples < max_count:
                 # Upsample minority class
-                resampled_class = resample(
-                    class_df,
+                class_indices = resample(
+                    class_indices,
                     replace=True,
                     n_samples=max_count,
                     random_state=42
                 )
-                resampled_dfs.append(resampled_class)
                 print(f"   🔼 Upsampled {self.label_encoder.inverse_transform([class_idx])[0]} from {n_samples} to {max_count}")
-            else:
-                resampled_dfs.append(class_df)
+            resampled_indices.append(class_indices)
         
-        # Combine all resampled data
-        X_resampled_df = pd.concat(resampled_dfs, ignore_index=True)
-        X_resampled = X_resampled_df.drop('target', axis=1).values
-        y_resampled = X_resampled_df['target'].values
+        indices = np.concatenate(resampled_indices)
+        X_resampled = X[indices]
+        y_resampled = np.asarray(y)[indices]
         
         print("📊 Class distribution after resampling:")
         unique, counts = np.unique(y_resampled, return_counts=True)
@@ -217,28 +220,140 @@ class TOIDataPreprocessor:
             
         return X_resampled, y_resampled
     
-    def preprocess_pipeline(self, file_path):
-        """Complete preprocessing pipeline"""
+    def class_sample_weights(self, y):
+        """Balanced per-sample weights, the alternative to upsampling that leaves the data untouched"""
+        print("⚖️ Weighting classes instead of resampling...")
+        sample_weight = balanced_sample_weight(y)
+        for class_idx in np.unique(y):
+            class_name = self.label_encoder.inverse_transform([class_idx])[0]
+            mask = y == class_idx
+            print(f"   {class_name}: {mask.sum()} samples, weight {sample_weight[mask][0]:.3f}")
+        return sample_weight
+    
+    def _fit_features(self, file_path, progress=None):
+        """Fit the preprocessing steps and return scaled features and encoded labels (no resampling)"""
+        progress = progress or ProgressReporter()
+        # Archives too large to load at once are read in chunks
+        if use_streaming(file_path):
+            X_scaled, y_encoded = stream_fit_features(self, file_path, progress=progress)
+            self.feature_stats = copy.deepcopy(self.scaler)
+            return X_scaled, y_encoded
+        
         # Load and clean data
-        df = self.load_and_clean_data(file_path)
+        with progress.substage('preprocess', 'load'):
+            df = self.load_and_clean_data(file_path)
+        progress.emit('rows_processed', stage='preprocess', rows=int(len(df)))
+        
+        # Remember which rows the model was trained on for incremental updates
+        self.trained_fingerprints = np.unique(row_fingerprints(df, self.feature_columns + [self.target_column]))
         
         # Handle missing values
-        X, y = self.handle_missing_values(df)
+        with progress.substage('preprocess', 'missing_values'):
+            X, y = self.handle_missing_values(df)
         
         # Encode labels
         y_encoded = self.encode_labels(y)
         
         # Feature selection
-        X_selected = self.feature_selection(X, y_encoded)
+        with progress.substage('preprocess', 'feature_selection', features=int(X.shape[1])):
+            X_selected = self.feature_selection(X, y_encoded)
         
         # Scale features
-        X_scaled = self.scale_features(X_selected)
+        with progress.substage('preprocess', 'scale'):
+            X_scaled = self.scale_features(X_selected)
+        self.feature_stats = copy.deepcopy(self.scaler)
+        
+        return X_scaled, y_encoded
+    
+    def _fit_pipeline(self, file_path, progress=None):
+        """Fitted features followed by class rebalancing"""
+        progress = progress or ProgressReporter()
+        X_scaled, y_encoded = self.prepare_features(file_path, progress=progress)
         
         # Handle class imbalance
-        X_resampled, y_resampled = self.handle_class_imbalance(X_scaled, y_encoded)
+        with progress.substage('preprocess', 'class_balance'):
+            X_resampled, y_resampled = self.handle_class_imbalance(X_scaled, y_encoded)
         
         return X_resampled, y_resampled
     
+    def _cached(self, stage, file_path, compute, use_cache, progress=None):
+        """Run a preprocessing stage, reusing fitted state and arrays cached for the same file and config"""
+        if not use_cache:
+            return compute(file_path, progress)
+        
+        cache = PreprocessCache()
+        key = cache.key(file_path, self, {
+            'stage': stage,
+            'feature_columns': self.feature_columns,
+            'target_column': self.target_column
+        })
+        cached = cache.load(key)
+        if cached is not None:
+            state, arrays = cached
+            self.__dict__.update(state)
+            if progress is not None:
+                progress.emit('preprocess_cache_hit', stage='preprocess', step=stage, rows=int(len(arrays['y'])))
+            return arrays['X'], arrays['y']
+        
+        X, y = compute(file_path, progress)
+        cache.store(key, dict(self.__dict__), {'X': X, 'y': y},
+                    meta={'stage': stage, 'source_file': os.path.basename(file_path)})
+        return X, y
+    
+    def prepare_features(self, file_path, use_cache=True, progress=None):
+        """Scaled features and encoded labels without resampling (cached per file and config)"""
+        return self._cached('features', file_path, self._fit_features, use_cache, progress)
+    
+    def preprocess_pipeline(self, file_path, use_cache=True, progress=None):
+        """Complete preprocessing pipeline (cached per file and config); steps are reported to ``progress``"""
+        return self._cached('pipeline', file_path, self._fit_pipeline, use_cache, progress)
+    
+    def preprocess_incremental(self, file_path):
+        """Transform a new export with the fitted preprocessor and flag rows not seen in training"""
+        if self.imputer is None or self.scaler is None or self.feature_selector is None:
+            raise ValueError("Preprocessor not fitted. Call preprocess_pipeline first.")
+        
+        df = self.load_and_clean_data(file_path)
+        fingerprints = row_fingerprints(df, self.feature_columns + [self.target_column])
+        if self.trained_fingerprints is not None:
+            is_new = ~np.isin(fingerprints, self.trained_fingerprints)
+        else:
+            is_new = np.ones(len(df), dtype=bool)
+        
+        # Labels the fitted encoder does not know require a full retrain
+        known = df[self.target_column].isin(self.label_encoder.classes_).to_numpy()
+        unseen_labels = sorted(df.loc[~known, self.target_column].unique().tolist())
+        df = df[known]
+        
+        # Same transformation as preprocess_single_sample, for the whole batch
+        X = df.reindex(columns=self.feature_columns)
+        X_imputed = pd.DataFrame(self.imputer.transform(X), columns=self.feature_columns)
+        X_selected = self.feature_selector.transform(X_imputed)
+        X_scaled = self.scaler.transform(X_selected)
+        y_encoded = self.label_encoder.transform(df[self.target_column])
+        
+        print(f"🆕 {int(is_new[known].sum())} new rows out of {len(df)}")
+        return {
+            'X': X_scaled,
+            'y': y_encoded,
+            'X_selected': X_selected,
+            'is_new': is_new[known],
+            'fingerprints': fingerprints[known],
+            'unseen_labels': unseen_labels
+        }
+    
+    def record_increment(self, fingerprints, X_new_selected):
+        """Mark rows as trained and fold them into the running feature statistics"""
+        if self.trained_fingerprints is None:
+            self.trained_fingerprints = np.unique(fingerprints)
+        else:
+            self.trained_fingerprints = np.union1d(self.trained_fingerprints, fingerprints)
+        
+        if self.feature_stats is None:
+            self.feature_stats = copy.deepcopy(self.scaler)
+        if len(X_new_selected) > 0:
+            self.feature_stats.partial_fit(X_new_selected)
+    
     def preprocess_single_sample(self, sample_data):
         """Preprocess a single sample for prediction"""
         if self.imputer is None or self.scaler is None or self.feature_selector is None:
@@ -271,6 +386,17 @@ class TOIDataPreprocessor:
         
         return sample_scaled
     
+    def warmup_samples(self, n_samples, seed=0):
+        """Synthetic raw samples from the training feature distribution, used to warm up the service"""
+        if self.imputer is None or self.scaler is None:
+            return []
+        rng = np.random.default_rng(seed)
+        # Selected features follow the fitted scaler; the others sit at their training medians
+        medians = {feature: float(value) for feature, value in zip(self.feature_columns, self.imputer.statistics_)}
+        values = self.scaler.inverse_transform(rng.standard_normal((n_samples, len(self.selected_features))))
+        return [{**medians, **{feature: float(value) for feature, value in zip(self.selected_features, row)}}
+                for row in values]
+    
     def save_preprocessor(self, file_path):
         """Save preprocessor objects"""
         try:
@@ -281,7 +407,9 @@ class TOIDataPreprocessor:
                 'label_encoder': self.label_encoder,
                 'feature_selector': self.feature_selector,
                 'selected_features': self.selected_features,
-                'feature_columns': self.feature_columns
+                'feature_columns': self.feature_columns,
+                'trained_fingerprints': self.trained_fingerprints,
+                'feature_stats': self.feature_stats
             }
             joblib.dump(preprocessor_data, file_path)
             print(f"✅ Preprocessor saved to {file_path}")
@@ -298,4 +426,6 @@ class TOIDataPreprocessor:
         self.feature_selector = preprocessor_data['feature_selector']
         self.selected_features = preprocessor_data['selected_features']
         self.feature_columns = preprocessor_data['feature_columns']
+        self.trained_fingerprints = preprocessor_data.get('trained_fingerprints')
+        self.feature_stats = preprocessor_data.get('feature_stats')
         print(f"✅ Preprocessor loaded from {file_path}")
\ No newline at end of file
@@ -0,0 +1,254 @@
+import io
+import os
+import contextlib
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from incremental import row_fingerprints
+from columnar import ColumnarStore, catalog_columns
+from feature_screening import kbest_selector
+from progress import ProgressReporter
+
+def use_streaming(file_path):
+    """True when a file is larger than PREPROCESS_STREAMING_MB (default 256) and should be read in chunks"""
+    threshold_mb = float(os.getenv('PREPROCESS_STREAMING_MB', '256'))
+    return os.path.getsize(file_path) > threshold_mb * 1024 * 1024
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Values are counted in logarithmically sized buckets, so every quantile is
+    returned within ``relative_accuracy`` of a true value of that rank, and
+    sketches of separate chunks merge exactly by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.005):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _add(self, buckets, magnitudes):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def update(self, values):
+        """Add the finite values of an array"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        self.count += len(values)
+        self.zero_count += int((values == 0).sum())
+        self._add(self.positive, values[values > 0])
+        self._add(self.negative, -values[values < 0])
+        return self
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one"""
+        for buckets, other_buckets in [(self.positive, other.positive), (self.negative, other.negative)]:
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def _bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile (NaN for an empty sketch)"""
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._bucket_value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._bucket_value(key)
+        return self._bucket_value(max(self.positive))
+
+class FeatureStatistics:
+    """Mergeable sums for feature correlations, ANOVA F-scores and value ranges.
+
+    Values are shifted by ``shift`` (e.g. the medians) before accumulating,
+    which keeps the float64 sums of squares accurate.
+    """
+
+    def __init__(self, shift, n_classes):
+        n_features = len(shift)
+        self.shift = np.asarray(shift, dtype=np.float64)
+        self.n = 0
+        self.sum = np.zeros(n_features)
+        self.cross = np.zeros((n_features, n_features))
+        self.class_count = np.zeros(n_classes)
+        self.class_sum = np.zeros((n_classes, n_features))
+        self.class_sumsq = np.zeros((n_classes, n_features))
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+
+    def update(self, X, y):
+        Z = np.asarray(X, dtype=np.float64) - self.shift
+        self.n += len(Z)
+        self.sum += Z.sum(axis=0)
+        self.cross += Z.T @ Z
+        for class_idx in np.unique(y):
+            Z_class = Z[y == class_idx]
+            self.class_count[class_idx] += len(Z_class)
+            self.class_sum[class_idx] += Z_class.sum(axis=0)
+            self.class_sumsq[class_idx] += (Z_class ** 2).sum(axis=0)
+        self.min = np.minimum(self.min, Z.min(axis=0, initial=np.inf))
+        self.max = np.maximum(self.max, Z.max(axis=0, initial=-np.inf))
+        return self
+
+    def constant(self):
+        return self.max <= self.min
+
+    def correlation(self):
+        """Pearson correlation matrix (NaN for constant features)"""
+        mean = self.sum / self.n
+        cov = self.cross / self.n - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return cov / np.outer(std, std)
+
+    def anova(self, columns):
+        """One-way ANOVA F-scores and p-values of ``columns``, as sklearn's f_classif"""
+        present = self.class_count > 0
+        counts = self.class_count[present]
+        class_sum = self.class_sum[present][:, columns]
+        total = self.sum[columns]
+        ss_total = self.class_sumsq[present][:, columns].sum(axis=0) - total ** 2 / self.n
+        ss_between = (class_sum ** 2 / counts[:, None]).sum(axis=0) - total ** 2 / self.n
+        ss_within = ss_total - ss_between
+        df_between, df_within = len(counts) - 1, self.n - len(counts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f_scores = (ss_between / df_between) / (ss_within / df_within)
+        return f_scores, stats.f.sf(f_scores, df_between, df_within)
+
+def iter_clean_chunks(preprocessor, file_path, chunk_rows):
+    """Cleaned chunks of the feature and target columns, read from the columnar cache ``chunk_rows`` rows at a time"""
+    store = ColumnarStore()
+    usecols = catalog_columns(preprocessor, store.columns(file_path))
+
+    for chunk in store.iter_chunks(file_path, usecols, chunk_rows):
+        # The per-chunk cleaning summary would repeat for every chunk
+        with contextlib.redirect_stdout(io.StringIO()):
+            cleaned = preprocessor.clean_data(chunk)
+        yield cleaned
+
+def progress_chunks(progress, scan, chunks):
+    """Pass ``chunks`` through, reporting the scan as a substage with running row counts"""
+    with progress.substage('preprocess', f'streaming_pass_{scan}'):
+        rows = 0
+        for chunk in chunks:
+            yield chunk
+            rows += len(chunk)
+            progress.emit('rows_processed', stage='preprocess', scan=scan, rows=rows)
+
+def stream_fit_features(preprocessor, file_path, chunk_rows=None, relative_accuracy=0.005, progress=None):
+    """Fit a catalog preprocessor on a CSV in chunks and return scaled features and encoded labels.
+
+    Three passes over the file, each holding one chunk of only the needed
+    columns: (1) labels, missing values, row fingerprints and a quantile
+    sketch per feature for the median imputer; (2) correlations and ANOVA
+    F-scores of the imputed features for feature selection; (3) online
+    scaler statistics while the selected features are written into a
+    preallocated float32 matrix, which is then scaled in place. Memory is
+    bounded by the chunk size plus that output matrix. Sets the same fitted
+    attributes as the in-memory pipeline. Each pass is reported to
+    ``progress`` as a substage with ``rows_processed`` events per chunk.
+    """
+    chunk_rows = chunk_rows or int(os.getenv('PREPROCESS_CHUNK_ROWS', '100000'))
+    columns = preprocessor.feature_columns
+    progress = progress or ProgressReporter()
+    print(f"🌊 Streaming {os.path.basename(file_path)} in chunks of {chunk_rows} rows...")
+
+    # Pass 1: labels, missing values, medians and fingerprints
+    sketches = [QuantileSketch(relative_accuracy) for _ in columns]
+    label_counts = {}
+    missing = np.zeros(len(columns), dtype=np.int64)
+    fingerprints = np.array([], dtype=np.uint64)
+    n_rows = 0
+    for chunk in progress_chunks(progress, 1, iter_clean_chunks(preprocessor, file_path, chunk_rows)):
+        fingerprints = np.union1d(fingerprints, row_fingerprints(chunk, columns + [preprocessor.target_column]))
+        for label, count in chunk[preprocessor.target_column].value_counts().items():
+            label_counts[label] = label_counts.get(label, 0) + int(count)
+        X = chunk[columns].to_numpy(dtype=np.float32)
+        missing += np.isnan(X).sum(axis=0)
+        for sketch, values in zip(sketches, X.T):
+            sketch.update(values)
+        n_rows += len(chunk)
+
+    print(f"📊 Final dataset size: {n_rows} rows")
+    print(f"📊 Total missing values: {missing.sum()}")
+    if n_rows == 0:
+        raise ValueError(f"No usable rows in {file_path}")
+    preprocessor.trained_fingerprints = fingerprints
+
+    preprocessor.label_encoder = LabelEncoder().fit(sorted(label_counts))
+    print("🎯 Label encoding summary:")
+    for class_name in preprocessor.label_encoder.classes_:
+        count = label_counts[class_name]
+        print(f"   {class_name}: {count} samples ({count / n_rows * 100:.1f}%)")
+
+    medians = np.array([sketch.quantile(0.5) for sketch in sketches])
+    preprocessor.imputer = SimpleImputer(strategy='median').fit(pd.DataFrame([medians], columns=columns))
+
+    # Pass 2: statistics of the imputed features for selection
+    n_classes = len(preprocessor.label_encoder.classes_)
+    statistics = FeatureStatistics(np.nan_to_num(medians), n_classes)
+    for chunk in progress_chunks(progress, 2, iter_clean_chunks(preprocessor, file_path, chunk_rows)):
+        X = preprocessor.imputer.transform(pd.DataFrame(chunk[columns].to_numpy(dtype=np.float32), columns=columns))
+        statistics.update(X, preprocessor.label_encoder.transform(chunk[preprocessor.target_column]))
+
+    print("🔍 Performing feature selection...")
+    constant = statistics.constant()
+    if constant.any():
+        print(f"   Removing constant features: {[col for col, c in zip(columns, constant) if c]}")
+    candidates = np.flatnonzero(~constant)
+    corr = np.abs(statistics.correlation()[np.ix_(candidates, candidates)])
+    upper = np.triu(np.nan_to_num(corr) > 0.95, k=1)
+    high_corr = candidates[upper.any(axis=0)]
+    if len(high_corr) > 0:
+        print(f"   Removing highly correlated features: {[columns[i] for i in high_corr]}")
+    kept = np.setdiff1d(candidates, high_corr)
+
+    correlated = np.zeros(len(columns), dtype=bool)
+    correlated[high_corr] = True
+    scores, pvalues = np.full(len(columns), np.nan), np.full(len(columns), np.nan)
+    scores[kept], pvalues[kept] = statistics.anova(kept)
+    selector = kbest_selector({'constant': constant, 'correlated': correlated, 'scores': scores, 'pvalues': pvalues},
+                              10, columns)
+    selected = np.flatnonzero(selector.get_support())
+    preprocessor.feature_selector = selector
+    preprocessor.selected_features = [columns[i] for i in selected]
+    print(f"✅ Selected {len(selected)} features with scores:")
+    for feature, score in zip(preprocessor.selected_features, scores[selected]):
+        print(f"   - {feature}: {score:.2f}")
+
+    # Pass 3: online scaler statistics while filling the output matrix
+    preprocessor.scaler = StandardScaler()
+    X_out = np.empty((n_rows, len(selected)), dtype=np.float32)
+    y_out = np.empty(n_rows, dtype=np.int64)
+    offset = 0
+    for chunk in progress_chunks(progress, 3, iter_clean_chunks(preprocessor, file_path, chunk_rows)):
+        X = preprocessor.imputer.transform(pd.DataFrame(chunk[columns].to_numpy(dtype=np.float32), columns=columns))
+        X_out[offset:offset + len(X)] = X[:, selected]
+        y_out[offset:offset + len(X)] = preprocessor.label_encoder.transform(chunk[preprocessor.target_column])
+        preprocessor.scaler.partial_fit(X_out[offset:offset + len(X)])
+        offset += len(X)
+
+    preprocessor.scaler.transform(X_out, copy=False)
+    return X_out, y_out
@@ -1,48 +1,56 @@
 import pandas as pd
 import numpy as np
 import os
+import time
+import shutil
+from artifacts import save_ensemble, load_ensemble, is_artifact, benchmark_artifact_format
+from attributions import EnsembleAttributor
+from checkpoints import RunCheckpoint, file_sha256
+from columnar import ColumnarStore
+from ensemble import fit_voting_classifier, benchmark_parallel_fit, trim_to_best_iteration, balanced_sample_weight
+from evaluation import summarize_predictions, save_predictions
+from incremental import continue_voting_classifier, detect_drift
+from model_cache import ModelCache
+from model_registry import ModelRegistry
 from preprocess import TOIDataPreprocessor
+from progress import ProgressReporter
+from quantized import benchmark_quantized_training
+from tuning import load_ensemble_params, save_tuned_params, successive_halving_search
 from sklearn.model_selection import train_test_split
 import joblib
 from xgboost import XGBClassifier
 from sklearn.ensemble import RandomForestClassifier, VotingClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+from sklearn.metrics import accuracy_score, balanced_accuracy_score, f1_score
+import sys
 import traceback
 
+# Share of the training rows held out (before resampling) to early-stop XGBoost
+VALIDATION_SIZE = 0.15
+# Share of an increment's new rows held out (stratified) to evaluate the updated model
+INCREMENTAL_HOLDOUT_SIZE = 0.2
+EARLY_STOPPING_ROUNDS = 30
+# How the training rows are balanced: 'weights' (per-class sample weights) or 'upsample'
+CLASS_BALANCING = os.getenv('CLASS_BALANCING', 'weights')
+# Catalog of this service's models in the model registry
+MODEL_CATALOG = 'toi'
+
 class TOIModel:
     def __init__(self):
         self.model = None
+        self.attributor = None
+        self.fit_report = None
         self.is_trained = False
         
-    def create_advanced_model(self):
-        """Create an advanced ensemble model"""
-        # Create multiple models for ensemble
-        xgb = XGBClassifier(
-            n_estimators=500,
-            learning_rate=0.1,
-            max_depth=8,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            reg_alpha=0.1,
-            reg_lambda=0.1,
-            eval_metric='mlogloss',
-            random_state=42
-        )
-        
-        rf = RandomForestClassifier(
-            n_estimators=300,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
+    def create_advanced_model(self, params=None):
+        """Create an advanced ensemble model (tuned parameters when available)"""
+        if params is None:
+            params = load_ensemble_params()
         
-        lr = LogisticRegression(
-            C=1.0,
-            max_iter=1000,
-            random_state=42
-        )
+        # Create multiple models for ensemble
+        xgb = XGBClassifier(**params['xgb'])
+        rf = RandomForestClassifier(**params['rf'])
+        lr = LogisticRegression(**params['lr'])
         
         # Create voting classifier
         self.model = VotingClassifier(
@@ -52,17 +60,48 @@ class TOIModel:
                 ('lr', lr)
             ],
             voting='soft',
-            weights=[3, 2, 1]  # Give more weight to XGBoost
+            weights=params['weights']
         )
         
-    def train(self, X, y):
-        """Train the model"""
+    def train(self, X, y, X_val=None, y_val=None, checkpoint=None, sample_weight=None, progress=None):
+        """Train the model; XGBoost early-stops on the validation rows when given"""
         print("🚀 Training advanced ensemble model...")
         self.create_advanced_model()
-        self.model.fit(X, y)
+        member_fit_params = {}
+        if X_val is not None:
+            self.model.set_params(xgb__early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+            member_fit_params['xgb'] = {'eval_set': [(X_val, y_val)], 'verbose': False}
+            if sample_weight is not None:
+                # Score the validation rows with the same class balance as training
+                member_fit_params['xgb']['sample_weight_eval_set'] = [balanced_sample_weight(y_val)]
+        self.fit_report = fit_voting_classifier(self.model, X, y, sample_weight=sample_weight,
+                                                member_fit_params=member_fit_params, checkpoint=checkpoint,
+                                                progress=progress)
+        self.fit_report['early_stopping'] = trim_to_best_iteration(self.model)
+        for name, rounds in self.fit_report['early_stopping'].items():
+            print(f"⏹️ {name} early-stopped at round {rounds['best_iteration'] + 1} of {rounds['rounds_trained']} trained")
+        print(f"⏱️ Ensemble members fitted in {self.fit_report['wall_seconds']}s "
+              f"({self.fit_report['executor_workers']} {self.fit_report['executor']} workers, core budget {self.fit_report['core_budget']}): "
+              f"{self.fit_report['member_fit_seconds']}")
+        self.attributor = EnsembleAttributor().fit(self.model, X)
         self.is_trained = True
         print("✅ Model training completed")
         
+    def continue_training(self, X_new, y_new, X_all, y_all, boost_rounds=50, forest_trees=50,
+                          sample_weight_new=None, sample_weight_all=None):
+        """Update the loaded ensemble with new rows instead of refitting it (with the full fit's class weights)"""
+        if not self.is_trained:
+            raise ValueError("Model not trained yet")
+        
+        print(f"🔁 Continuing ensemble on {len(X_new)} new rows...")
+        report = continue_voting_classifier(self.model, X_new, y_new, X_all, y_all,
+                                            boost_rounds=boost_rounds, forest_trees=forest_trees,
+                                            sample_weight_new=sample_weight_new, sample_weight_all=sample_weight_all)
+        self.attributor = EnsembleAttributor().fit(self.model, X_all)
+        for name, member in report.items():
+            print(f"   {name}: {member}")
+        return report
+    
     def predict(self, X):
         """Make predictions"""
         if not self.is_trained:
@@ -73,77 +112,203 @@ class TOIModel:
         
         return predictions, probabilities
     
-    def evaluate(self, X_test, y_test):
-        """Evaluate model performance"""
-        y_pred, probabilities = self.predict(X_test)
+    def explain(self, X):
+        """Per-sample feature contributions to each class probability"""
+        if not self.is_trained:
+            raise ValueError("Model not trained yet")
         
-        accuracy = accuracy_score(y_test, y_pred)
-        class_report = classification_report(y_test, y_pred, output_dict=True)
-        conf_matrix = confusion_matrix(y_test, y_pred)
+        return self.attributor.explain(X)
+    
+    def evaluate(self, X_test, y_test, predictions_path=None):
+        """Evaluate model performance from one predict_proba pass.
         
-        return {
-            'accuracy': accuracy,
-            'classification_report': class_report,
-            'confusion_matrix': conf_matrix.tolist(),
-            'predictions': y_pred.tolist(),
-            'probabilities': probabilities.tolist()
-        }
+        Returns a compact summary (see evaluation.summarize_predictions); the
+        per-row predictions and probabilities are only written, as an .npz
+        file, when ``predictions_path`` is given.
+        """
+        if not self.is_trained:
+            raise ValueError("Model not trained yet")
+        
+        probabilities = self.model.predict_proba(X_test)
+        evaluation = summarize_predictions(y_test, probabilities, self.model.classes_)
+        if predictions_path:
+            evaluation['predictions_file'] = save_predictions(predictions_path, y_test, probabilities, self.model.classes_)
+        return evaluation
     
     def save_model(self, file_path):
         """Save the trained model"""
         try:
-            joblib.dump(self.model, file_path)
+            # Compact artifact: native XGBoost model, flat forest arrays, memory-mapped on load
+            save_ensemble(file_path, self.model, self.attributor)
             print(f"✅ Model saved to {file_path}")
         except Exception as e:
             print(f"❌ Error saving model: {e}")
             raise
     
-    def load_model(self, file_path):
-        """Load a trained model"""
-        self.model = joblib.load(file_path)
+    def load_model(self, file_path, lazy=True):
+        """Load a trained model; ``lazy=False`` rebuilds plain estimators that can continue training"""
+        if is_artifact(file_path):
+            self.model, self.attributor = load_ensemble(file_path, lazy=lazy)
+            self.is_trained = True
+            print(f"✅ Model loaded from {file_path}")
+            return
+        
+        model_data = joblib.load(file_path)
+        if isinstance(model_data, dict):
+            self.model = model_data['model']
+            self.attributor = model_data.get('attributor')
+        else:
+            # Older artifacts contain only the estimator
+            self.model = model_data
+            self.attributor = None
+        
+        if self.attributor is None:
+            # Scaled features have zero mean over the original training data
+            self.attributor = EnsembleAttributor().fit(self.model, np.zeros((1, self.model.n_features_in_)))
+        
         self.is_trained = True
         print(f"✅ Model loaded from {file_path}")
 
-def train_toi_model(data_file_path):
-    """Complete training pipeline for TOI model"""
+TRAINING_STAGES = ['preprocess', 'split', 'train', 'evaluate', 'save']
+
+def balance_training_split(preprocessor, X_train, y_train, mode=None):
+    """Balance training rows by ``mode`` (default CLASS_BALANCING); returns (X, y, sample_weight or None)"""
+    mode = mode or CLASS_BALANCING
+    if mode == 'upsample':
+        X_train, y_train = preprocessor.handle_class_imbalance(X_train, y_train)
+        return X_train, y_train, None
+    if mode != 'weights':
+        raise ValueError(f"Unknown class balancing mode: {mode}")
+    return X_train, y_train, preprocessor.class_sample_weights(y_train)
+
+def training_params():
+    """Configuration of a full training run (part of its cache key and registry metadata)"""
+    return {
+        'ensemble': load_ensemble_params(),
+        'validation_size': VALIDATION_SIZE,
+        'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+        'class_balancing': CLASS_BALANCING
+    }
+
+def register_model(model, preprocessor, data_file_path, evaluation, training_seconds, **metadata):
+    """Save a trained model and preprocessor as a new registry version, make it current and return its name"""
+    registry = ModelRegistry(MODEL_CATALOG)
+    staging_dir = registry.staging_dir()
+    try:
+        model.save_model(os.path.join(staging_dir, 'model.pkl'))
+        preprocessor.save_preprocessor(os.path.join(staging_dir, 'preprocessor.pkl'))
+        # Versions without a held-out evaluation record no metrics
+        metrics = None
+        if evaluation['accuracy'] is not None:
+            metrics = {
+                'accuracy': evaluation['accuracy'],
+                'macro_f1': evaluation['classification_report']['macro avg']['f1-score'],
+                'expected_calibration_error': evaluation['calibration']['expected_calibration_error']
+            }
+        return registry.commit(staging_dir, {
+            'dataset_sha256': file_sha256(data_file_path),
+            'metrics': metrics,
+            'training_seconds': round(training_seconds, 2),
+            **metadata
+        })
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+def train_toi_model(data_file_path, progress_callback=None, resume=True, predictions_path=None):
+    """Complete training pipeline for TOI model.
+    
+    Every stage is checkpointed to a run directory keyed by the data and the
+    training configuration; with ``resume`` a retry continues from the last
+    completed stage (and from partial boosting rounds). The per-row test
+    predictions are written to ``predictions_path`` when given.
+    """
     
     print("🎯 Starting TOI Model Training Pipeline...")
     print(f"📁 Using data file: {data_file_path}")
+    progress = ProgressReporter(progress_callback, TRAINING_STAGES)
+    start = time.time()
     
     try:
         # Check if data file exists
         if not os.path.exists(data_file_path):
             raise FileNotFoundError(f"Data file not found: {data_file_path}")
         
-        # Initialize preprocessor
-        preprocessor = TOIDataPreprocessor()
+        checkpoint = RunCheckpoint.for_run(data_file_path, {
+            'params': load_ensemble_params(),
+            'validation_size': VALIDATION_SIZE,
+            'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+            'class_balancing': CLASS_BALANCING
+        })
+        if not resume:
+            checkpoint.clear()
+            checkpoint = RunCheckpoint(checkpoint.run_dir)
+        elif checkpoint.completed():
+            print(f"♻️ Resuming training run from checkpoints: {checkpoint.completed()}")
         
         # Preprocess data
         print("📊 Preprocessing data...")
-        X, y = preprocessor.preprocess_pipeline(data_file_path)
+        with progress.stage('preprocess'):
+            if checkpoint.has('preprocess'):
+                preprocessor, X, y = checkpoint.load('preprocess')
+                progress.emit('checkpoint_loaded', stage='preprocess')
+            else:
+                preprocessor = TOIDataPreprocessor()
+                X, y = preprocessor.prepare_features(data_file_path, progress=progress)
+                checkpoint.save('preprocess', (preprocessor, X, y))
         
-        # Split data
-        print("✂️ Splitting data into train/test sets...")
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
+        # Split data before balancing so validation and test rows are never duplicated into training
+        print("✂️ Splitting data into train/validation/test sets...")
+        with progress.stage('split'):
+            if checkpoint.has('split'):
+                X_train, X_val, X_test, y_train, y_val, y_test, sample_weight = checkpoint.load('split')
+                progress.emit('checkpoint_loaded', stage='split')
+            else:
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y, test_size=0.2, random_state=42, stratify=y
+                )
+                X_train, X_val, y_train, y_val = train_test_split(
+                    X_train, y_train, test_size=VALIDATION_SIZE, random_state=42, stratify=y_train
+                )
+                X_train, y_train, sample_weight = balance_training_split(preprocessor, X_train, y_train)
+                checkpoint.save('split', (X_train, X_val, X_test, y_train, y_val, y_test, sample_weight))
         
-        print(f"📊 Training set: {X_train.shape[0]} samples")
+        print(f"📊 Training set: {X_train.shape[0]} samples (class balancing: {CLASS_BALANCING})")
+        print(f"📊 Validation set: {X_val.shape[0]} samples")
         print(f"📊 Test set: {X_test.shape[0]} samples")
         
         # Train model
         print("🚀 Training advanced ensemble model...")
-        model = TOIModel()
-        model.train(X_train, y_train)
+        with progress.stage('train', samples=int(X_train.shape[0])):
+            if checkpoint.has('model'):
+                model = checkpoint.load('model')
+                progress.emit('checkpoint_loaded', stage='train')
+            else:
+                model = TOIModel()
+                model.train(X_train, y_train, X_val=X_val, y_val=y_val, checkpoint=checkpoint,
+                            sample_weight=sample_weight, progress=progress)
+                checkpoint.save('model', model)
+        progress.emit('ensemble_fit', **model.fit_report)
         
         # Evaluate model
         print("📈 Evaluating model performance...")
-        evaluation = model.evaluate(X_test, y_test)
+        with progress.stage('evaluate'):
+            evaluation = model.evaluate(X_test, y_test, predictions_path=predictions_path)
+        progress.emit('evaluation', accuracy=evaluation['accuracy'],
+                      macro_f1=evaluation['classification_report']['macro avg']['f1-score'],
+                      classes=preprocessor.label_encoder.classes_.tolist(),
+                      confusion_matrix=evaluation['confusion_matrix'],
+                      expected_calibration_error=evaluation['calibration']['expected_calibration_error'])
         
-        # Save model and preprocessor
+        # Save model and preprocessor as a new registry version
         print("💾 Saving model and preprocessor...")
-        model.save_model('model.pkl')
-        preprocessor.save_preprocessor('preprocessor.pkl')
+        with progress.stage('save'):
+            version = register_model(model, preprocessor, data_file_path, evaluation, time.time() - start,
+                                     training_mode='full', params=training_params())
+        evaluation['model_version'] = version
+        
+        # The run is complete; its checkpoints are no longer needed
+        checkpoint.clear()
         
         # Print results
         print("\n" + "="*60)
@@ -152,8 +317,7 @@ def train_toi_model(data_file_path):
         print(f"📊 Accuracy: {evaluation['accuracy']:.4f}")
         print(f"🎯 Classes: {preprocessor.label_encoder.classes_.tolist()}")
         print(f"🔧 Features used: {len(preprocessor.selected_features)}")
-        print(f"📁 Model saved: model.pkl")
-        print(f"🔧 Preprocessor saved: preprocessor.pkl")
+        print(f"📦 Model version: {version} (model registry '{MODEL_CATALOG}')")
         
         # Print detailed classification report
         print("\n📋 Detailed Classification Report:")
@@ -181,20 +345,278 @@ def train_toi_model(data_file_path):
         traceback.print_exc()
         raise
 
+INCREMENTAL_STAGES = ['preprocess', 'drift', 'train', 'evaluate', 'save']
+
+def split_incremental_holdout(is_new, y, holdout_size=INCREMENTAL_HOLDOUT_SIZE):
+    """Mask of new rows held out (stratified by class) to evaluate an incremental update.
+    
+    Nothing is held out when the new rows are too few to stratify.
+    """
+    new_rows = np.flatnonzero(is_new)
+    holdout = np.zeros(len(is_new), dtype=bool)
+    try:
+        _, held_out_rows = train_test_split(new_rows, test_size=holdout_size, random_state=42, stratify=y[new_rows])
+    except ValueError:
+        return holdout
+    holdout[held_out_rows] = True
+    return holdout
+
+def incremental_train_toi_model(data_file_path, boost_rounds=50, forest_trees=50, drift_threshold=0.5,
+                         full_retrain_on_drift=True, progress_callback=None, predictions_path=None):
+    """Update the saved model with rows of a new export that it has not been trained on.
+
+    Falls back to train_toi_model when there is no usable saved model, the export
+    contains unknown labels, or drift is detected and ``full_retrain_on_drift`` is set.
+    """
+    print("🎯 Starting Incremental Training Pipeline...")
+    print(f"📁 Using data file: {data_file_path}")
+    
+    def full_retrain(reason):
+        print(f"🔄 Falling back to full retrain: {reason}")
+        model, preprocessor, evaluation = train_toi_model(data_file_path, progress_callback=progress_callback,
+                                                          predictions_path=predictions_path)
+        evaluation['training_mode'] = 'full'
+        evaluation['fallback_reason'] = reason
+        return model, preprocessor, evaluation
+    
+    registry = ModelRegistry(MODEL_CATALOG)
+    base_version = registry.current()
+    files = registry.files(base_version) if base_version else None
+    if files is None:
+        return full_retrain('no saved model')
+    
+    preprocessor = TOIDataPreprocessor()
+    preprocessor.load_preprocessor(files['preprocessor.pkl'])
+    if preprocessor.trained_fingerprints is None:
+        return full_retrain('saved preprocessor has no record of its training rows')
+    
+    progress = ProgressReporter(progress_callback, INCREMENTAL_STAGES)
+    start = time.time()
+    
+    try:
+        print("📊 Preprocessing new export with the saved preprocessor...")
+        with progress.stage('preprocess'):
+            batch = preprocessor.preprocess_incremental(data_file_path)
+        if batch['unseen_labels']:
+            return full_retrain(f"unknown labels {batch['unseen_labels']}")
+        
+        is_new = batch['is_new']
+        # A slice of the new rows is held out to evaluate the update; everything else is trained on
+        holdout = split_incremental_holdout(is_new, batch['y'])
+        fit_rows = ~holdout
+        X_fit, y_fit = batch['X'][fit_rows], batch['y'][fit_rows]
+        X_new, y_new = batch['X'][is_new & fit_rows], batch['y'][is_new & fit_rows]
+        
+        print("🔍 Checking new rows for drift...")
+        with progress.stage('drift'):
+            drift = detect_drift(preprocessor.feature_stats, batch['X_selected'][is_new],
+                                 feature_names=preprocessor.selected_features, threshold=drift_threshold)
+        progress.emit('drift', drifted=drift['drifted'], max_mean_shift=drift.get('max_mean_shift'))
+        if drift['drifted']:
+            print(f"⚠️  Drift detected (max mean shift {drift['max_mean_shift']})")
+            if full_retrain_on_drift:
+                return full_retrain('drift detected')
+        
+        model = TOIModel()
+        model.load_model(files['model.pkl'], lazy=False)
+        with progress.stage('train', samples=int(len(X_new))):
+            if len(X_new) > 0:
+                # Same class balancing as a full fit, over every row trained on
+                sample_weight = preprocessor.class_sample_weights(y_fit) if CLASS_BALANCING == 'weights' else None
+                update = model.continue_training(
+                    X_new, y_new, X_fit, y_fit, boost_rounds=boost_rounds, forest_trees=forest_trees,
+                    sample_weight_new=None if sample_weight is None else sample_weight[is_new[fit_rows]],
+                    sample_weight_all=sample_weight
+                )
+            else:
+                print("✅ No new rows, keeping the current model")
+                update = {}
+        
+        with progress.stage('evaluate'):
+            if holdout.any():
+                print(f"📈 Evaluating updated model on {int(holdout.sum())} held-out new rows...")
+                evaluation = model.evaluate(batch['X'][holdout], batch['y'][holdout], predictions_path=predictions_path)
+            else:
+                print("ℹ️ Too few new rows to hold any out, no held-out evaluation")
+                evaluation = {'accuracy': None, 'classification_report': None, 'confusion_matrix': None,
+                              'calibration': None}
+        evaluation['held_out_rows'] = int(holdout.sum())
+        progress.emit('evaluation', accuracy=evaluation['accuracy'], held_out_rows=evaluation['held_out_rows'])
+        evaluation['training_mode'] = 'incremental'
+        evaluation['incremental'] = {
+            'new_rows': int(is_new.sum()),
+            'trained_new_rows': int(len(X_new)),
+            'held_out_rows': int(holdout.sum()),
+            'total_rows': int(len(batch['X'])),
+            'members': update,
+            'drift': drift
+        }
+        
+        print("💾 Saving model and preprocessor...")
+        with progress.stage('save'):
+            version = base_version
+            if len(X_new) > 0:
+                # Held-out rows stay unrecorded, so the next update trains on them
+                preprocessor.record_increment(batch['fingerprints'][fit_rows], batch['X_selected'][is_new & fit_rows])
+                version = register_model(model, preprocessor, data_file_path, evaluation, time.time() - start,
+                                         training_mode='incremental', parent_version=base_version,
+                                         params={'boost_rounds': boost_rounds, 'forest_trees': forest_trees})
+        evaluation['model_version'] = version
+        
+        accuracy = 'not evaluated' if evaluation['accuracy'] is None else f"{evaluation['accuracy']:.4f}"
+        print(f"🎉 Incremental training completed: {len(X_new)} new rows trained, held-out accuracy {accuracy}")
+        return model, preprocessor, evaluation
+        
+    except Exception as e:
+        print(f"❌ Incremental training failed: {e}")
+        traceback.print_exc()
+        raise
+
+def tune_toi_model(data_file_path, time_budget=600, n_candidates=27):
+    """Search ensemble hyperparameters with successive halving and save the winner as the default"""
+    print(f"🎛️ Tuning ensemble on {data_file_path} (budget {time_budget}s, {n_candidates} candidates)...")
+    preprocessor = TOIDataPreprocessor()
+    X, y = preprocessor.prepare_features(data_file_path)
+    
+    # Keep the test rows out of the search, as in train_toi_model
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    
+    def build_model(params):
+        model = TOIModel()
+        model.create_advanced_model(params)
+        return model.model
+    
+    best_params, report = successive_halving_search(
+        build_model, X_train, y_train,
+        resample=preprocessor.handle_class_imbalance if CLASS_BALANCING == 'upsample' else None,
+        balance_classes=CLASS_BALANCING == 'weights',
+        n_candidates=n_candidates,
+        time_budget=time_budget
+    )
+    if best_params is None:
+        print("⚠️  Tuning budget exhausted before any candidate was scored; keeping current parameters")
+        return None, report
+    
+    save_tuned_params(best_params, report)
+    print(f"🎉 Best cross-validated accuracy: {report['best_score']:.4f} in {report['elapsed']}s")
+    print(f"🔧 Best parameters: {report['best_candidate']}")
+    return best_params, report
+
+def benchmark_toi_training(data_file_path):
+    """Compare serial and parallel fitting of the ensemble members"""
+    print(f"⏱️ Benchmarking ensemble fitting on {data_file_path}...")
+    preprocessor = TOIDataPreprocessor()
+    X, y = preprocessor.preprocess_pipeline(data_file_path)
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    
+    model = TOIModel()
+    model.create_advanced_model()
+    report = benchmark_parallel_fit(model.model, X_train, y_train)
+    
+    print(f"📊 Serial fit:   {report['serial_seconds']}s")
+    print(f"📊 Parallel fit: {report['wall_seconds']}s ({report['parallel_workers']} workers, core budget {report['core_budget']})")
+    print(f"📊 Member times: {report['member_fit_seconds']}")
+    print(f"🚀 Speedup: {report['speedup']}x")
+    return report
+
+def benchmark_toi_balancing(data_file_path):
+    """Compare fit time and test scores of upsampling and class weighting on the TOI data"""
+    print(f"⏱️ Benchmarking class balancing on {data_file_path}...")
+    preprocessor = TOIDataPreprocessor()
+    X, y = preprocessor.prepare_features(data_file_path)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_train, y_train, test_size=VALIDATION_SIZE, random_state=42, stratify=y_train
+    )
+    
+    report = {}
+    for mode in ['upsample', 'weights']:
+        X_fit, y_fit, sample_weight = balance_training_split(preprocessor, X_train, y_train, mode)
+        model = TOIModel()
+        start = time.time()
+        model.train(X_fit, y_fit, X_val=X_val, y_val=y_val, sample_weight=sample_weight)
+        fit_seconds = time.time() - start
+        y_pred, _ = model.predict(X_test)
+        report[mode] = {
+            'train_rows': int(len(X_fit)),
+            'fit_seconds': round(fit_seconds, 3),
+            'accuracy': round(accuracy_score(y_test, y_pred), 4),
+            'balanced_accuracy': round(balanced_accuracy_score(y_test, y_pred), 4),
+            'macro_f1': round(f1_score(y_test, y_pred, average='macro'), 4)
+        }
+        print(f"📊 {mode}: {report[mode]}")
+    return report
+
+def benchmark_toi_hist_training(data_file_path, scale=100):
+    """Compare XGBoost tree methods and shared quantized data on the TOI data tiled ``scale`` times"""
+    print(f"⏱️ Benchmarking XGBoost histogram training on {data_file_path} x{scale}...")
+    preprocessor = TOIDataPreprocessor()
+    X, y = preprocessor.prepare_features(data_file_path)
+    report = benchmark_quantized_training(X, y, scale=scale)
+    print(f"📊 {report['rows']} rows x {report['features']} features, {report['fits']} fits per variant")
+    return report
+
+def benchmark_toi_artifact(version=None, rows=2000):
+    """Compare joblib pickles with the compact artifact format on a registered TOI model"""
+    files = ModelRegistry(MODEL_CATALOG).files(version)
+    if files is None:
+        raise ValueError("No registered TOI model to benchmark")
+    model = TOIModel()
+    model.load_model(files['model.pkl'], lazy=False)
+    # Preprocessed features are standardized
+    X = np.random.default_rng(0).standard_normal((rows, model.model.n_features_in_))
+    return benchmark_artifact_format(model.model, model.attributor, X)
+
+def training_cache_key(data_hash):
+    """Model cache key for a full training run on a dataset with the given content hash"""
+    return ModelCache.make_key(data_hash, TOIDataPreprocessor().target_column, 'toi_ensemble', training_params())
+
+def run_training_job(data_file_path, mode='full', cache_key=None, progress_callback=None, predictions_path=None,
+                     **options):
+    """Background job entry point: train and return a JSON-serializable summary"""
+    if mode == 'incremental':
+        model, preprocessor, evaluation = incremental_train_toi_model(
+            data_file_path, progress_callback=progress_callback, predictions_path=predictions_path, **options
+        )
+    else:
+        model, preprocessor, evaluation = train_toi_model(data_file_path, progress_callback=progress_callback,
+                                                          predictions_path=predictions_path)
+    summary = {
+        'accuracy': evaluation['accuracy'],
+        'classification_report': evaluation['classification_report'],
+        'confusion_matrix': evaluation['confusion_matrix'],
+        'calibration': evaluation['calibration'],
+        'predictions_saved': 'predictions_file' in evaluation,
+        'class_names': preprocessor.label_encoder.classes_.tolist(),
+        'selected_features': preprocessor.selected_features,
+        'fit_report': model.fit_report,
+        'training_mode': evaluation.get('training_mode', 'full'),
+        'fallback_reason': evaluation.get('fallback_reason'),
+        'incremental': evaluation.get('incremental'),
+        'model_version': evaluation.get('model_version')
+    }
+    
+    # Identical re-uploads with identical settings can reuse this model
+    if cache_key and summary['training_mode'] == 'full':
+        ModelCache().store(cache_key, summary, ModelRegistry(MODEL_CATALOG).files(summary['model_version']))
+    return summary
+
 def analyze_dataset(data_file_path):
     """Analyze the dataset before training"""
     print("🔍 Analyzing dataset...")
     
     try:
-        # Read the data to understand its structure
-        df = pd.read_csv(data_file_path, comment='#', nrows=5)  # Read first 5 rows to check structure
-        print(f"📊 Dataset columns: {len(df.columns)}")
-        print(f"📊 Sample columns: {list(df.columns)[:10]}...")  # Show first 10 columns
+        # Header and columns come from the typed columnar copy of the CSV
+        store = ColumnarStore()
+        columns = store.columns(data_file_path)
+        print(f"📊 Dataset columns: {len(columns)}")
+        print(f"📊 Sample columns: {columns[:10]}...")
         
-        # Read full dataset for analysis
-        df_full = pd.read_csv(data_file_path, comment='#')
+        key_columns = ['pl_orbper', 'pl_trandurh', 'pl_trandep', 'pl_rade', 'tfopwg_disp']
+        # Load only the analyzed columns
+        df_full = store.read(data_file_path, ['tfopwg_disp'] + key_columns)
         print(f"📊 Total rows: {len(df_full)}")
-        print(f"📊 Total columns: {len(df_full.columns)}")
+        print(f"📊 Total columns: {len(columns)}")
         
         # Check target column distribution
         if 'tfopwg_disp' in df_full.columns:
@@ -204,7 +626,6 @@ def analyze_dataset(data_file_path):
                 print(f"   {value}: {count} samples ({count/len(df_full)*100:.1f}%)")
         
         # Check for missing values in key columns
-        key_columns = ['pl_orbper', 'pl_trandurh', 'pl_trandep', 'pl_rade', 'tfopwg_disp']
         print(f"🔍 Missing values in key columns:")
         for col in key_columns:
             if col in df_full.columns:
@@ -221,6 +642,33 @@ if __name__ == "__main__":
     # Use the actual TOI data file
     data_file = "toi_data.csv"
     
+    # `python train_model.py benchmark [data.csv]` compares serial and parallel ensemble fitting
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark_toi_training(sys.argv[2] if len(sys.argv) > 2 else data_file)
+        sys.exit(0)
+    
+    # `python train_model.py benchmark-balance [data.csv]` compares upsampling with class weights
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark-balance':
+        benchmark_toi_balancing(sys.argv[2] if len(sys.argv) > 2 else data_file)
+        sys.exit(0)
+    
+    # `python train_model.py benchmark-hist [data.csv] [scale]` compares XGBoost tree methods on scaled-up data
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark-hist':
+        benchmark_toi_hist_training(sys.argv[2] if len(sys.argv) > 2 else data_file,
+                                    scale=int(sys.argv[3]) if len(sys.argv) > 3 else 100)
+        sys.exit(0)
+    
+    # `python train_model.py benchmark-artifact [version]` compares model file formats on a registered model
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark-artifact':
+        benchmark_toi_artifact(sys.argv[2] if len(sys.argv) > 2 else None)
+        sys.exit(0)
+    
+    # `python train_model.py tune [data.csv] [budget_seconds]` searches ensemble parameters for /train
+    if len(sys.argv) > 1 and sys.argv[1] == 'tune':
+        tune_toi_model(sys.argv[2] if len(sys.argv) > 2 else data_file,
+                        time_budget=float(sys.argv[3]) if len(sys.argv) > 3 else 600)
+        sys.exit(0)
+    
     # First, analyze the dataset
     analyze_dataset(data_file)
     
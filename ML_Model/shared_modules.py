@@ -0,0 +1,90 @@
+"""Keep the helper modules shared by the model services identical.
+
+Each service directory runs on its own (``python app.py``) and saved models,
+caches and job processes refer to these helpers by their flat module names,
+so every service carries its own copy. After editing a shared module in one
+service, copy it to the others and check that no copy has drifted:
+
+    python shared_modules.py --sync KOI_Model
+    python shared_modules.py
+"""
+import os
+import sys
+import shutil
+import difflib
+import argparse
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CATALOG_SERVICES = ('KOI_Model', 'K2_Model', 'TOI_Model')
+ALL_SERVICES = CATALOG_SERVICES + ('Custom_Model',)
+
+# Shared module -> services that carry a copy of it
+SHARED_MODULES = {
+    'artifacts.py': CATALOG_SERVICES,
+    'attributions.py': CATALOG_SERVICES,
+    'checkpoints.py': CATALOG_SERVICES,
+    'columnar.py': CATALOG_SERVICES,
+    'ensemble.py': ALL_SERVICES,
+    'evaluation.py': ALL_SERVICES,
+    'executors.py': ALL_SERVICES,
+    'feature_screening.py': ALL_SERVICES,
+    'incremental.py': CATALOG_SERVICES,
+    'insight_rules.py': CATALOG_SERVICES,
+    'model_cache.py': ALL_SERVICES,
+    'model_registry.py': CATALOG_SERVICES,
+    'preprocess_cache.py': CATALOG_SERVICES,
+    'progress.py': ALL_SERVICES,
+    'quantized.py': ALL_SERVICES,
+    'streaming.py': CATALOG_SERVICES,
+    'training_jobs.py': ALL_SERVICES,
+    'tuning.py': CATALOG_SERVICES,
+    'warmup.py': ALL_SERVICES
+}
+
+def _read(service, module):
+    with open(os.path.join(ML_MODEL_DIR, service, module)) as f:
+        return f.read()
+
+def check_shared_modules():
+    """Unified diffs of every copy that differs from the first service's copy (empty when all match)"""
+    diffs = []
+    for module, services in SHARED_MODULES.items():
+        reference = _read(services[0], module)
+        for service in services[1:]:
+            copy = _read(service, module)
+            if copy != reference:
+                diffs.append(''.join(difflib.unified_diff(
+                    reference.splitlines(keepends=True), copy.splitlines(keepends=True),
+                    f'{services[0]}/{module}', f'{service}/{module}'
+                )))
+    return diffs
+
+def sync_shared_modules(source):
+    """Copy the shared modules of service ``source`` to every other service that carries them"""
+    copied = []
+    for module, services in SHARED_MODULES.items():
+        if source not in services:
+            continue
+        for service in services:
+            if service != source and _read(service, module) != _read(source, module):
+                shutil.copyfile(os.path.join(ML_MODEL_DIR, source, module), os.path.join(ML_MODEL_DIR, service, module))
+                copied.append(f'{service}/{module}')
+    return copied
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check or sync the modules shared by the model services')
+    parser.add_argument('--sync', metavar='SERVICE', choices=ALL_SERVICES,
+                        help='copy the shared modules of SERVICE to the other services first')
+    args = parser.parse_args()
+
+    if args.sync:
+        for path in sync_shared_modules(args.sync):
+            print(f"📋 Updated {path}")
+    diffs = check_shared_modules()
+    for diff in diffs:
+        print(diff)
+    if diffs:
+        print(f"❌ {len(diffs)} shared module copies differ; edit one service and run with --sync")
+        sys.exit(1)
+    print(f"✅ All {len(SHARED_MODULES)} shared modules are identical across services")